@@ -0,0 +1,15 @@
+
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Benchmark suite of eve-mongoengine hot paths (CRUD requests through
+    Eve's test client, encoding, cleaning, validation and export), using
+    models of the test suite. Run it with::
+
+        $ python -m benchmarks run -o results.json
+        $ python -m benchmarks compare base.json results.json
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
@@ -0,0 +1,98 @@
+
+"""
+    benchmarks.__main__
+    ~~~~~~~~~~~~~~~~~~~
+
+    Command line interface of the benchmark suite::
+
+        $ python -m benchmarks list
+        $ python -m benchmarks run -k 'get_*' -o results.json
+        $ python -m benchmarks compare base.json results.json -t 0.2
+
+    ``compare`` exits with status 1 if some case regressed.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import argparse
+
+from . import runner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks of eve-mongoengine.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    list_parser = commands.add_parser('list', help='list benchmark cases')
+    list_parser.add_argument('-k', '--pattern',
+                             help='only cases matching shell-style pattern')
+
+    run_parser = commands.add_parser('run', help='run benchmarks')
+    run_parser.add_argument('-b', '--backend', default='mongod',
+                            help='mongod (default) or memory')
+    run_parser.add_argument('--host', default='localhost',
+                            help='host of mongod backend')
+    run_parser.add_argument('--port', type=int, default=27017,
+                            help='port of mongod backend')
+    run_parser.add_argument('-n', '--repeat', type=int, default=50,
+                            help='timed operations per case')
+    run_parser.add_argument('-w', '--warmup', type=int, default=5,
+                            help='untimed operations per case')
+    run_parser.add_argument('-k', '--pattern',
+                            help='only cases matching shell-style pattern')
+    run_parser.add_argument('--large-population', type=int,
+                            help='documents of the large collection of '
+                                 'get_large_list cases (default 1000000)')
+    run_parser.add_argument('-m', '--memory', action='store_true',
+                            help='measure also peak memory of operations')
+    run_parser.add_argument('-o', '--output', help='results file (JSON)')
+
+    compare_parser = commands.add_parser(
+        'compare', help='compare results, exit with 1 on regression')
+    compare_parser.add_argument('base', help='baseline results file')
+    compare_parser.add_argument('current', help='compared results file')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                                help='tolerated slowdown of median '
+                                     '(default 0.1 = 10%%)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        rows, regressions = runner.compare(runner.load(args.base),
+                                           runner.load(args.current),
+                                           args.threshold)
+        runner.print_comparison(rows)
+        return 1 if regressions else 0
+
+    from .cases import CASES, BACKENDS, Context, create_app
+    if args.command == 'list':
+        import fnmatch
+        for case in CASES:
+            if not args.pattern or fnmatch.fnmatch(case.name, args.pattern):
+                sys.stdout.write('%s\n' % case.name)
+        return 0
+
+    if args.backend not in BACKENDS:
+        parser.error("unknown backend '%s' (available: %s)"
+                     % (args.backend, ', '.join(sorted(BACKENDS))))
+    app = create_app(args.backend, args.host, args.port)
+    ctx = Context(app, args.backend)
+    if args.large_population:
+        ctx.large_population = args.large_population
+    try:
+        results = runner.run(CASES, ctx, args.repeat, args.warmup,
+                             args.pattern, args.memory)
+    finally:
+        ctx.clear()
+    if args.output:
+        runner.save(args.output, runner.metadata(args.backend, args.repeat),
+                    results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
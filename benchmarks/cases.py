@@ -0,0 +1,408 @@
+
+"""
+    benchmarks.cases
+    ~~~~~~~~~~~~~~~~
+
+    Benchmarked application (models of the test suite) and benchmark cases.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import json
+import importlib
+from functools import partial
+from datetime import datetime
+from contextlib import contextmanager
+
+from bson import ObjectId
+from eve import Eve
+from eve.utils import config, parse_request
+
+from eve_mongoengine import EveMongoengine
+from eve_mongoengine.datalayer import (MongoengineJsonEncoder, clean_doc,
+                                       json_backends)
+from eve_mongoengine.memory import NullDataLayer
+from eve_mongoengine.rows import row_class
+from tests import SETTINGS, SimpleDoc, ComplexDoc, LimitedDoc
+
+from .runner import Case, BenchmarkError
+
+
+#: Data layers of available backends.
+BACKENDS = {
+    'mongod': 'eve_mongoengine.datalayer:MongoengineDataLayer',
+    'memory': 'eve_mongoengine.memory:InMemoryDataLayer',
+}
+
+#: Number of items of lists (and keys of dicts) of ComplexDoc by size.
+DOC_SIZES = {'small': 1, 'large': 100}
+
+#: Number of documents of resources read by GET cases.
+POPULATION = 1000
+
+#: Number of documents of big pages (cases of lightweight rows).
+BIG_PAGE = 10000
+
+#: Default number of documents of the large collection (stand-in of
+#: production-sized collection, see ``--large-population`` option).
+LARGE_POPULATION = 10 ** 6
+
+#: Number of documents of the large collection written at once.
+LARGE_BATCH = 10000
+
+
+def create_app(backend='mongod', host='localhost', port=27017):
+    """
+    Returns Eve application with SimpleDoc, ComplexDoc and LimitedDoc
+    resources stored by given backend.
+    """
+    module_name, _, attr = BACKENDS[backend].partition(':')
+    settings = dict(SETTINGS, MONGO_HOST=host, MONGO_PORT=port,
+                    MONGO_DBNAME='eve_mongoengine_bench',
+                    DOMAIN={'eve-mongoengine': {}},
+                    # no etag precondition in PATCH, PUT and DELETE cases
+                    IF_MATCH=False, PAGINATION_LIMIT=BIG_PAGE)
+    app = Eve(settings=settings, data=NullDataLayer)
+    ext = EveMongoengine()
+    ext.datalayer_class = getattr(importlib.import_module(module_name), attr)
+    ext.init_app(app)
+    ext.add_model([SimpleDoc, ComplexDoc, LimitedDoc])
+    return app
+
+
+def simple_doc(n):
+    return {'a': 'document %d' % n, 'b': n}
+
+
+def complex_doc(size, n=0):
+    return {
+        'i': {'a': 'inner %d' % n, 'b': n},
+        'd': dict(('key%d' % i, i) for i in range(size)),
+        'l': ['item %d' % i for i in range(size)],
+        'o': [{'a': 'item %d' % i, 'b': i} for i in range(size)],
+        'p': [{'ll': ['x', 'y', 'z']} for i in range(size)],
+    }
+
+
+def wide_doc(fields):
+    # empty lists and dicts, values and embedded dicts with empty values
+    doc = {}
+    for i in range(fields):
+        kind = i % 4
+        if kind == 0:
+            doc['f%d' % i] = []
+        elif kind == 1:
+            doc['f%d' % i] = {}
+        elif kind == 2:
+            doc['f%d' % i] = {'x': [], 'y': i}
+        else:
+            doc['f%d' % i] = 'value %d' % i
+    return doc
+
+
+def limited_doc(n):
+    return {'a': 'required', 'b': 'unique %d' % n, 'c': 'x', 'd': 'short',
+            'e': 'long enough value', 'f': 7, 'g': 'val1'}
+
+
+class Context(object):
+    """
+    Benchmarked application, its test client and data.
+    """
+    def __init__(self, app, backend, large_population=LARGE_POPULATION):
+        self.app = app
+        self.backend = backend
+        self.large_population = large_population
+        self.client = app.test_client()
+        # resource -> (doc size, number of documents, ids of documents)
+        self.populated = {}
+        self.counter = 0
+
+    def request(self, method, url, data=None):
+        """
+        Sends request, raises :class:`BenchmarkError` if it fails.
+        """
+        response = self.client.open(
+            url, method=method, content_type='application/json',
+            data=json.dumps(data) if data is not None else None)
+        if response.status_code >= 300:
+            raise BenchmarkError('%s %s: %s %s' % (
+                method, url, response.status_code, response.get_data()))
+        return response
+
+    @contextmanager
+    def options(self, resource, options):
+        """
+        Sets mongoengine options of resource for the duration of block.
+        """
+        settings = self.app.config['DOMAIN'][resource] if resource else {}
+        previous = dict((name, settings[name]) for name in options
+                        if name in settings)
+        settings.update(options)
+        try:
+            yield
+        finally:
+            for name in options:
+                if name in previous:
+                    settings[name] = previous[name]
+                else:
+                    del settings[name]
+
+    def unique(self):
+        self.counter += 1
+        return self.counter
+
+    def insert(self, resource, documents):
+        """
+        Inserts documents through the data layer, returns their ids.
+        """
+        now = datetime.utcnow().replace(microsecond=0)
+        for document in documents:
+            document[config.DATE_CREATED] = document[config.LAST_UPDATED] = \
+                now
+        with self.app.test_request_context():
+            return self.app.data.insert(resource, documents)
+
+    def populate(self, resource, size, count=POPULATION):
+        """
+        Fills resource with ``count`` documents of given size (if not filled
+        yet), returns their ids.
+        """
+        if self.populated.get(resource, (None, None))[:2] != (size, count):
+            with self.app.test_request_context():
+                self.app.data.remove(resource, {})
+            ids = self.insert(resource, [complex_doc(size, n)
+                                         for n in range(count)])
+            self.populated[resource] = (size, count, ids)
+        return self.populated[resource][2]
+
+    def populate_large(self):
+        """
+        Fills simpledoc resource with :attr:`large_population` documents (if
+        not filled yet). Documents are written directly to the storage,
+        validation of millions of them would take too long.
+        """
+        count = self.large_population
+        if self.populated.get('simpledoc', (None, None))[:2] == (None, count):
+            return
+        data = self.app.data
+        with self.app.test_request_context():
+            data.remove('simpledoc', {})
+        now = datetime.utcnow().replace(microsecond=0)
+        template = dict(SimpleDoc(a='', b=0).to_mongo())
+        template[config.DATE_CREATED] = template[config.LAST_UPDATED] = now
+        collection = SimpleDoc._get_collection() \
+            if self.backend == 'mongod' else None
+        for start in range(0, count, LARGE_BATCH):
+            documents = [dict(template, _id=ObjectId(), a='document %d' % n,
+                              b=n)
+                         for n in range(start, min(start + LARGE_BATCH,
+                                                   count))]
+            if collection is None:
+                with data.lock:
+                    stored = data._collection('simpledoc')
+                    for document in documents:
+                        stored[document['_id']] = document
+            elif hasattr(collection, 'insert_many'):
+                collection.insert_many(documents)
+            else:
+                collection.insert(documents)
+        data._invalidate_caches('simpledoc')
+        self.populated['simpledoc'] = (None, count, None)
+
+    def find(self, resource, page):
+        """
+        Returns the first page of resource as returned by the data layer.
+        """
+        with self.app.test_request_context('/%s/?max_results=%d'
+                                           % (resource, page)):
+            return list(self.app.data.find(resource, parse_request(resource),
+                                           {}))
+
+    def clear(self):
+        for resource in ('simpledoc', 'complexdoc', 'limiteddoc'):
+            with self.app.test_request_context():
+                self.app.data.remove(resource, {})
+        self.populated.clear()
+
+
+def get_list(ctx, repeat, doc, page):
+    ctx.populate('complexdoc', DOC_SIZES[doc], max(page, POPULATION))
+    url = '/complexdoc/?max_results=%d' % page
+    return [partial(ctx.request, 'GET', url)] * repeat
+
+
+def get_large_list(ctx, repeat, page):
+    # filtered page and count of the same spec on the large collection
+    ctx.populate_large()
+    url = '/simpledoc/?where={"b": {"$gte": 0}}&max_results=%d' % page
+    return [partial(ctx.request, 'GET', url)] * repeat
+
+
+def get_item(ctx, repeat, doc):
+    ids = ctx.populate('complexdoc', DOC_SIZES[doc])
+    return [partial(ctx.request, 'GET', '/complexdoc/%s' % ids[n % len(ids)])
+            for n in range(repeat)]
+
+
+def post_simple(ctx, repeat):
+    return [partial(ctx.request, 'POST', '/simpledoc/',
+                    simple_doc(ctx.unique())) for _ in range(repeat)]
+
+
+def post_limited(ctx, repeat):
+    # field limits and choices validated
+    return [partial(ctx.request, 'POST', '/limiteddoc/',
+                    limited_doc(ctx.unique())) for _ in range(repeat)]
+
+
+def post_complex(ctx, repeat, doc):
+    return [partial(ctx.request, 'POST', '/complexdoc/',
+                    complex_doc(DOC_SIZES[doc])) for _ in range(repeat)]
+
+
+def post_bulk(ctx, repeat, doc, batch):
+    payload = [complex_doc(DOC_SIZES[doc], n) for n in range(batch)]
+    return [partial(ctx.request, 'POST', '/complexdoc/', payload)] * repeat
+
+
+def patch(ctx, repeat, doc):
+    ids = ctx.populate('complexdoc', DOC_SIZES[doc])
+    urls = ['/complexdoc/%s' % ids[n % len(ids)] for n in range(repeat)]
+    return [partial(ctx.request, 'PATCH', url,
+                    {'i': {'a': 'patched', 'b': n}, 'l': ['patched']})
+            for n, url in enumerate(urls)]
+
+
+def put(ctx, repeat, doc):
+    ids = ctx.populate('complexdoc', DOC_SIZES[doc])
+    urls = ['/complexdoc/%s' % ids[n % len(ids)] for n in range(repeat)]
+    return [partial(ctx.request, 'PUT', url, complex_doc(DOC_SIZES[doc], n))
+            for n, url in enumerate(urls)]
+
+
+def delete(ctx, repeat):
+    ids = ctx.insert('simpledoc', [simple_doc(ctx.unique())
+                                   for _ in range(repeat)])
+    return [partial(ctx.request, 'DELETE', '/simpledoc/%s' % id_)
+            for id_ in ids]
+
+
+def encode(ctx, repeat, doc, page, backend=None):
+    ctx.populate('complexdoc', DOC_SIZES[doc])
+    payload = {config.ITEMS: ctx.find('complexdoc', page)}
+    encoder = MongoengineJsonEncoder()
+    if backend is not None:
+        encoder.backend = backend
+        # compared backends have to produce the same output
+        if json.loads(encoder.encode(payload)) != \
+                json.loads(MongoengineJsonEncoder().encode(payload)):
+            raise BenchmarkError('%s output differs from simplejson'
+                                 % backend)
+    return [partial(encoder.encode, payload)] * repeat
+
+
+def hydrate(ctx, repeat, doc, rows, lightweight):
+    # conversion of raw documents of a page to SON returned by find()
+    ctx.populate('complexdoc', DOC_SIZES[doc], rows)
+    page = list(ComplexDoc._get_collection().find().limit(rows))
+    if lightweight:
+        cls = row_class(ComplexDoc)
+        convert = lambda: [cls(son).to_mongo() for son in page]
+    else:
+        convert = lambda: [ComplexDoc._from_son(son).to_mongo()
+                           for son in page]
+    return [convert] * repeat
+
+
+def clean(ctx, repeat, doc, recursive):
+    documents = [ComplexDoc(**complex_doc(DOC_SIZES[doc], n)).to_mongo()
+                 for n in range(repeat)]
+    return [partial(clean_doc, document, recursive)
+            for document in documents]
+
+
+def clean_wide(ctx, repeat, fields, recursive):
+    documents = [wide_doc(fields) for _ in range(repeat)]
+    return [partial(clean_doc, document, recursive)
+            for document in documents]
+
+
+def export(ctx, repeat, workers):
+    from eve_mongoengine.export import prepare_export, run_export
+    ctx.populate('complexdoc', DOC_SIZES['small'])
+    with ctx.app.app_context():
+        job = prepare_export('complexdoc', range_size=POPULATION // 4)
+    return [lambda: list(run_export(job, workers))] * repeat
+
+
+def export_cursor(ctx, repeat):
+    # the whole resource encoded from single cursor, baseline of export
+    from eve_mongoengine.export import ExportJsonEncoder
+    ctx.populate('complexdoc', DOC_SIZES['small'])
+    collection = ComplexDoc._get_collection()
+    encoder = ExportJsonEncoder(config.DATE_FORMAT)
+
+    def scan():
+        return [encoder.encode(document) for document in collection.find()]
+    return [scan] * repeat
+
+
+def _cases():
+    cases = []
+    for doc in sorted(DOC_SIZES):
+        for page in (25, 100, 500):
+            cases.append(Case('get_list', get_list, {'doc': doc,
+                                                     'page': page}))
+            cases.append(Case('encode', encode, {'doc': doc, 'page': page}))
+            for backend in sorted(json_backends):
+                cases.append(Case('encode', encode, {
+                    'doc': doc, 'page': page, 'backend': backend}))
+        cases.extend([
+            Case('get_item', get_item, {'doc': doc}),
+            Case('get_item', get_item, {'doc': doc}, 'complexdoc',
+                 {'document_cache': True}),
+            Case('patch', patch, {'doc': doc}, 'complexdoc',
+                 {'use_atomic_update_for_patch': True}),
+            Case('patch', patch, {'doc': doc}, 'complexdoc',
+                 {'use_atomic_update_for_patch': False}),
+            Case('put', put, {'doc': doc}),
+            Case('post_complex', post_complex, {'doc': doc}),
+            Case('post_complex', post_complex, {'doc': doc}, 'complexdoc',
+                 {'compiled_validation': True}),
+            Case('post_bulk', post_bulk, {'doc': doc, 'batch': 100}),
+            Case('clean_doc', clean, {'doc': doc, 'recursive': False}),
+            Case('clean_doc', clean, {'doc': doc, 'recursive': True}),
+        ])
+    cases.extend([
+        Case('get_list', get_list, {'doc': 'small', 'page': 25},
+             'complexdoc', {'concurrent_count': True}),
+        Case('get_list', get_list, {'doc': 'small', 'page': 25},
+             'complexdoc', {'page_cache': True}),
+        Case('get_large_list', get_large_list, {'page': 25}),
+        Case('get_large_list', get_large_list, {'page': 25}, 'simpledoc',
+             {'concurrent_count': True}, backends=['mongod']),
+        Case('get_list', get_list, {'doc': 'small', 'page': BIG_PAGE}),
+        Case('get_list', get_list, {'doc': 'small', 'page': BIG_PAGE},
+             'complexdoc', {'lightweight_rows': True}),
+        Case('hydrate', hydrate, {'doc': 'small', 'rows': BIG_PAGE,
+                                  'lightweight': False}, backends=['mongod']),
+        Case('hydrate', hydrate, {'doc': 'small', 'rows': BIG_PAGE,
+                                  'lightweight': True}, backends=['mongod']),
+        Case('clean_doc', clean_wide, {'fields': 1000, 'recursive': False}),
+        Case('clean_doc', clean_wide, {'fields': 1000, 'recursive': True}),
+        Case('post_simple', post_simple),
+        Case('post_limited', post_limited),
+        Case('post_limited', post_limited, None, 'limiteddoc',
+             {'compiled_validation': True}),
+        Case('delete', delete),
+        Case('export', export, {'workers': 0}, backends=['mongod']),
+        Case('export', export, {'workers': 4}, backends=['mongod']),
+        Case('export_cursor', export_cursor, backends=['mongod']),
+    ])
+    return cases
+
+
+#: All benchmark cases.
+CASES = _cases()
@@ -0,0 +1,188 @@
+
+"""
+    benchmarks.runner
+    ~~~~~~~~~~~~~~~~~
+
+    Timing of benchmark cases, JSON results and their comparison.
+
+    Results file contains ``meta`` (backend, versions, date) and
+    ``results``: timings of cases keyed by case name (i.e.
+    ``get_list[doc=small,page=25]``) with ``min``, ``median``, ``mean``
+    and ``p95`` seconds per operation, ``ops`` (operations per second),
+    number of ``repeat`` timed operations and optionally ``memory_peak``
+    (maximal bytes allocated at once by one operation).
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import json
+import timeit
+import fnmatch
+import platform
+from datetime import datetime
+
+
+_timer = timeit.default_timer
+
+
+class BenchmarkError(Exception):
+    """
+    Raised when benchmarked operation fails (i.e. request is rejected).
+    """
+
+
+class Case(object):
+    """
+    Benchmark case.
+
+    :param name: base name of the case, parameters are appended to it.
+    :param prepare: function ``prepare(ctx, repeat, **params)`` returning
+                    list of ``repeat`` callables, which are timed one by one
+                    (per-operation data, i.e. documents to be deleted, are
+                    created by ``prepare`` outside of measured time).
+    :param params: parameters passed to ``prepare``.
+    :param resource: resource the ``options`` are set on.
+    :param options: mongoengine options set on resource during the case
+                    (see :attr:`MongoengineDataLayer.mongoengine_options`).
+    :param backends: names of backends the case runs with, None for all.
+    """
+    def __init__(self, name, prepare, params=None, resource=None,
+                 options=None, backends=None):
+        self.prepare = prepare
+        self.params = params or {}
+        self.resource = resource
+        self.options = options or {}
+        self.backends = backends
+        labels = ['%s=%s' % item for item in sorted(self.params.items())]
+        labels.extend(name if value is True else '%s=%s' % (name, value)
+                      for name, value in sorted(self.options.items()))
+        self.name = '%s[%s]' % (name, ','.join(labels)) if labels else name
+
+
+def measure(calls):
+    """
+    Times callables one by one, returns their statistics.
+    """
+    timings = []
+    for call in calls:
+        start = _timer()
+        call()
+        timings.append(_timer() - start)
+    timings.sort()
+    count = len(timings)
+    total = sum(timings)
+    return {
+        'repeat': count,
+        'min': timings[0],
+        'median': timings[count // 2],
+        'mean': total / count,
+        'p95': timings[min(count - 1, int(count * 0.95))],
+        'ops': count / total if total else None,
+    }
+
+
+def measure_memory(calls):
+    """
+    Returns maximal number of bytes allocated at once by one of callables
+    (traced by :mod:`tracemalloc`, Python 3.4+).
+    """
+    import tracemalloc
+    peak = 0
+    for call in calls:
+        tracemalloc.start()
+        try:
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+def run(cases, ctx, repeat=50, warmup=5, pattern=None, memory=False,
+        out=sys.stdout):
+    """
+    Runs cases (matching shell-style ``pattern``) and returns results dict.
+    If ``memory`` is True, peak memory of operations is measured in
+    separate (untimed) pass.
+    """
+    results = {}
+    for case in cases:
+        if pattern and not fnmatch.fnmatch(case.name, pattern):
+            continue
+        if case.backends is not None and ctx.backend not in case.backends:
+            continue
+        with ctx.options(case.resource, case.options):
+            if warmup:
+                for call in case.prepare(ctx, warmup, **case.params):
+                    call()
+            stats = measure(case.prepare(ctx, repeat, **case.params))
+            if memory:
+                stats['memory_peak'] = measure_memory(
+                    case.prepare(ctx, min(repeat, 3), **case.params))
+        results[case.name] = stats
+        out.write('%-60s %10.3f ms %10.1f ops/s'
+                  % (case.name, stats['median'] * 1000, stats['ops'] or 0))
+        if memory:
+            out.write(' %10.1f KiB' % (stats['memory_peak'] / 1024.0))
+        out.write('\n')
+        out.flush()
+    return results
+
+
+def metadata(backend, repeat):
+    """
+    Returns ``meta`` of results file.
+    """
+    import eve
+    import mongoengine
+    return {
+        'backend': backend,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'eve': eve.__version__,
+        'mongoengine': mongoengine.__version__,
+        'created': datetime.utcnow().isoformat(),
+    }
+
+
+def save(path, meta, results):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2,
+                  sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, current, threshold=0.1):
+    """
+    Compares median timings of cases present in both results. Returns list
+    of rows ``(name, base median, current median, ratio, flag)`` and number
+    of regressions (cases slower by more than ``threshold``).
+    """
+    base, current = base['results'], current['results']
+    rows = []
+    regressions = 0
+    for name in sorted(set(base) & set(current)):
+        before, after = base[name]['median'], current[name]['median']
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 / (1 + threshold):
+            flag = 'improvement'
+        rows.append((name, before, after, ratio, flag))
+    return rows, regressions
+
+
+def print_comparison(rows, out=sys.stdout):
+    out.write('%-60s %10s %10s %7s\n' % ('case', 'base ms', 'ms', 'ratio'))
+    for name, before, after, ratio, flag in rows:
+        out.write('%-60s %10.3f %10.3f %7.2f %s\n'
+                  % (name, before * 1000, after * 1000, ratio, flag))
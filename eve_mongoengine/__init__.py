@@ -21,7 +21,11 @@ from .schema import SchemaMapper
 from .datalayer import MongoengineDataLayer
 from .struct import Settings
 from .validation import EveMongoengineValidator
-from ._compat import itervalues, iteritems
+from .media import media_endpoint
+from . import multiget
+from .export import export_endpoint
+from .bulkimport import import_endpoint
+from ._compat import itervalues, iteritems, basestring
 
 
 from .__version__ import get_version
@@ -84,8 +88,19 @@ class EveMongoengine(object):
     #: subclassed in the future to support new mongoenigne's fields.
     schema_mapper_class = SchemaMapper
 
+    #: If True, :func:`add_model` creates (in background) indexes of Eve's
+    #: date fields (updated and created), which are used by conditional
+    #: requests (``If-Modified-Since``), and compound indexes of common sort
+    #: keys followed by updated field. Value ``'dry_run'`` only reports indexes
+    #: which would be created. May be overwritten per model by
+    #: ``date_indexes`` setting of :func:`add_model`.
+    date_indexes = False
+
     def __init__(self, app=None):
         self.models = {}
+        #: Indexes created (or to be created in dry run) by
+        #: :func:`ensure_date_indexes`, keyed by resource name.
+        self.date_index_report = {}
         if app is not None:
             self.init_app(app)
 
@@ -118,6 +133,8 @@ class EveMongoengine(object):
         self._parse_config()
         # overwrite default data layer to get proper mongoengine functionality
         app.data = self.datalayer_class(self)
+        app.before_request(app.data.start_profile)
+        app.teardown_request(app.data.stop_profile)
 
     def _set_default_settings(self, settings):
         """
@@ -167,6 +184,14 @@ class EveMongoengine(object):
             resource_settings.update(settings)
             # register to the app
             self.app.register_resource(resource_name, resource_settings)
+            self._add_media_url_rule(resource_name, model_cls)
+            self._add_multiget(resource_name)
+            self._add_export_url_rule(resource_name)
+            self._add_import_url_rule(resource_name)
+            date_indexes = settings.get('date_indexes', self.date_indexes)
+            if date_indexes:
+                self.ensure_date_indexes(resource_name,
+                                         dry_run=date_indexes == 'dry_run')
             # add sub-resource functionality for every ReferenceField
             subresources = self.schema_mapper_class.get_subresource_settings
             for registration in subresources(model_cls, resource_name,
@@ -174,6 +199,143 @@ class EveMongoengine(object):
                 self.app.register_resource(*registration)
                 self.models[registration[0]] = model_cls
 
+    def _add_media_url_rule(self, resource_name, model_cls):
+        """
+        Adds endpoint ``/<resource>/<id>/<field>`` streaming files stored in
+        model's FileFields.
+        """
+        settings = self.app.config['DOMAIN'][resource_name]
+        if settings['internal_resource'] or not settings['item_lookup']:
+            return
+        media_fields = [f.db_field for f in itervalues(model_cls._fields)
+                        if isinstance(f, mongoengine.FileField)]
+        if not media_fields:
+            return
+        url = '%s/%s/<%s:%s>/<any(%s):media_field>' % (
+            self.app.api_prefix, settings['url'], settings['item_url'],
+            settings['item_lookup_field'], ', '.join(media_fields))
+        self.app.add_url_rule(url, resource_name + "|item_media",
+                              view_func=media_endpoint, methods=['GET'])
+
+    def get_date_index_specs(self, resource_name):
+        """
+        Returns mongoengine's index specs (dicts with ``fields`` key) of
+        indexes supporting queries on Eve's date fields of given resource:
+        single-field indexes of updated and created fields and compound
+        indexes of default sort keys (resource's ``default_sort`` and model's
+        ``ordering``) followed by updated field.
+        """
+        model_cls = self.models[resource_name]
+        settings = self.app.config['DOMAIN'][resource_name]
+        updated = self.last_updated.lstrip('_')
+        created = self.date_created.lstrip('_')
+        key_lists = [[updated], [created]]
+
+        sorts = []
+        default_sort = settings['datasource'].get('default_sort')
+        if default_sort:
+            reverse_map = model_cls._reverse_db_field_map
+            sorts.append([('-' if direction < 0 else '') +
+                          reverse_map.get(db_field, db_field)
+                          for db_field, direction in default_sort])
+        ordering = model_cls._meta.get('ordering')
+        if ordering:
+            sorts.append(list(ordering))
+        for keys in sorts:
+            if not keys or keys[0].lstrip('+-') in (updated, created):
+                # served by single-field indexes
+                continue
+            key_lists.append(keys + [updated])
+
+        specs = []
+        for keys in key_lists:
+            try:
+                spec = model_cls._build_index_spec({'fields': keys})
+            except mongoengine.errors.LookUpError:
+                # sort by field unknown to the model
+                continue
+            if spec not in specs:
+                specs.append(spec)
+        return specs
+
+    def ensure_date_indexes(self, resource_name, dry_run=False):
+        """
+        Declares indexes returned by :func:`get_date_index_specs` in the
+        model's meta and creates those which are missing in the collection.
+        Indexes are built in background, so that the collection is not
+        locked during the build.
+
+        Returns list of keys (lists of ``(db_field, direction)`` tuples) of
+        created indexes, which is also stored in :attr:`date_index_report`.
+
+        :param resource_name: name of registered resource.
+        :param dry_run: if True, nothing is created, only the list of missing
+                        indexes is returned (and logged).
+        """
+        model_cls = self.models[resource_name]
+        collection = model_cls._get_collection()
+        existing = [_index_key(info['key'])
+                    for info in itervalues(collection.index_information())]
+        declared = model_cls._meta.setdefault('index_specs', [])
+        missing = []
+        for spec in self.get_date_index_specs(resource_name):
+            fields = spec['fields']
+            # index is usable also if its key starts with given fields
+            if any(key[:len(fields)] == fields for key in existing):
+                continue
+            missing.append(fields)
+            if dry_run:
+                self.app.logger.info("Index %s of resource '%s' would be "
+                                     "created." % (fields, resource_name))
+                continue
+            if fields not in [s['fields'] for s in declared]:
+                declared.append(spec)
+            collection.create_index(fields, background=True)
+            existing.append(fields)
+        self.date_index_report[resource_name] = missing
+        return missing
+
+    def _add_multiget(self, resource_name):
+        """
+        Enables fetching items by ids on collection endpoint
+        (``GET /<resource>?ids=<id1>,<id2>``, see :mod:`multiget`).
+        """
+        settings = self.app.config['DOMAIN'][resource_name]
+        if settings['internal_resource'] or \
+                'GET' not in settings['resource_methods']:
+            return
+        endpoint = resource_name + "|resource"
+        self.app.view_functions[endpoint] = multiget.collections_endpoint
+
+    def _add_export_url_rule(self, resource_name):
+        """
+        Adds endpoint ``/<resource>/export`` streaming all documents of
+        resource with ``export`` option (see :mod:`export`).
+        """
+        settings = self.app.config['DOMAIN'][resource_name]
+        export = settings.get('export',
+                              self.app.data.mongoengine_options['export'])
+        if not export or settings['internal_resource']:
+            return
+        url = '%s/%s/export' % (self.app.api_prefix, settings['url'])
+        self.app.add_url_rule(url, resource_name + "|export",
+                              view_func=export_endpoint, methods=['GET'])
+
+    def _add_import_url_rule(self, resource_name):
+        """
+        Adds endpoint ``POST /<resource>/import`` importing NDJSON into
+        resource with ``bulk_import`` option (see :mod:`bulkimport`).
+        """
+        settings = self.app.config['DOMAIN'][resource_name]
+        bulk_import = settings.get(
+            'bulk_import', self.app.data.mongoengine_options['bulk_import'])
+        if not bulk_import or settings['internal_resource'] or \
+                'POST' not in settings['resource_methods']:
+            return
+        url = '%s/%s/import' % (self.app.api_prefix, settings['url'])
+        self.app.add_url_rule(url, resource_name + "|import",
+                              view_func=import_endpoint, methods=['POST'])
+
     def fix_model_class(self, model_cls):
         """
         Internal method invoked during registering new model.
@@ -239,6 +401,15 @@ class EveMongoengine(object):
             model_cls._fields_ordered = tuple(i[1] for i in sorted(created))
 
 
+def _index_key(key):
+    """
+    Normalizes index key returned by pymongo's ``index_information()`` into
+    list of ``(db_field, direction)`` tuples with integer directions.
+    """
+    return [(field, direction if isinstance(direction, basestring)
+             else int(direction)) for field, direction in key]
+
+
 def fix_last_updated(sender, document, **kwargs):
     """
     Hook which updates LAST_UPDATED field before every Document.save() call.
@@ -0,0 +1,417 @@
+
+"""
+    eve_mongoengine.advisor
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Index advisor, which records shapes of queries executed by the data layer
+    (filtered fields, sort and projection, without values), periodically
+    explains sampled shapes and suggests indexes for those which scan whole
+    collection or sort documents in memory.
+
+    Saved report may be printed from command line::
+
+        $ python -m eve_mongoengine.advisor report.json
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from collections import OrderedDict
+
+from pymongo.errors import PyMongoError
+
+from ._compat import iteritems, itervalues, basestring
+
+
+#: Query operators, which are treated as equality conditions when suggesting
+#: index keys (equality fields go first, then sort keys, then ranges).
+EQUALITY_OPERATORS = ('$eq', '$in', '$all')
+
+#: Query operators, which cannot be served by ordinary (ascending or
+#: descending) index. Fields queried by them are left out of suggestions.
+SPECIAL_OPERATORS = ('$near', '$nearSphere', '$geoWithin', '$geoIntersects',
+                     '$within', '$where', '$text')
+
+
+def _condition_kind(value):
+    """
+    Returns space separated names of operators used in query condition of
+    one field (``'$eq'`` for plain value).
+    """
+    if isinstance(value, dict) and value and \
+            all(key.startswith('$') for key in value):
+        return ' '.join(sorted(value))
+    return '$eq'
+
+
+def filter_shape(spec):
+    """
+    Returns shape of query filter: sorted tuple of ``(field, kind)`` pairs,
+    where kind is string with names of used operators. Conditions in
+    ``$and`` are merged into upper level, clauses of ``$or`` and ``$nor`` are
+    kept as nested shapes.
+    """
+    shape = set()
+    for key, value in iteritems(spec):
+        if key == '$and':
+            for clause in value:
+                shape.update(filter_shape(clause))
+        elif key in ('$or', '$nor'):
+            clauses = set(filter_shape(clause) for clause in value)
+            shape.add((key, tuple(sorted(clauses))))
+        elif key.startswith('$'):
+            shape.add((key, key))
+        else:
+            shape.add((key, _condition_kind(value)))
+    return tuple(sorted(shape))
+
+
+def query_shape(find_args):
+    """
+    Returns hashable shape of query given by arguments of pymongo's
+    ``find()`` (see :func:`datalayer.queryset_to_find_args`).
+    """
+    fields = find_args.get('fields') or {}
+    return (filter_shape(find_args['spec']),
+            tuple(tuple(key) for key in find_args.get('sort') or ()),
+            tuple(sorted(iteritems(fields))))
+
+
+def suggest_index(shape):
+    """
+    Returns suggested index key (list of ``(field, direction)`` tuples) for
+    query of given shape or None. Fields compared for equality come first,
+    then sort keys and finally fields queried by ranges. Clauses of ``$or``
+    are not taken into account (every clause needs its own index).
+    """
+    filter_, sort, _ = shape
+    equality, ranges = [], []
+    for field, kind in filter_:
+        if field.startswith('$'):
+            continue
+        operators = kind.split()
+        if any(op in SPECIAL_OPERATORS for op in operators):
+            continue
+        if all(op in EQUALITY_OPERATORS for op in operators):
+            equality.append(field)
+        else:
+            ranges.append(field)
+    key = [(field, 1) for field in equality]
+    used = set(equality)
+    for field, direction in sort:
+        if field not in used:
+            key.append((field, direction))
+            used.add(field)
+    key.extend((field, 1) for field in ranges if field not in used)
+    return key or None
+
+
+def _plan_stages(plan):
+    """
+    Yields all stages of query plan (from explain output of MongoDB 3.0+).
+    """
+    yield plan
+    children = list(plan.get('inputStages', []))
+    if 'inputStage' in plan:
+        children.append(plan['inputStage'])
+    for shard in plan.get('shards', []):
+        children.append(shard.get('winningPlan', {}))
+    for child in children:
+        for stage in _plan_stages(child):
+            yield stage
+
+
+def parse_explain(explain):
+    """
+    Returns dict with keys ``collscan`` (whole collection is scanned),
+    ``in_memory_sort`` (documents are sorted without index) and ``indexes``
+    (names of used indexes) out of output of ``cursor.explain()``. Both
+    explain formats (before and since MongoDB 3.0) are supported.
+    """
+    if 'queryPlanner' in explain:
+        stages = list(_plan_stages(explain['queryPlanner']['winningPlan']))
+        names = [stage.get('stage') for stage in stages]
+        return {
+            'collscan': 'COLLSCAN' in names,
+            'in_memory_sort': 'SORT' in names,
+            'indexes': [stage['indexName'] for stage in stages
+                        if 'indexName' in stage],
+        }
+    cursor = explain.get('cursor', '')
+    indexes = []
+    if cursor.startswith('BtreeCursor '):
+        indexes.append(cursor.split(' ')[1])
+    return {
+        'collscan': cursor.startswith('BasicCursor'),
+        'in_memory_sort': bool(explain.get('scanAndOrder')),
+        'indexes': indexes,
+    }
+
+
+def _shape_to_json(filter_):
+    """
+    Converts filter shape into JSON-serializable list.
+    """
+    result = []
+    for key, kind in filter_:
+        if isinstance(kind, tuple):
+            kind = [_shape_to_json(clause) for clause in kind]
+        result.append([key, kind])
+    return result
+
+
+def _is_declared(model_cls, key):
+    """
+    Returns True if some index declared in model's meta starts with given
+    key (optionally preceded by ``_cls``).
+    """
+    for spec in model_cls._meta.get('index_specs') or []:
+        fields = [tuple(field) for field in spec['fields']]
+        if fields and fields[0][0] == '_cls' and key[0][0] != '_cls':
+            fields = fields[1:]
+        if fields[:len(key)] == key:
+            return True
+    return False
+
+
+class IndexAdvisor(object):
+    """
+    Collects shapes of queries and their explain plans.
+
+    Instance is available as ``app.data.index_advisor``, queries are recorded
+    for resources with ``index_advisor`` option (see
+    :attr:`MongoengineDataLayer.mongoengine_options`). Every attribute may be
+    overriden by keyword argument of the constructor.
+    """
+    #: Fraction of queries, which are recorded.
+    sample_rate = 1.0
+
+    #: Minimal number of seconds between two analyses of recorded shapes.
+    explain_interval = 60
+
+    #: Maximal number of shapes explained during one analysis.
+    explain_sample_size = 5
+
+    #: Number of seconds after which explained shape may be explained again
+    #: (indexes may have changed).
+    explain_ttl = 3600
+
+    #: If True, analyses run in background thread, not in the request.
+    background = True
+
+    #: If set, report is saved into this file after every analysis.
+    report_file = None
+
+    #: Maximal number of recorded shapes (filtered fields come from clients).
+    #: When exceeded, least recently seen shape is dropped.
+    max_shapes = 1000
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        # (resource, shape) -> stats dict, least recently seen first
+        self.shapes = OrderedDict()
+        #: number of shapes dropped because of :attr:`max_shapes`
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.last_analysis = time.time()
+
+    def record(self, resource, model_cls, find_args):
+        """
+        Records query executed for given resource.
+
+        :param resource: resource name.
+        :param model_cls: mongoengine model queried.
+        :param find_args: arguments of pymongo's ``find()``, see
+                          :func:`datalayer.queryset_to_find_args`.
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        shape = query_shape(find_args)
+        now = time.time()
+        key = (resource, shape)
+        with self.lock:
+            stats = self.shapes.pop(key, None)
+            if stats is None:
+                stats = {
+                    'resource': resource, 'shape': shape, 'count': 0,
+                    'explained_at': None, 'plan': None, 'error': None
+                }
+                while len(self.shapes) >= self.max_shapes:
+                    self.shapes.popitem(last=False)
+                    self.dropped += 1
+            # (re)inserted as the most recently seen
+            self.shapes[key] = stats
+            stats['count'] += 1
+            # latest example is used for explain
+            stats['model'] = model_cls
+            stats['args'] = find_args
+            due = now - self.last_analysis >= self.explain_interval
+            if due:
+                self.last_analysis = now
+        if not due:
+            return
+        if self.background:
+            thread = threading.Thread(target=self.analyze)
+            thread.daemon = True
+            thread.start()
+        else:
+            self.analyze()
+
+    def analyze(self, sample_size=None):
+        """
+        Explains random sample of recorded shapes, which have not been
+        explained yet (or during last :attr:`explain_ttl` seconds).
+
+        :param sample_size: maximal number of explained shapes, default
+                            :attr:`explain_sample_size`.
+        """
+        if sample_size is None:
+            sample_size = self.explain_sample_size
+        now = time.time()
+        with self.lock:
+            candidates = [stats for stats in itervalues(self.shapes)
+                          if stats['explained_at'] is None or
+                          now - stats['explained_at'] >= self.explain_ttl]
+        sample = random.sample(candidates, min(sample_size, len(candidates)))
+        for stats in sample:
+            self._explain(stats)
+        if self.report_file:
+            self.save(self.report_file)
+
+    def _explain(self, stats):
+        with self.lock:
+            args, model_cls = stats['args'], stats['model']
+        collection = model_cls._get_collection()
+        cursor = collection.find(args['spec'], args.get('fields'))
+        if args.get('sort'):
+            cursor = cursor.sort(args['sort'])
+        plan = error = None
+        try:
+            plan = parse_explain(cursor.explain())
+        except PyMongoError as e:
+            error = str(e)
+        with self.lock:
+            if plan is not None:
+                stats['plan'] = plan
+            stats['error'] = error
+            stats['explained_at'] = time.time()
+
+    def report(self, resource=None):
+        """
+        Returns list of recorded query shapes (of given resource or all),
+        most frequent first. Every item is dict with keys:
+
+        - ``resource``, ``filter``, ``sort``, ``projection`` - query shape,
+        - ``count`` - number of recorded queries,
+        - ``explained`` - if the shape has been explained,
+        - ``collscan``, ``in_memory_sort``, ``indexes`` - see
+          :func:`parse_explain`,
+        - ``suggested_index`` - index key for shapes scanning collection or
+          sorting in memory, else None,
+        - ``declared`` - if the suggested index is declared in model's meta
+          (if so, it has not been created in the database).
+        """
+        with self.lock:
+            shapes = [dict(stats) for stats in itervalues(self.shapes)
+                      if resource is None or stats['resource'] == resource]
+        shapes.sort(key=lambda stats: (-stats['count'], stats['resource']))
+        result = []
+        for stats in shapes:
+            filter_, sort, projection = stats['shape']
+            plan = stats['plan'] or {}
+            item = {
+                'resource': stats['resource'],
+                'filter': _shape_to_json(filter_),
+                'sort': [list(key) for key in sort],
+                'projection': [list(key) for key in projection],
+                'count': stats['count'],
+                'explained': stats['plan'] is not None,
+                'collscan': plan.get('collscan', False),
+                'in_memory_sort': plan.get('in_memory_sort', False),
+                'indexes': plan.get('indexes', []),
+                'error': stats['error'],
+                'suggested_index': None,
+                'declared': False,
+            }
+            if item['collscan'] or item['in_memory_sort']:
+                key = suggest_index(stats['shape'])
+                if key is not None:
+                    item['suggested_index'] = [list(k) for k in key]
+                    item['declared'] = _is_declared(stats['model'], key)
+            result.append(item)
+        return result
+
+    def save(self, path):
+        """
+        Saves report into JSON file, which may be printed by
+        ``python -m eve_mongoengine.advisor <path>``.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def reset(self):
+        """
+        Forgets all recorded shapes.
+        """
+        with self.lock:
+            self.shapes.clear()
+            self.dropped = 0
+
+
+def format_report(report):
+    """
+    Returns human-readable text out of report (see
+    :func:`IndexAdvisor.report`).
+    """
+    lines = []
+    for item in report:
+        conditions = ', '.join('%s %s' % (key, kind if isinstance(kind, basestring)
+                                          else '(%d clauses)' % len(kind))
+                               for key, kind in item['filter'])
+        lines.append('%s: %dx filter {%s} sort %s' % (
+            item['resource'], item['count'], conditions,
+            [tuple(key) for key in item['sort']]))
+        if not item['explained']:
+            status = 'not explained yet'
+        elif item['error']:
+            status = 'explain failed: %s' % item['error']
+        else:
+            problems = [name for name in ('collscan', 'in_memory_sort')
+                        if item[name]]
+            status = ', '.join(problems) or 'ok'
+            if item['indexes']:
+                status += ' (indexes: %s)' % ', '.join(item['indexes'])
+        lines.append('    plan: %s' % status)
+        if item['suggested_index']:
+            declared = ' (declared in meta, but missing in database)' \
+                if item['declared'] else ''
+            lines.append('    suggested index: %s%s' % (
+                [tuple(key) for key in item['suggested_index']], declared))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """
+    Prints report saved by :func:`IndexAdvisor.save`.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.stderr.write('usage: python -m eve_mongoengine.advisor '
+                         '<report.json>\n')
+        return 2
+    with open(argv[0]) as f:
+        report = json.load(f)
+    print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
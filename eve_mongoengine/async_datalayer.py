@@ -0,0 +1,183 @@
+
+"""
+    eve_mongoengine.async_datalayer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    This module implements asyncio variant of read operations of
+    :class:`eve_mongoengine.datalayer.MongoengineDataLayer`. Queries are built
+    by the synchronous data layer (same models, filters and projections), but
+    executed through asyncio driver (motor), so one process can wait for many
+    slow queries at once.
+
+    Requires Python 3.5+ and `motor` package.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from urllib.parse import quote_plus
+
+from .datalayer import queryset_to_find_args, abort_timeout, ExecutionTimeout
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+
+class AsyncMongoengineDataLayer(object):
+    """
+    Asyncio data layer sharing model registry and query construction with
+    given :class:`MongoengineDataLayer`.
+
+    Usage::
+
+        app = Eve()
+        ext = EveMongoengine(app)
+        ext.add_model(Person)
+        async_data = AsyncMongoengineDataLayer(app.data)
+
+        with app.test_request_context('/person/?where={"age": 42}'):
+            req = parse_request('person')
+            pending = async_data.find('person', req, {})
+        people = await pending
+
+    Every method builds the query synchronously when called - it needs Flask
+    request context, just as the synchronous data layer, and the same
+    filters, projections, ``$slice`` and ``max_time_ms`` options apply - and
+    returns awaitable, which only talks to the database. So the awaitable may be
+    awaited after the request context is gone.
+
+    Writes are not supported, they run through mongoengine's
+    :func:`Document.save()` and signals in synchronous data layer.
+    """
+    def __init__(self, datalayer, db=None):
+        """
+        Constructor.
+
+        :param datalayer: instance of :class:`MongoengineDataLayer`.
+        :param db: asyncio database object (i.e. motor's
+                   :class:`AsyncIOMotorDatabase`). If not given, new motor
+                   client is created out of application config.
+        """
+        self.datalayer = datalayer
+        self.cls_map = datalayer.cls_map
+        if db is None:
+            db = self._connect(datalayer.app.config)
+        self.db = db
+
+    def _connect(self, config):
+        """
+        Creates motor database using the same config as synchronous data
+        layer.
+        """
+        if AsyncIOMotorClient is None:
+            raise ImportError("Package 'motor' is required for asyncio "
+                              "data layer.")
+        auth = ''
+        username = config.get('MONGO_USERNAME', None)
+        if username:
+            auth = '%s:%s@' % (quote_plus(username),
+                               quote_plus(config['MONGO_PASSWORD']))
+        uri = 'mongodb://%s%s:%s/%s' % (auth, config['MONGO_HOST'],
+                                        config['MONGO_PORT'],
+                                        config['MONGO_DBNAME'])
+        return AsyncIOMotorClient(uri)[config['MONGO_DBNAME']]
+
+    def _collection(self, qry):
+        return self.db[qry._document._get_collection_name()]
+
+    def _max_time_ms(self, resource):
+        max_time_ms = self.datalayer._resource_option(resource, 'max_time_ms')
+        return None if max_time_ms is None else int(max_time_ms)
+
+    def _cursor(self, resource, qry):
+        """
+        Returns asyncio cursor executing given mongoengine QuerySet.
+        """
+        args = queryset_to_find_args(qry)
+        cursor = self._collection(qry).find(args['spec'], args.get('fields'))
+        if 'sort' in args:
+            cursor = cursor.sort(args['sort'])
+        if 'skip' in args:
+            cursor = cursor.skip(args['skip'])
+        if 'limit' in args:
+            cursor = cursor.limit(args['limit'])
+        max_time_ms = self._max_time_ms(resource)
+        if max_time_ms is not None:
+            cursor = cursor.max_time_ms(max_time_ms)
+        return cursor
+
+    def _to_doc(self, resource, qry, raw_doc):
+        """
+        Converts raw document through mongoengine model, the same way as
+        synchronous data layer does (fields left out by projection are not
+        filled with defaults).
+        """
+        # QuerySet.only_fields is not available in older mongoengine
+        only_fields = getattr(qry, 'only_fields', None)
+        kwargs = {'only_fields': only_fields} if only_fields else {}
+        doc = qry._document._from_son(raw_doc, **kwargs)
+        return self.datalayer._clean_doc(resource, doc.to_mongo())
+
+    def find(self, resource, req, sub_resource_lookup):
+        """
+        Returns awaitable resolving to list of documents.
+
+        See :func:`MongoengineDataLayer.find` for parameters.
+        """
+        qry = self.datalayer._find_queryset(resource, req,
+                                            sub_resource_lookup)
+        return self._find(resource, qry)
+
+    async def _find(self, resource, qry):
+        docs = []
+        try:
+            async for raw_doc in self._cursor(resource, qry):
+                docs.append(self._to_doc(resource, qry, raw_doc))
+        except ExecutionTimeout:
+            abort_timeout()
+        return docs
+
+    def find_one(self, resource, req, **lookup):
+        """
+        Returns awaitable resolving to one document or None.
+
+        See :func:`MongoengineDataLayer.find_one` for parameters.
+        """
+        qry = self.datalayer._find_one_queryset(resource, req, **lookup)
+        return self._find_one(resource, qry)
+
+    async def _find_one(self, resource, qry):
+        args = queryset_to_find_args(qry)
+        raw_doc = await self._collection(qry).find_one(args['spec'],
+                                                       args.get('fields'))
+        if raw_doc is None:
+            return None
+        return self._to_doc(resource, qry, raw_doc)
+
+    def count(self, resource, req, sub_resource_lookup):
+        """
+        Returns awaitable resolving to number of documents matching the
+        request (ignoring pagination).
+        """
+        qry = self.datalayer._find_queryset(resource, req,
+                                            sub_resource_lookup)
+        return self._count(qry, self._max_time_ms(resource))
+
+    async def _count(self, qry, max_time_ms):
+        spec = queryset_to_find_args(qry)['spec']
+        collection = self._collection(qry)
+        try:
+            # motor collection returns sub-collection for unknown attributes
+            if hasattr(type(collection), 'count_documents'):
+                if max_time_ms is None:
+                    return await collection.count_documents(spec)
+                return await collection.count_documents(
+                    spec, maxTimeMS=max_time_ms)
+            cursor = collection.find(spec)
+            if max_time_ms is not None:
+                cursor = cursor.max_time_ms(max_time_ms)
+            return await cursor.count()
+        except ExecutionTimeout:
+            abort_timeout()
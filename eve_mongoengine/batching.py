@@ -0,0 +1,187 @@
+
+"""
+    eve_mongoengine.batching
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Batch size of cursors of :func:`find` (see ``batch_bytes`` and
+    ``batch_size`` options in
+    :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    Documents of a cursor are fetched from MongoDB in batches, every batch
+    after the first one costs a ``getMore`` round trip. Big documents in
+    batches of default size cause many small round trips, tiny documents
+    waste memory of the worker in needlessly big batches (when the limit is
+    not set). :class:`BatchSizer` keeps moving average of BSON size of
+    documents of every resource (measured on first documents of every
+    request) and chooses batch size whose documents take about
+    ``batch_bytes`` option, but at most the limit of the query (page size),
+    so pages fitting the budget are fetched at once.
+
+    Batches fetched by every request are recorded, number of ``getMore``
+    round trips is available by :func:`BatchSizer.stats`.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+
+from bson import BSON
+from bson.errors import InvalidDocument
+
+from ._compat import iteritems
+
+
+class BatchObserver(object):
+    """
+    Records batches of one cursor and sizes of its first documents. Called
+    with every fetched document, :func:`finish` is called when iteration
+    ends.
+    """
+    def __init__(self, sizer, resource, cursor, batch_size):
+        self.sizer = sizer
+        self.resource = resource
+        self.cursor = cursor
+        self.batch_size = batch_size
+        #: number of fetched batches (the first one and getMores)
+        self.batches = 0
+        #: number of fetched documents
+        self.documents = 0
+        #: BSON sizes of measured documents
+        self.sizes = []
+        self._retrieved = 0
+        self._finished = False
+
+    @property
+    def getmores(self):
+        return max(self.batches - 1, 0)
+
+    def __call__(self, doc):
+        # cursor's count of retrieved documents grows with every batch
+        retrieved = self.cursor.retrieved
+        if retrieved != self._retrieved:
+            self.batches += 1
+            self._retrieved = retrieved
+        if len(self.sizes) < self.sizer.sampled_documents:
+            try:
+                self.sizes.append(len(BSON.encode(doc)))
+            except (InvalidDocument, TypeError):
+                pass
+        self.documents += 1
+
+    def finish(self):
+        if not self._finished:
+            self._finished = True
+            self.sizer.record(self)
+
+
+class BatchSizer(object):
+    """
+    Tracks average document size and fetched batches per resource and
+    chooses batch sizes.
+
+    Instance is available as ``app.data.batch_sizer``.
+    """
+    #: Weight of size of new document in moving average.
+    smoothing = 0.2
+
+    #: Number of first documents of every request whose size is measured.
+    sampled_documents = 3
+
+    #: Bounds of chosen batch size (MongoDB closes cursor after the first
+    #: batch of size 1).
+    min_batch_size = 2
+    max_batch_size = 100000
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        # resource -> average BSON size of documents
+        self._sizes = {}
+        # resource -> statistics of fetched batches
+        self._stats = {}
+
+    def average_size(self, resource):
+        """
+        Returns average BSON size of documents of resource or None if none
+        was measured yet.
+        """
+        return self._sizes.get(resource)
+
+    def batch_size(self, resource, budget, limit=None):
+        """
+        Returns batch size whose documents take about ``budget`` bytes, at
+        most ``limit``. None if size of documents is not known yet.
+        """
+        average = self._sizes.get(resource)
+        if average is None:
+            return None
+        size = int(budget // max(average, 1))
+        size = max(self.min_batch_size, min(size, self.max_batch_size))
+        if limit:
+            size = min(size, max(limit, self.min_batch_size))
+        return size
+
+    def observer(self, resource, cursor, batch_size):
+        """
+        Returns :class:`BatchObserver` of ``cursor`` of resource.
+        """
+        return BatchObserver(self, resource, cursor, batch_size)
+
+    def record(self, observer):
+        """
+        Records batches and document sizes of finished cursor.
+        """
+        with self.lock:
+            average = self._sizes.get(observer.resource)
+            for size in observer.sizes:
+                if average is None:
+                    average = float(size)
+                else:
+                    average += self.smoothing * (size - average)
+            if average is not None:
+                self._sizes[observer.resource] = average
+            stats = self._stats.setdefault(observer.resource, {
+                'requests': 0, 'documents': 0, 'getmores': 0,
+                'max_getmores': 0, 'last_getmores': 0,
+                'last_batch_size': None})
+            stats['requests'] += 1
+            stats['documents'] += observer.documents
+            stats['getmores'] += observer.getmores
+            stats['max_getmores'] = max(stats['max_getmores'],
+                                        observer.getmores)
+            stats['last_getmores'] = observer.getmores
+            stats['last_batch_size'] = observer.batch_size
+
+    def stats(self, resource=None):
+        """
+        Returns dict of statistics of resource (or dict of them keyed by
+        resources): number of ``requests``, fetched ``documents``,
+        ``getmores`` round trips (total, per request, maximal and of the
+        last request), ``last_batch_size`` and ``average_size`` of
+        documents.
+        """
+        with self.lock:
+            result = {}
+            for name, stats in iteritems(self._stats):
+                if resource is not None and name != resource:
+                    continue
+                stats = dict(stats)
+                stats['getmores_per_request'] = (float(stats['getmores']) /
+                                                 stats['requests'])
+                stats['average_size'] = self._sizes.get(name)
+                result[name] = stats
+        if resource is not None:
+            return result.get(resource)
+        return result
+
+    def reset(self):
+        """
+        Forgets document sizes and statistics.
+        """
+        with self.lock:
+            self._sizes.clear()
+            self._stats.clear()
@@ -0,0 +1,375 @@
+
+"""
+    eve_mongoengine.bulkimport
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Streaming bulk import of NDJSON (one JSON document per line).
+
+    Lines are read lazily and validated in chunks by pool of worker
+    processes with the same validator as POST requests (generated cerberus
+    schema and mongoengine model validation). Valid documents are written
+    by batched unordered inserts, invalid lines (and lines rejected by the
+    database, e.g. for duplicate keys) are reported with their line numbers.
+    Only a bounded number of chunks is in flight, so memory usage does not
+    depend on size of the input.
+
+    Import is available as endpoint ``POST /<resource>/import`` (for
+    resources with ``bulk_import`` option) and from command line::
+
+        $ python -m eve_mongoengine.bulkimport myapp:app person people.json
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import json
+import argparse
+import importlib
+import multiprocessing
+from collections import deque
+from datetime import datetime
+
+from flask import current_app as app, request, stream_with_context, \
+    has_request_context
+from mongoengine.connection import disconnect
+from pymongo.errors import BulkWriteError
+
+from eve.auth import requires_auth
+from eve.defaults import resolve_default_values
+from eve.methods.common import parse, ratelimit, \
+    resolve_user_restricted_access
+from eve.utils import config
+from eve.validation import ValidationError
+
+from ._compat import bytes, itervalues
+
+
+#: Application used by worker processes (see :func:`_init_worker`).
+_app = None
+
+
+def load_app(path):
+    """
+    Returns application object given as ``module:attribute`` (attribute
+    defaults to ``app``).
+    """
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr or 'app')
+
+
+def _init_worker(app_path=None):
+    """
+    Initializer of validation worker processes: pushes application context
+    of the application given by ``app_path``, or of the application
+    inherited from the parent process, and connects to the database by new
+    client (clients inherited from the parent are not fork-safe).
+    """
+    global _app
+    if app_path:
+        _app = load_app(app_path)
+    _app.app_context().push()
+    disconnect()
+    _app.data._connect(_app.config)
+    # collections are cached by models with the connection
+    for model_cls in itervalues(_app.data.models):
+        model_cls._collection = None
+
+
+def _start_method():
+    """
+    Returns start method of multiprocessing ('fork' on Python 2).
+    """
+    if hasattr(multiprocessing, 'get_start_method'):
+        return multiprocessing.get_start_method()
+    return 'fork'
+
+
+def validate_lines(resource, lines, owner=None):
+    """
+    Validates chunk of NDJSON lines the same way POST requests are
+    validated. Has to be called within application context.
+
+    Returns list of ``(line_no, document, issues)`` tuples. Document of
+    valid line is converted into its raw (database) form, issues are None.
+    Document of invalid line is None.
+
+    :param resource: resource name.
+    :param lines: list of ``(line_no, text)`` tuples.
+    :param owner: fields of user-restricted resource access set to all
+                  valid documents (see :func:`request_owner`).
+    """
+    resource_def = app.config['DOMAIN'][resource]
+    validator = app.validator(resource_def['schema'], resource)
+    date_utc = datetime.utcnow().replace(microsecond=0)
+    results = []
+    for line_no, text in lines:
+        issues = {}
+        try:
+            value = json.loads(text)
+            if not isinstance(value, dict):
+                raise ValueError('Line does not contain JSON object')
+            document = parse(value, resource)
+            if validator.validate(document):
+                document[config.LAST_UPDATED] = \
+                    document[config.DATE_CREATED] = date_utc
+                resolve_default_values(document, resource_def['defaults'])
+                if owner:
+                    document.update(owner)
+                model = app.data._doc_to_model(resource, document)
+                results.append((line_no, model.to_mongo(), None))
+                continue
+            issues = validator.errors
+        except ValidationError as e:
+            issues['validation exception'] = str(e)
+        except Exception as e:
+            issues['exception'] = str(e)
+        results.append((line_no, None, issues))
+    return results
+
+
+def request_owner(resource):
+    """
+    Returns dict with ``auth_field`` of the resource set to auth value of
+    current request (the same as Eve's POST sets), empty dict if
+    user-restricted resource access does not apply.
+    """
+    owner = {}
+    resource_def = app.config['DOMAIN'][resource]
+    if resource_def.get('auth_field') and has_request_context():
+        resolve_user_restricted_access(owner, resource)
+    return owner
+
+
+def insert_batch(collection, batch):
+    """
+    Inserts documents by one unordered bulk insert (all documents are
+    tried, even if some of them fail). Returns list of ``(line_no, error)``
+    tuples of rejected documents.
+
+    Documents are written directly to the collection: ``clean()`` of the
+    model is called by validation, but ``save()`` is not, so its overrides
+    and mongoengine save signals are skipped.
+
+    :param batch: list of ``(line_no, document)`` tuples.
+    """
+    documents = [document for _, document in batch]
+    try:
+        if hasattr(collection, 'insert_many'):
+            collection.insert_many(documents, ordered=False)
+        else:
+            # pymongo < 3.0
+            bulk = collection.initialize_unordered_bulk_op()
+            for document in documents:
+                bulk.insert(document)
+            bulk.execute()
+    except BulkWriteError as e:
+        return [(batch[error['index']][0], error['errmsg'])
+                for error in e.details['writeErrors']]
+    return []
+
+
+class BulkImport(object):
+    """
+    Import of NDJSON lines into a resource.
+
+    :func:`run` yields report entries of rejected lines, counts of lines
+    are available in :attr:`lines`, :attr:`inserted` and :attr:`failed`
+    attributes.
+    """
+    def __init__(self, resource, workers=4, batch_size=1000, app_path=None):
+        """
+        Constructor.
+
+        :param resource: resource name.
+        :param workers: number of validating processes. With 0, lines are
+                        validated by the calling process.
+        :param batch_size: number of lines validated and inserted at once.
+        :param app_path: application as ``module:attribute`` imported by
+                         worker processes. If not given, workers use
+                         application of the parent process, which works
+                         only with 'fork' start method of multiprocessing
+                         (RuntimeError is raised otherwise).
+        """
+        self.resource = resource
+        self.workers = workers
+        self.batch_size = batch_size
+        self.app_path = app_path
+        self.lines = 0
+        self.inserted = 0
+        self.failed = 0
+
+    def _chunks(self, lines):
+        """
+        Groups non-empty lines into chunks of ``(line_no, text)`` tuples.
+        """
+        chunk = []
+        for line_no, text in enumerate(lines, 1):
+            if isinstance(text, bytes):
+                text = text.decode('utf-8')
+            text = text.strip()
+            if not text:
+                continue
+            chunk.append((line_no, text))
+            if len(chunk) >= self.batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _validated(self, lines, owner):
+        """
+        Yields validated chunks (see :func:`validate_lines`) in order of
+        input.
+        """
+        if not self.workers:
+            for chunk in self._chunks(lines):
+                yield validate_lines(self.resource, chunk, owner)
+            return
+
+        if not self.app_path and _start_method() != 'fork':
+            raise RuntimeError("Workers of bulk import need app_path with "
+                               "'%s' start method of multiprocessing."
+                               % _start_method())
+        global _app
+        _app = app._get_current_object()
+        pool = multiprocessing.Pool(self.workers, _init_worker,
+                                    (self.app_path,))
+        pending = deque()
+        try:
+            for chunk in self._chunks(lines):
+                pending.append(pool.apply_async(validate_lines,
+                                                (self.resource, chunk, owner)))
+                # bounded, input is not read until the oldest chunk is done
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _error(self, line_no, issues):
+        self.failed += 1
+        return {'line': line_no, config.STATUS: config.STATUS_ERR,
+                config.ISSUES: issues}
+
+    def _insert(self, collection, batch):
+        """
+        Inserts batch, fires Eve's insert events and returns report entries
+        of rejected documents.
+        """
+        documents = [document for _, document in batch]
+        getattr(app, "on_insert")(self.resource, documents)
+        getattr(app, "on_insert_%s" % self.resource)(documents)
+        errors = insert_batch(collection, batch)
+        self.inserted += len(batch) - len(errors)
+        # new documents change cached pages of the resource
+        app.data._invalidate_caches(self.resource, [])
+        if errors:
+            rejected = set(line_no for line_no, _ in errors)
+            documents = [document for line_no, document in batch
+                         if line_no not in rejected]
+        getattr(app, "on_inserted")(self.resource, documents)
+        getattr(app, "on_inserted_%s" % self.resource)(documents)
+        return [self._error(line_no, {'database': error})
+                for line_no, error in errors]
+
+    def run(self, lines):
+        """
+        Imports lines (iterable of strings or bytes) and yields report
+        entries of rejected lines (dicts with ``line`` number, status and
+        issues). Has to be iterated within application context.
+        """
+        collection = app.data.cls_map[self.resource]._get_collection()
+        owner = request_owner(self.resource)
+        batch = []
+        for results in self._validated(lines, owner):
+            for line_no, document, issues in results:
+                self.lines += 1
+                if document is None:
+                    yield self._error(line_no, issues)
+                else:
+                    batch.append((line_no, document))
+            if len(batch) >= self.batch_size:
+                for entry in self._insert(collection, batch):
+                    yield entry
+                batch = []
+        if batch:
+            for entry in self._insert(collection, batch):
+                yield entry
+
+    def summary(self):
+        """
+        Returns final entry of import report.
+        """
+        status = config.STATUS_ERR if self.failed else config.STATUS_OK
+        return {config.STATUS: status, 'lines': self.lines,
+                'inserted': self.inserted, 'failed': self.failed}
+
+
+def import_endpoint(**lookup):
+    """
+    View function bound to import URL rule of resources with
+    ``bulk_import`` option (see :func:`EveMongoengine.add_model`).
+    """
+    resource = request.endpoint.split('|')[0]
+    return post_import(resource)
+
+
+@ratelimit()
+@requires_auth('resource')
+def post_import(resource):
+    """
+    Imports NDJSON request body into the resource. Response is streamed as
+    NDJSON report: entries of rejected lines followed by summary with
+    counts of lines.
+    """
+    datalayer = app.data
+    importer = BulkImport(
+        resource,
+        datalayer._resource_option(resource, 'bulk_import_workers'),
+        datalayer._resource_option(resource, 'bulk_import_batch_size'))
+
+    def report():
+        for entry in importer.run(request.stream):
+            yield json.dumps(entry) + '\n'
+        yield json.dumps(importer.summary()) + '\n'
+
+    return app.response_class(stream_with_context(report()),
+                              mimetype='application/x-ndjson')
+
+
+def main(argv=None):
+    """
+    Imports NDJSON file into resource of Eve application, writes report of
+    rejected lines to standard output.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m eve_mongoengine.bulkimport',
+        description='Import NDJSON into resource of eve-mongoengine '
+                    'application.')
+    parser.add_argument('app', help='application as module:attribute')
+    parser.add_argument('resource', help='resource name')
+    parser.add_argument('input', help='NDJSON file ("-" for stdin)')
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('-b', '--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    eve_app = load_app(args.app)
+    importer = BulkImport(args.resource, args.workers, args.batch_size,
+                          args.app)
+    source = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        with eve_app.app_context():
+            for entry in importer.run(source):
+                sys.stdout.write(json.dumps(entry) + '\n')
+            sys.stdout.write(json.dumps(importer.summary()) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 1 if importer.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
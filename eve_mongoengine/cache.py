@@ -0,0 +1,205 @@
+
+"""
+    eve_mongoengine.cache
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Read-through cache of documents fetched by
+    :func:`MongoengineDataLayer.find_one` (see ``document_cache`` option in
+    :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    Cached documents are cleaned documents as stored in the database (before
+    projection), keyed by resource and ``_id``. The data layer removes them
+    on every write through it. Two backends are available:
+    :class:`LocalCache` (in-process LRU) and :class:`SharedCache` (stores
+    documents in a shared key-value store, i.e. Redis).
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import copy
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from ._compat import iteritems
+
+
+class _CacheBase(object):
+    """
+    Common options and statistics of document caches.
+    """
+    #: Number of seconds after which cached document expires, None for no
+    #: expiration.
+    ttl = 300
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        Returns dict with numbers of ``hits`` and ``misses`` and
+        ``hit_ratio``.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': float(self.hits) / total if total else None}
+
+
+class LocalCache(_CacheBase):
+    """
+    In-process LRU cache of documents limited by number of documents and
+    their age. Each process has its own cache, so writes done by other
+    processes are seen only after :attr:`ttl`.
+    """
+    #: Maximal number of cached documents (of all resources).
+    max_size = 10000
+
+    def __init__(self, **options):
+        super(LocalCache, self).__init__(**options)
+        self._data = OrderedDict()
+
+    def get(self, resource, id_):
+        """
+        Returns copy of cached document or None.
+        """
+        key = (resource, id_)
+        with self.lock:
+            entry = self._data.pop(key, None)
+            if entry is not None and entry[0] is not None and \
+                    entry[0] < time.time():
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # the most recently used at the end
+            self._data[key] = entry
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def set(self, resource, id_, document):
+        """
+        Stores copy of document.
+        """
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        entry = (expires, copy.deepcopy(document))
+        key = (resource, id_)
+        with self.lock:
+            self._data.pop(key, None)
+            self._data[key] = entry
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, resource, ids):
+        """
+        Removes documents with given ids.
+        """
+        with self.lock:
+            for id_ in ids:
+                self._data.pop((resource, id_), None)
+
+    def clear(self, resource):
+        """
+        Removes all documents of resource.
+        """
+        with self.lock:
+            for key in [key for key in self._data if key[0] == resource]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache(_CacheBase):
+    """
+    Cache storing pickled documents in shared key-value store, given by
+    client with Redis-like interface: ``get(key)``, ``set(key, value,
+    ex=seconds)``, ``delete(*keys)`` and ``incr(key)`` (i.e.
+    ``redis.StrictRedis``, or :class:`MemoryClient` in tests).
+
+    Clearing of resource is O(1): keys contain version of resource, which
+    is incremented. Old documents expire by TTL.
+    """
+    #: Prefix of all keys.
+    prefix = 'eve_mongoengine:doc:'
+
+    def __init__(self, client, **options):
+        super(SharedCache, self).__init__(**options)
+        self.client = client
+
+    def _key(self, resource, id_):
+        version = self.client.get('%sversion:%s' % (self.prefix, resource))
+        return '%s%s:%s:%s' % (self.prefix, resource,
+                               int(version or 0), id_)
+
+    def get(self, resource, id_):
+        data = self.client.get(self._key(resource, id_))
+        self._count(data is not None)
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def set(self, resource, id_, document):
+        self.client.set(self._key(resource, id_),
+                        pickle.dumps(document, pickle.HIGHEST_PROTOCOL),
+                        ex=self.ttl)
+
+    def delete(self, resource, ids):
+        keys = [self._key(resource, id_) for id_ in ids]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self, resource):
+        self.client.incr('%sversion:%s' % (self.prefix, resource))
+
+
+class MemoryClient(object):
+    """
+    In-process stand-in of Redis client for :class:`SharedCache` (for tests
+    and single-process deployments).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        expires = time.time() + ex if ex is not None else None
+        with self.lock:
+            self.data[key] = (value, expires)
+        return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return len([self.data.pop(key) for key in keys
+                        if key in self.data])
+
+    def incr(self, key):
+        with self.lock:
+            value = int(self.data.get(key, (0, None))[0]) + 1
+            self.data[key] = (value, None)
+            return value
@@ -0,0 +1,340 @@
+
+"""
+    eve_mongoengine.compiler
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compiler of cerberus schemas (as generated by :class:`schema.SchemaMapper`)
+    into specialised Python validation functions.
+
+    Cerberus interprets the schema rule by rule for every document (and
+    builds new validator for every item of validated lists). Compiled
+    function checks rules ``type``, ``nullable``, ``required``,
+    ``allowed``, ``min``, ``max``, ``minlength``, ``maxlength``, ``empty``
+    and nested ``schema`` inline, in the same order and with the same
+    error messages as cerberus. Other rules (and rules or types overridden
+    by the validator class) are delegated to methods of the validator.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import copy
+from datetime import datetime
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+from cerberus import errors, Validator as CerberusValidator
+
+from ._compat import iteritems, basestring, long
+
+
+INT_TYPES = tuple(set((int, long)))
+
+#: isinstance() checks of inlined cerberus types.
+TYPE_CHECKS = {
+    'string': 'isinstance(value, _str_type)',
+    'integer': 'isinstance(value, _int_types)',
+    'float': 'isinstance(value, (float,) + _int_types)',
+    'number': 'isinstance(value, (float,) + _int_types)',
+    'boolean': 'isinstance(value, bool)',
+    'datetime': 'isinstance(value, _datetime)',
+    'dict': 'isinstance(value, _Mapping)',
+    'list': 'isinstance(value, _Sequence) and '
+            'not isinstance(value, _str_type)',
+    'set': 'isinstance(value, set)',
+}
+
+#: Rules handled by cerberus before other rules.
+SPECIAL_RULES = CerberusValidator.special_rules
+
+#: Rules which are inlined (if not overridden by the validator class).
+INLINE_RULES = ('maxlength', 'minlength', 'max', 'min', 'allowed', 'empty',
+                'schema')
+
+
+def _function(method):
+    return getattr(method, '__func__', method)
+
+
+def _unknown_field(v, field, value):
+    """
+    Validates field not present in the schema (copy of cerberus).
+    """
+    if v.allow_unknown:
+        if isinstance(v.allow_unknown, Mapping):
+            unknown_validator = CerberusValidator({field: v.allow_unknown})
+            if not unknown_validator.validate({field: value}):
+                v._error(field, unknown_validator.errors[field])
+    else:
+        v._error(field, errors.ERROR_UNKNOWN_FIELD)
+
+
+class SchemaCompiler(object):
+    """
+    Generates source code of validation functions of a schema and its
+    nested schemas.
+    """
+    def __init__(self, validator_cls):
+        self.validator_cls = validator_cls
+        self.namespace = {
+            '_errors': errors,
+            '_str_type': basestring,
+            '_int_types': INT_TYPES,
+            '_datetime': datetime,
+            '_Mapping': Mapping,
+            '_Sequence': Sequence,
+            '_copy': copy.copy,
+            '_unknown_field': _unknown_field,
+        }
+        self.source = []
+        self.counter = 0
+
+    def _name(self, prefix):
+        self.counter += 1
+        return '%s%d' % (prefix, self.counter)
+
+    def _constant(self, value):
+        name = self._name('_c')
+        self.namespace[name] = value
+        return name
+
+    def _inherited(self, name):
+        """
+        True if validator method is the one of cerberus (may be inlined).
+        """
+        method = getattr(self.validator_cls, name, None)
+        base = getattr(CerberusValidator, name, None)
+        return method is not None and base is not None and \
+            _function(method) is _function(base)
+
+    def _update_only_override(self, name):
+        """
+        True if validator method differs from cerberus only in updates
+        (its class lists the type in ``update_only_types``).
+        """
+        for klass in self.validator_cls.__mro__:
+            if name in klass.__dict__:
+                types = klass.__dict__.get('update_only_types', ())
+                return name[len('_validate_type_'):] in types
+        return False
+
+    def _emit_type(self, lines, data_type):
+        method = '_validate_type_' + data_type
+        check = TYPE_CHECKS.get(data_type)
+        message = self._constant(errors.ERROR_BAD_TYPE % data_type)
+        inline = ['if not (%s):' % check,
+                  '    v._error(field, %s)' % message]
+        if check is not None and self._inherited(method):
+            lines.extend(inline)
+        elif check is not None and self._update_only_override(method):
+            lines.append('if v.update:')
+            lines.append('    v.%s(field, value)' % method)
+            lines.append('else:')
+            lines.extend('    ' + line for line in inline)
+        else:
+            lines.append('v.%s(field, value)' % method)
+
+    def _emit_call(self, lines, method, argument):
+        lines.append('v.%s(%s, field, value)'
+                     % (method, self._constant(argument)))
+
+    def _emit_rule(self, lines, rule, argument, data_type):
+        method = '_validate_' + rule.replace(' ', '_')
+        if not hasattr(self.validator_cls, method):
+            # ignored by cerberus
+            return
+        if rule not in INLINE_RULES or not self._inherited(method):
+            self._emit_call(lines, method, argument)
+        elif rule in ('maxlength', 'minlength', 'max', 'min'):
+            self._emit_limit(lines, rule, argument)
+        elif rule == 'allowed':
+            self._emit_allowed(lines, argument)
+        elif rule == 'empty':
+            if not argument:
+                lines.extend([
+                    'if isinstance(value, _str_type) and len(value) == 0:',
+                    '    v._error(field, _errors.ERROR_EMPTY_NOT_ALLOWED)'])
+        elif rule == 'schema':
+            self._emit_schema(lines, argument, data_type)
+
+    def _emit_limit(self, lines, rule, argument):
+        messages = {
+            'maxlength': errors.ERROR_MAX_LENGTH,
+            'minlength': errors.ERROR_MIN_LENGTH,
+            'max': errors.ERROR_MAX_VALUE,
+            'min': errors.ERROR_MIN_VALUE,
+        }
+        try:
+            message = messages[rule] % argument
+        except (TypeError, ValueError):
+            # cerberus fails when the limit is exceeded
+            return self._emit_call(lines, '_validate_' + rule, argument)
+        op = '>' if rule.startswith('max') else '<'
+        if rule.endswith('length'):
+            condition = 'isinstance(value, _Sequence) and len(value)'
+        else:
+            condition = 'isinstance(value, (float,) + _int_types) and value'
+        lines.extend([
+            'if %s %s %s:' % (condition, op, self._constant(argument)),
+            '    v._error(field, %s)' % self._constant(message)])
+
+    def _emit_allowed(self, lines, argument):
+        try:
+            allowed_set = self._constant(set(argument))
+        except TypeError:
+            # unhashable values
+            return self._emit_call(lines, '_validate_allowed', argument)
+        allowed = self._constant(argument)
+        lines.extend([
+            'if isinstance(value, _str_type):',
+            '    if value not in %s:' % allowed,
+            '        v._error(field, _errors.ERROR_UNALLOWED_VALUE % value)',
+            'elif isinstance(value, _Sequence):',
+            '    disallowed = set(value) - %s' % allowed_set,
+            '    if disallowed:',
+            '        v._error(field, _errors.ERROR_UNALLOWED_VALUES '
+            '% list(disallowed))',
+            'elif isinstance(value, int):',
+            '    if value not in %s:' % allowed,
+            '        v._error(field, _errors.ERROR_UNALLOWED_VALUE % value)'])
+
+    def _emit_schema(self, lines, schema, data_type):
+        """
+        Emits nested schema rule of list (``schema`` is definition of its
+        items) or dict (``schema`` is its schema). With other types, the
+        rule is delegated to the validator.
+        """
+        inlined_type = data_type in ('list', 'dict') and \
+            self._inherited('_validate_type_' + data_type)
+        if not inlined_type or not isinstance(schema, Mapping) or \
+                data_type == 'dict' and \
+                not all(isinstance(d, Mapping) for d in schema.values()):
+            return self._emit_call(lines, '_validate_schema', schema)
+        schema_name = self._constant(schema)
+        if data_type == 'list':
+            item_check, item_document = self.compile_field(schema)
+            lines.extend([
+                # one validator for all items (cerberus creates new one for
+                # every item)
+                'child = v.__class__()',
+                'child.update = False',
+                'child.allow_unknown = v.allow_unknown',
+                'child.document = v.document',
+                'list_errors = {}',
+                'for i in range(len(value)):',
+                '    child._errors = {}',
+                '    child.schema = {i: %s}' % schema_name,
+                '    %s(child, i, value[i], %s)'
+                % (item_check, '{i: value[i]}' if item_document else 'None'),
+                '    list_errors.update(child._errors)',
+                'if len(list_errors):',
+                '    v._error(field, list_errors)'])
+        else:
+            document_check = self.compile_document(schema)
+            lines.extend([
+                # nested dicts are validated as update in updates (as
+                # cerberus does)
+                'child = _copy(v)',
+                'child._errors = {}',
+                'child.schema = %s' % schema_name,
+                '%s(child, value)' % document_check,
+                'if len(child._errors):',
+                '    v._error(field, child._errors)'])
+
+    def compile_field(self, definition):
+        """
+        Emits function validating value of field with given definition.
+        Returns its name and whether it uses the validated document.
+        """
+        name = self._name('_field')
+        lines = []
+        nullable = definition.get('nullable', False) is True
+        lines.append('if value is None:')
+        if nullable:
+            lines.append('    return')
+        else:
+            lines.append('    v._error(field, _errors.ERROR_NOT_NULLABLE)')
+        if 'type' in definition:
+            self._emit_type(lines, definition['type'])
+            lines.append('if v._errors.get(field):')
+            lines.append('    return')
+        document_used = 'dependencies' in definition
+        if document_used:
+            lines.append('v._validate_dependencies(document=document, '
+                         'dependencies=%s, field=field)'
+                         % self._constant(definition['dependencies']))
+            lines.append('if v._errors.get(field):')
+            lines.append('    return')
+        for rule, argument in iteritems(definition):
+            if rule not in SPECIAL_RULES:
+                self._emit_rule(lines, rule, argument,
+                                definition.get('type'))
+        self.source.append('def %s(v, field, value, document):' % name)
+        self.source.extend('    ' + line for line in lines)
+        self.source.append('')
+        return name, document_used
+
+    def compile_document(self, schema):
+        """
+        Emits function validating document against schema. Returns its
+        name.
+        """
+        checks = dict((field, self.compile_field(definition)[0])
+                      for field, definition in iteritems(schema))
+        checks_name = self._name('_checks')
+        required = [(field, definition.get('dependencies'))
+                    for field, definition in iteritems(schema)
+                    if definition.get('required') is True]
+        name = self._name('_document')
+        self.source.append('%s = {%s}' % (checks_name, ', '.join(
+            '%s: %s' % (self._constant(field), check)
+            for field, check in iteritems(checks))))
+        self.source.extend([
+            'def %s(v, document):' % name,
+            '    checks = %s' % checks_name,
+            '    for field, value in document.items():',
+            '        check = checks.get(field)',
+            '        if check is not None:',
+            '            check(v, field, value, document)',
+            '        else:',
+            '            _unknown_field(v, field, value)'])
+        if required:
+            self.source.extend([
+                '    if not v.update:',
+                '        for field, dependencies in %s:'
+                % self._constant(required),
+                '            if field not in document and '
+                'v._validate_dependencies(document, dependencies, field, '
+                'break_on_error=True):',
+                '                v._error(field, _errors.'
+                'ERROR_REQUIRED_FIELD)'])
+        self.source.append('')
+        return name
+
+    def compile(self, schema):
+        """
+        Returns function ``validate(v, document)`` adding errors of document
+        to validator ``v``.
+        """
+        name = self.compile_document(schema)
+        code = compile('\n'.join(self.source), '<compiled schema>', 'exec')
+        exec(code, self.namespace)
+        return self.namespace[name]
+
+
+_cache = {}
+
+
+def compiled_validator(validator_cls, resource, schema):
+    """
+    Returns compiled validation function of resource's schema, cached per
+    validator class and resource (recompiled when the schema is replaced).
+    """
+    key = (validator_cls, resource)
+    cached = _cache.get(key)
+    if cached is None or cached[0] is not schema:
+        cached = (schema, SchemaCompiler(validator_cls).compile(schema))
+        _cache[key] = cached
+    return cached[1]
@@ -14,16 +14,37 @@
 import sys
 import ast
 import json
+import time
+import copy
+import base64
+import pickle
+import threading
 from uuid import UUID
+from decimal import Decimal
+import datetime as dt
+from datetime import datetime, date
 import traceback
+from contextlib import contextmanager
 from distutils.version import LooseVersion
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # python 2 without 'futures' package installed
+    ThreadPoolExecutor = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Third Party ---
 
 # MongoEngine
 from mongoengine import __version__
-from mongoengine import (DoesNotExist, FileField)
+from mongoengine import (DoesNotExist, FileField, IntField, LongField,
+                         FloatField, DecimalField, ListField)
 from mongoengine.connection import get_db, connect
+from mongoengine.fields import GridFSProxy
+from bson import ObjectId, DBRef, Binary
 
 MONGOENGINE_VERSION = LooseVersion(__version__)
 
@@ -31,18 +52,117 @@ MONGOENGINE_VERSION = LooseVersion(__version__)
 from eve.io.mongo import Mongo, MongoJSONEncoder
 from eve.io.mongo.parser import parse, ParseError
 from eve.utils import (
-    config, debug_error_message, validate_filters, document_etag
+    config, debug_error_message, validate_filters, document_etag, date_to_str
 )
 from eve.exceptions import ConfigException
 
 # Misc
 from werkzeug.exceptions import HTTPException
-from flask import abort
+from flask import abort, request
 import pymongo
+try:
+    from pymongo.errors import ExecutionTimeout
+except ImportError:
+    # pymongo < 2.7 does not support time limits
+    class ExecutionTimeout(Exception):
+        pass
 
 
 # Python3 compatibility
-from ._compat import iteritems
+from ._compat import iteritems, long
+
+from .advisor import IndexAdvisor
+from .slowlog import SlowQueryLog
+from .cache import LocalCache
+from .pagecache import PageCache, CachedPage
+from .singleflight import SingleFlight
+from .profiler import SamplingProfiler
+from .memtrace import MemoryTracer, estimate_size
+from . import memtrace
+from .rows import iterate_rows
+from .batching import BatchSizer
+
+
+#: Name of the update operator which requests atomic increment of numeric
+#: field in PATCH payload, i.e. ``{"counter": {"$inc": 1}}``.
+INCREMENT_OPERATOR = '$inc'
+
+#: Value of If-Match header (and of the etag of the document being patched)
+#: used for PATCH requests which are allowed to skip the etag precondition.
+UNCONDITIONAL_ETAG = '*'
+
+#: Name of query parameter of item requests with ``$slice`` projections of
+#: list fields, i.e. ``?slice={"comments": [20, 10]}``.
+SLICE_PARAM = 'slice'
+
+
+def is_increment(value):
+    """
+    Returns True if given update value is increment operator with numeric
+    amount, i.e. ``{"$inc": 5}``.
+    """
+    return (isinstance(value, dict) and list(value) == [INCREMENT_OPERATOR]
+            and isinstance(value[INCREMENT_OPERATOR], (int, long, float))
+            and not isinstance(value[INCREMENT_OPERATOR], bool))
+
+
+def abort_timeout():
+    """
+    Aborts request whose query exceeded ``max_time_ms`` option.
+    """
+    abort(503, description='Query exceeded its time limit')
+
+
+def query_operators(spec):
+    """
+    Returns set of all operators (keys starting with ``$``) used in query
+    spec, including nested ones.
+    """
+    operators = set()
+    if isinstance(spec, dict):
+        for key, value in iteritems(spec):
+            if key.startswith('$'):
+                operators.add(key)
+            operators.update(query_operators(value))
+    elif isinstance(spec, (list, tuple)):
+        for value in spec:
+            operators.update(query_operators(value))
+    return operators
+
+
+def uses_index(spec, indexed_fields):
+    """
+    Returns True if query spec may be served by an index, i.e. it filters by
+    at least one of ``indexed_fields`` (leading keys of indexes) - directly
+    or in one clause of ``$and`` or in every clause of ``$or``. Empty spec
+    is considered indexed (it may be limited).
+    """
+    if not spec:
+        return True
+    for key, value in iteritems(spec):
+        if key in indexed_fields:
+            return True
+        if key == '$and' and any(uses_index(clause, indexed_fields)
+                                 for clause in value):
+            return True
+        if key == '$or' and all(clause and uses_index(clause, indexed_fields)
+                                for clause in value):
+            return True
+    return False
+
+
+def slice_list(values, spec):
+    """
+    Returns part of list selected by ``$slice`` projection ``spec`` the same
+    way as MongoDB does: number of first (positive) or last (negative)
+    items, or ``[skip, limit]`` (negative skip counts from the end).
+    """
+    if not isinstance(spec, list):
+        return values[:spec] if spec >= 0 else values[spec:]
+    skip, limit = spec
+    if skip < 0:
+        skip = max(len(values) + skip, 0)
+    return values[skip:skip + limit]
 
 
 def _itemize(maybe_dict):
@@ -54,56 +174,337 @@ def _itemize(maybe_dict):
         raise TypeError("Wrong type to itemize. Allowed lists and dicts.")
 
 
-def clean_doc(doc):
+def _remove_empty(doc, recursive):
+    """
+    Removes empty lists and dicts from dict in one pass, without copying it.
+    If recursive, cleans also embedded dicts (including dicts in lists)
+    before checking them for emptiness.
+    """
+    empty = []
+    for attr, value in iteritems(doc):
+        if not isinstance(value, (list, dict)):
+            continue
+        if recursive and value:
+            if isinstance(value, dict):
+                _remove_empty(value, recursive)
+            else:
+                for item in value:
+                    if isinstance(item, dict):
+                        _remove_empty(item, recursive)
+        if not value:
+            empty.append(attr)
+    for attr in empty:
+        del doc[attr]
+
+
+def clean_doc(doc, recursive=False):
     """
     Cleans empty datastructures from mongoengine document (model instance)
-    and remove any _etag fields.
+    and remove any _etag fields. Document is cleaned in place.
 
     The purpose of this is to get proper etag.
+
+    :param recursive: clean also embedded documents.
     """
-    for attr, value in iteritems(dict(doc)):
-        if isinstance(value, (list, dict)) and not value:
-            del doc[attr]
+    _remove_empty(doc, recursive)
     doc.pop('_etag', None)
 
     return doc
 
 
+def queryset_to_find_args(qry):
+    """
+    Returns keyword arguments for pymongo's ``Collection.find()`` (spec,
+    fields, sort, skip and limit), which mongoengine would use when executing
+    given QuerySet.
+    """
+    args = {'spec': qry._query}
+    if qry._loaded_fields:
+        args['fields'] = qry._loaded_fields.as_dict()
+    if qry._ordering:
+        args['sort'] = qry._ordering
+    elif qry._ordering is None and qry._document._meta.get('ordering'):
+        args['sort'] = qry._get_order_by(qry._document._meta['ordering'])
+    if qry._skip:
+        args['skip'] = qry._skip
+    if qry._limit:
+        args['limit'] = qry._limit
+    return args
+
+
 class PymongoQuerySet(object):
     """
     Dummy mongoenigne-like QuerySet behaving just like queryset
     with as_pymongo() called, but returning ALL fields in subdocuments
     (which as_pymongo() somehow filters).
+
+    If ``count_future`` is given, total count of documents is taken from it
+    (it is computed concurrently with iterating the page).
+
+    If ``timer`` is given, it is called with operation name (``'find'`` or
+    ``'count'``) and number of seconds spent by fetching documents (when
+    iteration is finished) or by counting them.
+
+    If ``guard`` is given, it is called with every cleaned document and
+    iteration stops when it returns False; the page is then flagged as
+    truncated (``_meta.truncated`` of the response, see :func:`extra`).
+
+    If ``lightweight`` is True, documents are converted through read-only
+    rows instead of mongoengine Documents (see :mod:`rows`).
+
+    If ``observer`` is given, it is called with every returned document and
+    its ``finish()`` when iteration ends (see :mod:`batching`).
     """
-    def __init__(self, qs):
+    def __init__(self, qs, count_future=None, clean_recursive=False,
+                 timer=None, guard=None, lightweight=False, observer=None):
         self._qs = qs
+        self._count_future = count_future
+        self._clean_recursive = clean_recursive
+        self._timer = timer
+        self._guard = guard
+        self._lightweight = lightweight
+        self._observer = observer
+        self.truncated = False
+
+    def count(self, with_limit_and_skip=False):
+        timer = object.__getattribute__(self, '_timer')
+        start = time.time()
+        count_future = object.__getattribute__(self, '_count_future')
+        try:
+            if count_future is not None and not with_limit_and_skip:
+                count = count_future.result()
+            else:
+                qs = object.__getattribute__(self, '_qs')
+                count = qs.count(with_limit_and_skip)
+        except ExecutionTimeout:
+            abort_timeout()
+        if timer is not None:
+            timer('count', time.time() - start)
+        return count
 
     def __iter__(self):
         def iterate(obj):
             qs = object.__getattribute__(obj, '_qs')
-            for doc in qs:
-                doc = dict(doc.to_mongo())
-                for attr, value in iteritems(dict(doc)):
-                    if isinstance(value, (list, dict)) and not value:
-                        del doc[attr]
+            recursive = object.__getattribute__(obj, '_clean_recursive')
+            guard = object.__getattribute__(obj, '_guard')
+            observer = object.__getattribute__(obj, '_observer')
+            try:
+                # generator expression starts the query (iter(qs)) at once
+                if object.__getattribute__(obj, '_lightweight'):
+                    qs = iterate_rows(qs)
+                if memtrace.tracing():
+                    documents = iterate_traced(qs, recursive)
+                else:
+                    documents = (clean_doc(doc.to_mongo(), recursive)
+                                 for doc in qs)
+                for doc in documents:
+                    if guard is not None and not guard(doc):
+                        obj.truncated = True
+                        return
+                    if observer is not None:
+                        observer(doc)
+                    yield doc
+            except ExecutionTimeout:
+                abort_timeout()
+            finally:
+                if observer is not None:
+                    observer.finish()
+
+        def iterate_traced(qs, recursive):
+            # memory of Documents and of their cleaned copies is accounted
+            # separately
+            documents = iter(qs)
+            while True:
+                memtrace.phase('hydrate')
+                try:
+                    doc = next(documents)
+                except StopIteration:
+                    memtrace.phase('response')
+                    return
+                memtrace.phase('clean')
+                doc = clean_doc(doc.to_mongo(), recursive)
                 yield doc
-        return iterate(self)
+
+        def iterate_timed(obj, timer):
+            # measure only time spent in the cursor, not by the consumer
+            documents = iterate(obj)
+            elapsed = 0
+            try:
+                while True:
+                    start = time.time()
+                    try:
+                        doc = next(documents)
+                    except StopIteration:
+                        break
+                    finally:
+                        elapsed += time.time() - start
+                    yield doc
+            finally:
+                timer('find', elapsed)
+
+        timer = object.__getattribute__(self, '_timer')
+        if timer is None:
+            return iterate(self)
+        return iterate_timed(self, timer)
+
+    def extra(self, response):
+        """
+        Flags truncated page in ``_meta`` of the response (called by Eve).
+        """
+        if self.truncated:
+            response.setdefault(config.META, {})['truncated'] = True
 
     def __getattribute__(self, name):
+        if name in ('count', 'extra', 'truncated'):
+            return object.__getattribute__(self, name)
         return getattr(object.__getattribute__(self, '_qs'), name)
 
 
+def _encode_orjson(obj, default, sort_keys):
+    """
+    Encodes ``obj`` by orjson (written in Rust, much faster than both json
+    and simplejson). Values of types unknown to orjson are passed to
+    ``default``.
+    """
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+
+
+#: Optional JSON libraries, which may be used by :class:`MongoengineJsonEncoder`
+#: (see :attr:`MongoengineJsonEncoder.backend`). Every backend is function
+#: ``(obj, default, sort_keys)`` returning JSON string. Only backends whose
+#: library is installed are registered.
+json_backends = {}
+if orjson is not None:
+    json_backends['orjson'] = _encode_orjson
+
+
+def _encode_binary(obj):
+    return base64.b64encode(obj).decode('ascii')
+
+
+#: Binary is a string in Python 2, simplejson renders it without calling
+#: ``default()``, so documents are searched for it before encoding. Python 3
+#: encoders pass bytes to ``default()`` (see
+#: :func:`MongoengineJsonEncoder.__init__`).
+_BINARY_IN_STRINGS = bytes is str
+
+
+def _replace_binary(value, encode):
+    """
+    Returns value with Binary data (also in embedded dicts and lists)
+    replaced by ``encode(data)``. Containers without binary data are
+    returned as they are, the others are copied. Used only in Python 2.
+    """
+    if isinstance(value, dict):
+        result = None
+        for key, item in iteritems(value):
+            new = _replace_binary(item, encode)
+            if new is not item:
+                if result is None:
+                    result = copy.copy(value)
+                result[key] = new
+        return value if result is None else result
+    if isinstance(value, (list, tuple)):
+        result = None
+        for index, item in enumerate(value):
+            new = _replace_binary(item, encode)
+            if new is not item:
+                if result is None:
+                    result = list(value)
+                result[index] = new
+        return value if result is None else result
+    if isinstance(value, Binary):
+        return encode(value)
+    return value
+
+
+def _encode_grid_proxy(proxy):
+    return str(proxy.grid_id) if proxy.grid_id is not None else None
+
+
 class MongoengineJsonEncoder(MongoJSONEncoder):
     """
     Propretary JSON encoder to support special mongoengine's special fields.
+
+    Values which are not JSON-native are rendered by functions in
+    :attr:`serializers` table, which is looked up by exact type of the value
+    (subclasses are resolved once through their MRO and cached), instead of
+    walking chain of ``isinstance`` checks in every ``default()`` call.
     """
+    #: Serializers of non-JSON-native values, keyed by type. Subclasses may
+    #: extend (copy of) this table.
+    serializers = {
+        UUID: str,
+        ObjectId: str,
+        DBRef: lambda ref: {'$ref': ref.collection, '$id': ref.id},
+        datetime: date_to_str,
+        date: lambda value: value.isoformat(),
+        dt.time: lambda value: value.isoformat(),
+        Decimal: float,
+        Binary: _encode_binary,
+        # binary data of subtype 0 is decoded as bytes in Python 3
+        bytes: _encode_binary,
+        GridFSProxy: _encode_grid_proxy,
+    }
+
+    #: Name of the backend from :data:`json_backends` used for encoding. If
+    #: None or the backend is not installed, the (C-accelerated) encoder of
+    #: simplejson is used. Output of backends is equal to the default one,
+    #: except for whitespace, Decimals (rendered as floats) and NaN or
+    #: infinite floats (rendered as null).
+    backend = None
+
+    # (encoder class, value type) -> serializer or None
+    _serializer_cache = {}
+
+    def __init__(self, *args, **kwargs):
+        if not _BINARY_IN_STRINGS:
+            # bytes are passed to default() instead of being decoded as UTF-8
+            # (simplejson.dumps() passes the encoding explicitly)
+            kwargs['encoding'] = None
+        super(MongoengineJsonEncoder, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def _get_serializer(cls, value_type):
+        """
+        Returns serializer of values of given type or None if the type is not
+        in :attr:`serializers` table.
+        """
+        try:
+            return cls._serializer_cache[cls, value_type]
+        except KeyError:
+            pass
+        serializer = None
+        for klass in getattr(value_type, '__mro__', (value_type,)):
+            if klass in cls.serializers:
+                serializer = cls.serializers[klass]
+                break
+        cls._serializer_cache[cls, value_type] = serializer
+        return serializer
+
     def default(self, obj):
-        if isinstance(obj, UUID):
-            # rendered as a string
-            return str(obj)
-        else:
-            # delegate rendering to base class method
-            return super(MongoengineJsonEncoder, self).default(obj)
+        serializer = self._get_serializer(type(obj))
+        if serializer is not None:
+            return serializer(obj)
+        # delegate rendering to base class method
+        return super(MongoengineJsonEncoder, self).default(obj)
+
+    def encode(self, obj):
+        memtrace.phase('encode')
+        if _BINARY_IN_STRINGS:
+            obj = _replace_binary(obj, self.default)
+        backend = json_backends.get(self.backend)
+        if backend is not None and self.indent is None:
+            try:
+                return backend(obj, self.default, self.sort_keys)
+            except (TypeError, ValueError, OverflowError):
+                # value out of range of the backend (i.e. big integer),
+                # fall back to the default encoder
+                pass
+        return super(MongoengineJsonEncoder, self).encode(obj)
 
 
 class ResourceClassMap(object):
@@ -135,6 +536,19 @@ class ResourceClassMap(object):
             return _cls.objects
 
 
+class _PatchState(threading.local):
+    """
+    State of PATCH request handled by current thread.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.etag_doc = None
+        self.increments = {}
+        self.unconditional_resource = None
+
+
 class MongoengineUpdater(object):
     """
     Helper class for managing updates (PATCH requests) through mongoengine
@@ -144,28 +558,100 @@ class MongoengineUpdater(object):
     drity and there would be unnecessary 'helper' methods in the main class
     MongoengineDataLayer causing namespace pollution.
     """
+    #: Mongoengine field classes which support atomic increments.
+    increment_field_classes = (IntField, LongField, FloatField, DecimalField)
+
     def __init__(self, datalayer):
         self.datalayer = datalayer
-        self._etag_doc = None
+        # requests may be handled by multiple threads concurrently
+        self.state = _PatchState()
         self.install_etag_fixer()
+        self.install_increment_hooks()
 
     def install_etag_fixer(self):
         """
         Fixes ETag value returned by PATCH responses.
         """
         def fix_patch_etag(resource, request, payload):
-            if self._etag_doc is None:
+            if self.state.etag_doc is None:
                 return
             # make doc from which the etag will be computed
-            etag_doc = clean_doc(self._etag_doc)
+            etag_doc = self.datalayer._clean_doc(resource, self.state.etag_doc)
             # load the response back agagin from json
             d = json.loads(payload.get_data(as_text=True))
             # compute new etag
             d[config.ETAG] = document_etag(etag_doc)
+            # return post-increment values, client does not know them
+            for field in self.state.increments:
+                d[field] = etag_doc.get(field)
             payload.set_data(json.dumps(d))
         # register post PATCH hook into current application
         self.datalayer.app.on_post_PATCH += fix_patch_etag
 
+    def install_increment_hooks(self):
+        """
+        Installs hooks making atomic increments (``{"field": {"$inc": 1}}``
+        in PATCH payload) work within Eve's PATCH machinery.
+        """
+        def prepare_patch(resource, request, lookup):
+            # reset state left by previous request
+            self.state.reset()
+            if self._is_unconditional_increment(resource, request):
+                # Eve checks If-Match header against the etag of the document
+                # returned by find_one(), so make both of them match.
+                request.environ['HTTP_IF_MATCH'] = UNCONDITIONAL_ETAG
+                self.state.unconditional_resource = resource
+
+        def pop_increments(resource, updates, original):
+            # increments are not regular updates, Eve would try to merge them
+            # into the original document
+            for field, value in list(iteritems(updates)):
+                if is_increment(value):
+                    self.state.increments[field] = \
+                        updates.pop(field)[INCREMENT_OPERATOR]
+
+        def reset_state(exception):
+            # PUT and DELETE handled later by the same thread must not see
+            # state of this request
+            self.state.reset()
+
+        self.datalayer.app.on_pre_PATCH += prepare_patch
+        self.datalayer.app.on_update += pop_increments
+        self.datalayer.app.teardown_request(reset_state)
+
+    def _is_unconditional_increment(self, resource, request):
+        """
+        Returns True if PATCH request contains only increments and resource
+        allows them without etag precondition (option
+        ``allow_unconditional_increments``).
+        """
+        allowed = self.datalayer._resource_option(
+            resource, 'allow_unconditional_increments', False)
+        if not allowed:
+            return False
+        if request.headers.get('If-Match', UNCONDITIONAL_ETAG) != \
+                UNCONDITIONAL_ETAG:
+            # client asked for the precondition explicitly
+            return False
+        payload = request.get_json(silent=True)
+        if not payload or not isinstance(payload, dict):
+            return False
+        model_cls = self.datalayer.cls_map[resource]
+        for db_field, value in iteritems(payload):
+            field_name = model_cls._reverse_db_field_map.get(db_field)
+            field = model_cls._fields.get(field_name)
+            if not is_increment(value) or \
+                    not isinstance(field, self.increment_field_classes):
+                return False
+        return True
+
+    def is_unconditional(self, resource):
+        """
+        Returns True if etag precondition is skipped for current PATCH
+        request on given resource.
+        """
+        return self.state.unconditional_resource == resource
+
     def _transform_updates_to_mongoengine_kwargs(self, resource, updates):
         """
         Transforms update dict to special mongoengine syntax with set__,
@@ -175,6 +661,27 @@ class MongoengineUpdater(object):
         nopfx = lambda x: field_cls._reverse_db_field_map[x]
         return dict(("set__%s" % nopfx(k), v) for (k, v) in iteritems(updates))
 
+    def _transform_increments_to_mongoengine_kwargs(self, resource,
+                                                    increments):
+        """
+        Transforms increments dict to mongoengine syntax with inc__.
+        """
+        field_cls = self.datalayer.cls_map[resource]
+        nopfx = lambda x: field_cls._reverse_db_field_map[x]
+        return dict(("inc__%s" % nopfx(k), v)
+                    for (k, v) in iteritems(increments))
+
+    def _modify(self, resource, qry, kwargs):
+        """
+        Updates one document atomically and returns it in its post-update
+        state.
+        """
+        if MONGOENGINE_VERSION >= LooseVersion("0.9.0"):
+            return qry.modify(new=True, **kwargs)
+        # QuerySet.modify() is not available in older mongoengine
+        qry.update_one(write_concern=self.datalayer._wc(resource), **kwargs)
+        return qry.get()
+
     def _has_empty_list_recurse(self, value):
         if value == []:
             return True
@@ -203,13 +710,20 @@ class MongoengineUpdater(object):
                                                                updates)
         qset = lambda: self.datalayer.cls_map.objects(resource)
         qry = qset()(id=id_)
+        if self.state.increments:
+            # we need post-increment values, so fetch them in the same call
+            kwargs.update(self._transform_increments_to_mongoengine_kwargs(
+                resource, self.state.increments))
+            model = self._modify(resource, qry, kwargs)
+            self.state.etag_doc = model.to_mongo()
+            return
         qry.update_one(write_concern=self.datalayer._wc(resource), **kwargs)
         if self._has_empty_list(updates):
             # Fix Etag when updating to empty list
             model = qset()(id=id_).get()
-            self._etag_doc = dict(model.to_mongo())
+            self.state.etag_doc = model.to_mongo()
         else:
-            self._etag_doc = None
+            self.state.etag_doc = None
 
     def _update_document(self, doc, updates):
         """
@@ -229,8 +743,14 @@ class MongoengineUpdater(object):
         model = self.datalayer.cls_map.objects(resource)(id=id_).get()
         self._update_document(model, updates)
         model.save(write_concern=self.datalayer._wc(resource))
+        if self.state.increments:
+            # increments are always atomic, even in non-atomic mode
+            kwargs = self._transform_increments_to_mongoengine_kwargs(
+                resource, self.state.increments)
+            qry = self.datalayer.cls_map.objects(resource)(id=id_)
+            model = self._modify(resource, qry, kwargs)
         # Fix Etag when updating to empty list
-        self._etag_doc = dict(model.to_mongo())
+        self.state.etag_doc = model.to_mongo()
 
     def update(self, resource, id_, updates):
         """
@@ -238,15 +758,14 @@ class MongoengineUpdater(object):
 
         Does not handle mongo errros!
         """
-        opt = self.datalayer.mongoengine_options
-
         updates.pop('_etag', None)
 
-        if opt.get('use_atomic_update_for_patch', 1):
+        if self.datalayer._resource_option(resource,
+                                           'use_atomic_update_for_patch', 1):
             self._update_using_update_one(resource, id_, updates)
         else:
             self._update_using_save(resource, id_, updates)
-        return self._etag_doc
+        return self.state.etag_doc
 
 
 class MongoengineDataLayer(Mongo):
@@ -266,29 +785,241 @@ class MongoengineDataLayer(Mongo):
     #: use update_one() method (which is atomic) for updating. But then you
     #: will loose your pre/post-save hooks. When you set this to False, for
     #: updating will be used save() method.
+    #: allow_unconditional_increments - when set to True, PATCH requests
+    #: containing only increments (``{"field": {"$inc": 1}}``) do not need
+    #: to send If-Match header (or may send ``If-Match: *``).
+    #:
+    #: concurrent_count - when set to True, total count of documents for
+    #: paginated GET requests is queried in background thread while the page
+    #: is being fetched (needs :mod:`concurrent.futures`).
+    #:
+    #: media_chunk_size - maximal number of bytes read from GridFS and sent
+    #: to the client at once by media endpoint (``/<resource>/<id>/<field>``).
+    #:
+    #: clean_nested_documents - when set to True, empty lists and dicts are
+    #: removed also from embedded documents (not only from top level) of
+    #: documents returned by the data layer.
+    #:
+    #: index_advisor - when set to True, shapes of queries are recorded by
+    #: :attr:`index_advisor` (instance of :class:`advisor.IndexAdvisor`),
+    #: which suggests missing indexes.
+    #:
+    #: slow_query_threshold - number of seconds; queries of data layer
+    #: methods taking longer are logged by :attr:`slow_query_log` (instance
+    #: of :class:`slowlog.SlowQueryLog`). None disables the log.
+    #:
+    #: max_time_ms - time limit (in milliseconds) of fetching and counting
+    #: documents of GET requests. Requests exceeding it end with 503.
+    #:
+    #: query_operators_denylist, query_operators_allowlist - lists of query
+    #: operators, which clients may not / only may use in ``where`` (checked
+    #: in addition to Eve's ``MONGO_QUERY_BLACKLIST``). Violations end with
+    #: 400.
+    #:
+    #: deny_unindexed_filters - when set to True, client queries have to
+    #: filter by at least one field which is leading key of an index declared
+    #: in the model (or listed in ``unindexed_filters_allowlist`` option),
+    #: and client sort of queries without filter has to start by such field,
+    #: else they end with 400.
+    #:
+    #: multiget_max_ids - maximal number of ids in one request for items by
+    #: ids (``GET /<resource>?ids=<id1>,<id2>``), None for no limit.
+    #:
+    #: export - when set to True, documents of the resource may be exported
+    #: by endpoint ``/<resource>/export?format=ndjson|csv`` (see
+    #: :mod:`export`). Has to be set when registering the model.
+    #:
+    #: export_workers, export_range_size, export_batch_size - number of
+    #: worker processes scanning ``_id`` ranges of exported resource, number
+    #: of documents in one range and in one encoded chunk.
+    #:
+    #: bulk_import - when set to True, NDJSON may be imported into the
+    #: resource by endpoint ``POST /<resource>/import`` (see
+    #: :mod:`bulkimport`). Has to be set when registering the model.
+    #:
+    #: bulk_import_workers, bulk_import_batch_size - number of processes
+    #: validating imported lines and number of lines validated and inserted
+    #: at once.
+    #:
+    #: compiled_validation - when set to True, documents are validated by
+    #: resource's schema compiled into Python function (see :mod:`compiler`)
+    #: instead of interpreting it by cerberus. Errors are the same.
+    #:
+    #: document_cache - when set to True, documents fetched by :func:`find_one`
+    #: by ``_id`` are cached in :attr:`document_cache` (see :mod:`cache`) and
+    #: removed from it by writes through the data layer. Not used for
+    #: resources with ``auth_field`` and for Eve's reads of documents being
+    #: updated or deleted (concurrency control checks fresh etags).
+    #:
+    #: page_cache - when set to True, pages returned by :func:`find` are
+    #: cached in :attr:`page_cache` (see :mod:`pagecache`) until the next
+    #: write to the resource through the data layer.
+    #:
+    #: coalesce_reads - when set to True, identical :func:`find` and
+    #: :func:`find_one` queries executed concurrently (by different threads)
+    #: are sent to MongoDB only once, the others wait for the result (see
+    #: :mod:`singleflight`).
+    #:
+    #: coalesce_timeout - maximal number of seconds a coalesced query waits
+    #: for the result of the identical query in flight, after which it is
+    #: executed on its own.
+    #:
+    #: profile - True to profile every request of the resource by
+    #: :attr:`profiler` (see :mod:`profiler`), or number between 0 and 1 to
+    #: profile such fraction of randomly chosen requests. Requests with
+    #: header carrying :attr:`profiler.token` are profiled regardless.
+    #:
+    #: trace_memory - True to account memory allocated by every request of
+    #: the resource (by phases, see :mod:`memtrace`) in
+    #: :attr:`memory_tracer`, or number between 0 and 1 to trace such
+    #: fraction of randomly chosen requests. Requires python 3.4+.
+    #:
+    #: max_page_memory - maximal estimated number of bytes of documents of
+    #: one page returned by :func:`find`, None for no limit. Pages exceeding
+    #: it are handled according to ``max_page_memory_action`` option:
+    #: ``'abort'`` ends the request with 503, ``'truncate'`` returns only
+    #: documents fitting the limit and sets ``truncated`` in ``_meta`` of
+    #: the response (total count and pagination links still describe the
+    #: whole page). Truncated pages are not cached.
+    #:
+    #: lightweight_rows - when set to True, documents of pages returned by
+    #: :func:`find` are converted through read-only rows with ``__slots__``
+    #: (see :mod:`rows`) instead of mongoengine Documents. Output is the
+    #: same, but mongoengine signals are not sent.
+    #:
+    #: batch_bytes - number of bytes of documents fetched from MongoDB in
+    #: one batch by :func:`find`. Batch size is chosen by
+    #: :attr:`batch_sizer` (see :mod:`batching`) from average size of
+    #: documents of the resource, at most the page size. None leaves batch
+    #: size to the driver.
+    #:
+    #: batch_size - fixed batch size of cursors of :func:`find` (overrides
+    #: ``batch_bytes``), None for none.
+    #:
+    #: list_profile - list of fields (as named in the API) excluded from
+    #: documents returned by :func:`find` unless the client sends its own
+    #: projection, or ``'auto'`` to exclude fields suggested by
+    #: :func:`SchemaMapper.suggest_list_profile` (binary data, files and
+    #: lists of embedded documents). :func:`find_one` returns full
+    #: documents.
+    #:
+    #: Every option may be overriden per resource by passing it as keyword
+    #: argument to :func:`EveMongoengine.add_model`.
     mongoengine_options = {
-        'use_atomic_update_for_patch': True
+        'use_atomic_update_for_patch': True,
+        'allow_unconditional_increments': False,
+        'concurrent_count': False,
+        'media_chunk_size': 255 * 1024,
+        'clean_nested_documents': False,
+        'index_advisor': False,
+        'slow_query_threshold': None,
+        'max_time_ms': None,
+        'query_operators_denylist': None,
+        'query_operators_allowlist': None,
+        'deny_unindexed_filters': False,
+        'unindexed_filters_allowlist': None,
+        'multiget_max_ids': 1000,
+        'export': False,
+        'export_workers': 4,
+        'export_range_size': 10000,
+        'export_batch_size': 1000,
+        'bulk_import': False,
+        'bulk_import_workers': 4,
+        'bulk_import_batch_size': 1000,
+        'compiled_validation': False,
+        'document_cache': False,
+        'page_cache': False,
+        'coalesce_reads': False,
+        'coalesce_timeout': 1.0,
+        'profile': False,
+        'trace_memory': False,
+        'max_page_memory': None,
+        'max_page_memory_action': 'abort',
+        'lightweight_rows': False,
+        'batch_bytes': None,
+        'batch_size': None,
+        'list_profile': None
     }
 
+    #: Class of :attr:`index_advisor`.
+    index_advisor_class = IndexAdvisor
+
+    #: Class of :attr:`slow_query_log`.
+    slow_query_log_class = SlowQueryLog
+
+    #: Class of :attr:`document_cache`.
+    document_cache_class = LocalCache
+
+    #: Class of :attr:`page_cache`.
+    page_cache_class = PageCache
+
+    #: Class of :attr:`profiler`.
+    profiler_class = SamplingProfiler
+
+    #: Class of :attr:`memory_tracer`.
+    memory_tracer_class = MemoryTracer
+
+    #: Class of :attr:`batch_sizer`.
+    batch_sizer_class = BatchSizer
+
+    #: Number of threads counting documents concurrently with page queries
+    #: (see ``concurrent_count`` option).
+    count_executor_workers = 4
+
     def __init__(self, ext):
         """
         Constructor.
 
         :param ext: instance of :class:`EveMongoengine`.
         """
+        self._connect(ext.app.config)
+        self.models = ext.models
+        self.app = ext.app
+        self.schema_mapper = ext.schema_mapper_class
+        # resource -> fields suggested by 'list_profile' option set to 'auto'
+        self._list_profiles = {}
+        # helper object for managing PATCHes, which are a bit dirty
+        self.updater = MongoengineUpdater(self)
+        # map resource -> Mongoengine class
+        self.cls_map = ResourceClassMap(self)
+        # created on first use of 'concurrent_count' option
+        self.count_executor = None
+        self._count_executor_lock = threading.Lock()
+        #: records query shapes of resources with 'index_advisor' option
+        self.index_advisor = self.index_advisor_class()
+        #: logs queries slower than 'slow_query_threshold' option
+        self.slow_query_log = self.slow_query_log_class()
+        #: caches documents of resources with 'document_cache' option, may be
+        #: replaced by :class:`cache.SharedCache`
+        self.document_cache = self.document_cache_class()
+        #: caches pages of resources with 'page_cache' option
+        self.page_cache = self.page_cache_class()
+        #: coalesces reads of resources with 'coalesce_reads' option
+        self.flights = SingleFlight()
+        #: profiles requests of resources with 'profile' option
+        self.profiler = self.profiler_class()
+        #: accounts memory of requests of resources with 'trace_memory'
+        #: option
+        self.memory_tracer = self.memory_tracer_class()
+        #: chooses batch sizes of resources with 'batch_bytes' option and
+        #: counts their getMores
+        self.batch_sizer = self.batch_sizer_class()
+
+    def _connect(self, app_config):
+        """
+        Connects to the database, sets :attr:`conn` and :attr:`driver`.
+        """
         # get authentication info
-        username = ext.app.config.get('MONGO_USERNAME', None)
-        password = ext.app.config.get('MONGO_PASSWORD', None)
+        username = app_config.get('MONGO_USERNAME', None)
+        password = app_config.get('MONGO_PASSWORD', None)
         auth = (username, password)
         if any(auth) and not all(auth):
             raise ConfigException('Must set both USERNAME and PASSWORD '
                                   'or neither')
         # try to connect to db
-        self.conn = connect(ext.app.config['MONGO_DBNAME'],
-                            host=ext.app.config['MONGO_HOST'],
-                            port=ext.app.config['MONGO_PORT'])
-        self.models = ext.models
-        self.app = ext.app
+        self.conn = connect(app_config['MONGO_DBNAME'],
+                            host=app_config['MONGO_HOST'],
+                            port=app_config['MONGO_PORT'])
         # create dummy driver instead of PyMongo, which causes errors
         # when instantiating after config was initialized
         self.driver = type('Driver', (), {})()
@@ -296,10 +1027,144 @@ class MongoengineDataLayer(Mongo):
         # authenticate
         if any(auth):
             self.driver.db.authenticate(username, password)
-        # helper object for managing PATCHes, which are a bit dirty
-        self.updater = MongoengineUpdater(self)
-        # map resource -> Mongoengine class
-        self.cls_map = ResourceClassMap(self)
+
+    def _resource_option(self, resource, name, default=None):
+        """
+        Returns value of mongoengine option for given resource. Options set
+        in resource settings take precedence over :attr:`mongoengine_options`.
+        """
+        resource_settings = config.DOMAIN[resource]
+        if name in resource_settings:
+            return resource_settings[name]
+        return self.mongoengine_options.get(name, default)
+
+    def start_profile(self):
+        """
+        Starts profiling and memory tracing of current request if it should
+        be profiled or traced (see ``profile`` and ``trace_memory``
+        options). Registered as Flask's ``before_request``.
+        """
+        resource, _, endpoint = (request.endpoint or '').partition('|')
+        if resource not in config.DOMAIN:
+            return
+        operation = '%s_%s' % (request.method, endpoint)
+        option = self._resource_option(resource, 'trace_memory', False)
+        if self.memory_tracer.wanted(option):
+            self.memory_tracer.start(resource, operation)
+        option = self._resource_option(resource, 'profile', False)
+        if self.profiler.wanted(request.headers, option):
+            self.profiler.start(resource, operation)
+
+    def stop_profile(self, exc=None):
+        """
+        Stops profiling and memory tracing of current request. Registered
+        as Flask's ``teardown_request``.
+        """
+        self.profiler.stop()
+        self.memory_tracer.stop()
+
+    def _memory_guard(self, resource):
+        """
+        Returns guard of :class:`PymongoQuerySet` enforcing
+        ``max_page_memory`` option, or None if the resource has no limit.
+        """
+        limit = self._resource_option(resource, 'max_page_memory')
+        if limit is None:
+            return None
+        truncate = self._resource_option(
+            resource, 'max_page_memory_action', 'abort') == 'truncate'
+        used = [0]
+
+        def guard(doc):
+            used[0] += estimate_size(doc)
+            if used[0] <= limit:
+                return True
+            if truncate:
+                return False
+            abort(503, description='Page exceeds memory limit of the '
+                                   'resource, request less items')
+        return guard
+
+    def _count_executor(self):
+        """
+        Returns thread pool for counting documents, creates it when needed.
+        """
+        with self._count_executor_lock:
+            if self.count_executor is None:
+                if ThreadPoolExecutor is None:
+                    raise ConfigException("Option 'concurrent_count' requires "
+                                          "'futures' package on python 2.")
+                workers = self.count_executor_workers
+                self.count_executor = ThreadPoolExecutor(max_workers=workers)
+        return self.count_executor
+
+    def _clean_doc(self, resource, doc):
+        """
+        Cleans document returned by the data layer, see :func:`clean_doc`.
+        """
+        recursive = self._resource_option(resource, 'clean_nested_documents',
+                                          False)
+        return clean_doc(doc, recursive)
+
+    def _advise(self, resource, qry):
+        """
+        Records query into :attr:`index_advisor` if the resource has
+        ``index_advisor`` option turned on.
+        """
+        if self._resource_option(resource, 'index_advisor', False):
+            self.index_advisor.record(resource, qry._document,
+                                      queryset_to_find_args(qry))
+
+    def _log_slow_query(self, resource, operation, duration, qry=None,
+                        spec=None):
+        """
+        Passes query, which took ``duration`` seconds, to
+        :attr:`slow_query_log`. Query is given either as mongoengine QuerySet
+        or as raw spec.
+        """
+        if qry is not None:
+            model_cls = qry._document
+            find_args = queryset_to_find_args(qry)
+        else:
+            model_cls = self.cls_map[resource]
+            find_args = {'spec': spec} if spec is not None else None
+        self.slow_query_log.log(resource, operation, duration, model_cls,
+                                find_args)
+
+    @contextmanager
+    def _query_timer(self, resource, operation):
+        """
+        Context manager measuring duration of data layer operation. If it
+        exceeds ``slow_query_threshold`` option, the query is logged. The
+        query (``qry`` QuerySet or raw ``spec``) may be put into yielded dict.
+        """
+        threshold = self._resource_option(resource, 'slow_query_threshold')
+        query = {}
+        start = time.time()
+        try:
+            yield query
+        finally:
+            duration = time.time() - start
+            if threshold is not None and duration >= threshold:
+                self._log_slow_query(resource, operation, duration, **query)
+
+    def _find_timer(self, resource, qry, start):
+        """
+        Returns timer for :class:`PymongoQuerySet` logging slow fetches and
+        counts of ``qry``, or None if the log is disabled for the resource.
+        Time of building the query (since ``start``) counts into the fetch.
+        """
+        threshold = self._resource_option(resource, 'slow_query_threshold')
+        if threshold is None:
+            return None
+        build_time = time.time() - start
+
+        def timer(operation, duration):
+            if operation == 'find':
+                duration += build_time
+            if duration >= threshold:
+                self._log_slow_query(resource, operation, duration, qry)
+        return timer
 
     def _handle_exception(self, exc):
         """
@@ -347,8 +1212,137 @@ class MongoengineDataLayer(Mongo):
         :param req: instance of :class:`eve.utils.ParsedRequest`.
         :param sub_resource_lookup: sub-resource lookup from the endpoint url.
         """
+        start = time.time()
+        memtrace.phase('query')
+        qry = self._find_queryset(resource, req, sub_resource_lookup)
+        cached = self._resource_option(resource, 'page_cache')
+        if not cached and not self._resource_option(resource,
+                                                    'coalesce_reads'):
+            return self._find_cursor(resource, qry, start)
+        page_cache = self.page_cache
+        generation = page_cache.generation(resource)
+        key = page_cache.key(queryset_to_find_args(qry))
+        if cached:
+            page = page_cache.get(resource, generation, key)
+            if page is not None:
+                return page
+
+        def fetch():
+            cursor = self._find_cursor(resource, qry, start)
+            documents = list(cursor)
+            return documents, cursor.count(), cursor.truncated
+
+        documents, total, truncated = self._coalesced(resource, 'find', key,
+                                                      fetch)
+        if cached and not truncated:
+            page_cache.set(resource, generation, key, documents, total)
+        return CachedPage(documents, total, truncated)
+
+    def _coalesced(self, resource, operation, key, fetch):
+        """
+        Returns result of ``fetch()``, which is shared by concurrent
+        identical reads (the same operation and normalized query ``key``)
+        if the resource has ``coalesce_reads`` option. Every caller gets
+        its own copy.
+        """
+        if not self._resource_option(resource, 'coalesce_reads'):
+            return fetch()
+        # reads started after a write do not wait for reads started before
+        generation = self.page_cache.generation(resource)
+        data = self.flights.do(
+            (resource, operation, generation, key),
+            lambda: pickle.dumps(fetch(), pickle.HIGHEST_PROTOCOL),
+            self._resource_option(resource, 'coalesce_timeout'))
+        return pickle.loads(data)
+
+    def _fetch_one(self, resource, qry):
+        """
+        Returns cleaned document matched by queryset or None.
+        """
+        def fetch():
+            try:
+                return self._clean_doc(resource, qry.get().to_mongo())
+            except DoesNotExist:
+                return None
+        key = PageCache.key(queryset_to_find_args(qry))
+        return self._coalesced(resource, 'find_one', key, fetch)
+
+    def _find_cursor(self, resource, qry, start):
+        """
+        Returns lazy cursor of :func:`find` executing ``qry``.
+        """
+        self._advise(resource, qry)
+        count_future = None
+        if self._resource_option(resource, 'concurrent_count', False):
+            # Eve needs total count for pagination, count the same spec
+            # while the page is being fetched.
+            count_qry = qry.clone()
+            max_time_ms = self._resource_option(resource, 'max_time_ms')
+            if max_time_ms is not None:
+                # older mongoengine keeps the limit only on the cursor,
+                # which is not cloned
+                count_qry = self._max_time_ms(count_qry, max_time_ms)
+            count_future = self._count_executor().submit(count_qry.count)
+        recursive = self._resource_option(resource, 'clean_nested_documents',
+                                          False)
+        timer = self._find_timer(resource, qry, start)
+        guard = self._memory_guard(resource)
+        lightweight = self._resource_option(resource, 'lightweight_rows')
+        observer = self._batch_observer(resource, qry)
+        return PymongoQuerySet(qry, count_future, recursive, timer, guard,
+                               lightweight, observer)
+
+    def _batch_observer(self, resource, qry):
+        """
+        Sets batch size of cursor of ``qry`` (``batch_size`` option or size
+        chosen by :attr:`batch_sizer` for ``batch_bytes`` option). Returns
+        observer recording fetched batches, or None if both options are off.
+        """
+        batch_size = self._resource_option(resource, 'batch_size')
+        budget = self._resource_option(resource, 'batch_bytes')
+        if batch_size is None and budget is None:
+            return None
+        if batch_size is None:
+            batch_size = self.batch_sizer.batch_size(resource, budget,
+                                                     qry._limit)
+        cursor = qry._cursor
+        if batch_size is not None:
+            cursor.batch_size(int(batch_size))
+        return self.batch_sizer.observer(resource, cursor, batch_size)
+
+    def _find_queryset(self, resource, req, sub_resource_lookup):
+        """
+        Builds mongoengine QuerySet for :func:`find` (filters, ordering,
+        projection and limits), but does not execute it.
+        """
         qry = self.cls_map.objects(resource)
+        spec, projection, sort = self._find_spec(resource, req,
+                                                 sub_resource_lookup)
+        # apply ordering
+        if sort:
+            for field, direction in _itemize(sort):
+                if direction < 0:
+                    field = "-%s" % field
+                qry = qry.order_by(field)
+        # apply filters
+        if len(spec) > 0:
+            qry = qry.filter(__raw__=spec)
+        # apply projection
+        qry = self._projection(resource, projection, qry)
+        # apply limits
+        if req.max_results:
+            qry = qry.limit(int(req.max_results))
+        if req.page > 1:
+            qry = qry.skip((req.page - 1) * req.max_results)
+        max_time_ms = self._resource_option(resource, 'max_time_ms')
+        if max_time_ms is not None:
+            qry = self._max_time_ms(qry, max_time_ms)
+        return qry
 
+    def _find_spec(self, resource, req, sub_resource_lookup):
+        """
+        Returns filter, projection and sort of :func:`find` request.
+        """
         client_projection = {}
         client_sort = {}
         spec = {}
@@ -387,6 +1381,7 @@ class MongoengineDataLayer(Mongo):
         bad_filter = validate_filters(spec, resource)
         if bad_filter:
             abort(400, bad_filter)
+        self._check_query_cost(resource, spec, client_sort)
 
         client_projection = self._client_projection(req)
 
@@ -395,31 +1390,295 @@ class MongoengineDataLayer(Mongo):
             spec,
             client_projection,
             client_sort)
-        # apply ordering
-        if sort:
-            for field, direction in _itemize(sort):
-                if direction < 0:
-                    field = "-%s" % field
-                qry = qry.order_by(field)
-        # apply filters
+        if not client_projection:
+            projection = self._apply_list_profile(resource, projection)
         if req.if_modified_since:
             spec[config.LAST_UPDATED] = \
                 {'$gt': req.if_modified_since}
-        if len(spec) > 0:
-            qry = qry.filter(__raw__=spec)
-        # apply projection
-        qry = self._projection(resource, projection, qry)
-        # apply limits
-        if req.max_results:
-            qry = qry.limit(int(req.max_results))
-        if req.page > 1:
-            qry = qry.skip((req.page - 1) * req.max_results)
-        return PymongoQuerySet(qry)
+        return spec, projection, sort
+
+    def _list_profile(self, resource):
+        """
+        Returns fields excluded from :func:`find` by ``list_profile`` option.
+        """
+        profile = self._resource_option(resource, 'list_profile')
+        if profile != 'auto':
+            return profile or ()
+        try:
+            return self._list_profiles[resource]
+        except KeyError:
+            profile = self.schema_mapper.suggest_list_profile(
+                self.cls_map[resource])
+            self._list_profiles[resource] = profile
+            return profile
+
+    def _apply_list_profile(self, resource, projection):
+        """
+        Returns projection of :func:`find` without fields of the list
+        profile of the resource.
+        """
+        excluded = self._list_profile(resource)
+        if not excluded:
+            return projection
+        if projection and 0 not in projection.values():
+            # default projection includes all fields of the schema
+            return dict((field, value) for field, value in
+                        iteritems(projection) if field not in excluded)
+        projection = dict(projection or {})
+        projection.update((field, 0) for field in excluded)
+        return projection
+
+    def _max_time_ms(self, qry, max_time_ms):
+        """
+        Sets time limit of fetching and counting documents of the QuerySet.
+        """
+        if hasattr(qry, 'max_time_ms'):
+            return qry.max_time_ms(int(max_time_ms))
+        # QuerySet.max_time_ms() is not available in older mongoengine
+        qry._cursor.max_time_ms(int(max_time_ms))
+        return qry
+
+    def _indexed_fields(self, resource):
+        """
+        Returns set of fields which are leading keys of indexes declared in
+        resource's model (``_cls`` prefix is skipped, it is always queried).
+        """
+        fields = set(['_id'])
+        model_cls = self.cls_map[resource]
+        for spec in model_cls._meta.get('index_specs') or []:
+            keys = [key for key, _ in spec['fields']]
+            if keys and keys[0] == '_cls' and len(keys) > 1:
+                keys = keys[1:]
+            if keys:
+                fields.add(keys[0])
+        return fields
+
+    def _check_query_cost(self, resource, spec, sort=None):
+        """
+        Aborts with 400 if client's query spec uses operators, which are
+        not allowed for the resource (``query_operators_denylist`` and
+        ``query_operators_allowlist`` options), or filters only by unindexed
+        fields or sorts unfiltered documents by unindexed field
+        (``deny_unindexed_filters`` option).
+        """
+        denylist = self._resource_option(resource, 'query_operators_denylist')
+        allowlist = self._resource_option(resource,
+                                          'query_operators_allowlist')
+        if denylist or allowlist is not None:
+            for operator in sorted(query_operators(spec)):
+                if (denylist and operator in denylist) or \
+                        (allowlist is not None and operator not in allowlist):
+                    abort(400, description='Query operator %s is not '
+                                           'allowed' % operator)
+        if self._resource_option(resource, 'deny_unindexed_filters', False):
+            indexed = self._indexed_fields(resource)
+            indexed.update(self._resource_option(
+                resource, 'unindexed_filters_allowlist', None) or ())
+            if not uses_index(spec, indexed):
+                abort(400, description='Query has to filter by at least one '
+                                       'indexed field: %s'
+                                       % ', '.join(sorted(indexed)))
+            # filtered documents are sorted after the index narrowed them,
+            # the whole collection only by index
+            sort = list(_itemize(sort)) if sort else []
+            if not spec and sort and sort[0][0] not in indexed:
+                abort(400, description='Query without filter has to be '
+                                       'sorted by indexed field: %s'
+                                       % ', '.join(sorted(indexed)))
 
     def find_one(self, resource, req, **lookup):
         """
         Look for one object.
         """
+        # req is None when Eve reads the document being written
+        id_ = self._cached_id(resource, lookup) if req is not None else None
+        if id_ is not None:
+            doc = self._find_one_cached(resource, req, id_)
+            if doc is None:
+                return None
+        else:
+            with self._query_timer(resource, 'find_one') as query:
+                qry = query['qry'] = self._find_one_queryset(resource, req,
+                                                             **lookup)
+                self._advise(resource, qry)
+                doc = self._fetch_one(resource, qry)
+            if doc is None:
+                return None
+        if req is None and self.updater.is_unconditional(resource):
+            # document fetched by Eve for the etag precondition check
+            doc[config.ETAG] = UNCONDITIONAL_ETAG
+        return doc
+
+    def _cached_id(self, resource, lookup):
+        """
+        Returns id of the document if it may be served from
+        :attr:`document_cache` (the resource has ``document_cache`` option
+        and the lookup is by ``_id`` only), else None.
+        """
+        if not self._resource_option(resource, 'document_cache') or \
+                list(lookup) != [config.ID_FIELD] or \
+                config.DOMAIN[resource].get('auth_field'):
+            return None
+        id_ = self._mongotize(lookup, resource)[config.ID_FIELD]
+        return None if isinstance(id_, dict) else id_
+
+    def _find_one_cached(self, resource, req, id_):
+        """
+        Returns document from :attr:`document_cache`, fetches and caches
+        whole document if missing. Projection is applied on returned copy.
+        Fetched document is not cached if the resource was written
+        meanwhile (it may be stale).
+        """
+        lookup = {config.ID_FIELD: id_}
+        _, filter_, projection, _ = self._datasource_ex(
+            resource, lookup, self._client_projection(req))
+        doc = self.document_cache.get(resource, id_)
+        if doc is None:
+            generation = self.page_cache.generation(resource)
+            with self._query_timer(resource, 'find_one') as query:
+                qry = query['qry'] = \
+                    self.cls_map.objects(resource)(__raw__=filter_)
+                self._advise(resource, qry)
+                doc = self._fetch_one(resource, qry)
+            if doc is None:
+                return None
+            if self.page_cache.generation(resource) == generation:
+                self.document_cache.set(resource, id_, doc)
+        doc = self._project_document(resource, doc, projection)
+        return self._slice_document(doc, self._client_slices(resource, req))
+
+    def _project_document(self, resource, doc, projection):
+        """
+        Applies projection on (top-level fields of) document the same way
+        :func:`_projection` does on query.
+        """
+        if not projection:
+            return doc
+        reverse_map = self.cls_map[resource]._reverse_db_field_map
+        fields = set(field for field in projection
+                     if field in reverse_map and field != '_id')
+        if 0 in projection.values():
+            return dict((key, value) for key, value in iteritems(doc)
+                        if key not in fields)
+        fields.update(('_id', '_cls'))
+        return dict((key, value) for key, value in iteritems(doc)
+                    if key in fields)
+
+    def _client_slices(self, resource, req):
+        """
+        Returns ``$slice`` projections of list fields requested by
+        :data:`SLICE_PARAM` query parameter as dict ``{field: slice}``.
+        Aborts with 400 if the parameter is invalid.
+        """
+        if req is None or not req.args or SLICE_PARAM not in req.args:
+            return {}
+        try:
+            slices = json.loads(req.args[SLICE_PARAM])
+        except ValueError:
+            slices = None
+        if not isinstance(slices, dict):
+            abort(400, description='Unable to parse `%s` clause'
+                                   % SLICE_PARAM)
+        model_cls = self.cls_map[resource]
+        integer = lambda x: isinstance(x, (int, long)) and \
+            not isinstance(x, bool)
+        for field, spec in iteritems(slices):
+            name = model_cls._reverse_db_field_map.get(field)
+            if name is None or \
+                    not isinstance(model_cls._fields[name], ListField):
+                abort(400, description='Field %s is not a list' % field)
+            if not integer(spec) and not (
+                    isinstance(spec, list) and len(spec) == 2 and
+                    all(integer(x) for x in spec) and spec[1] > 0):
+                abort(400, description='Slice of field %s has to be number '
+                                       'of items or [skip, limit]' % field)
+        return slices
+
+    def _slice(self, resource, slices, projection, qry):
+        """
+        Adds ``$slice`` projections of list fields to mongoengine query.
+        Fields left out by projection are not sliced.
+        """
+        reverse_map = self.cls_map[resource]._reverse_db_field_map
+        excluding = bool(projection) and 0 in projection.values()
+        for field, spec in sorted(iteritems(slices)):
+            if projection and (field in projection) == excluding:
+                continue
+            qry = qry.fields(**{'slice__' + reverse_map[field]: spec})
+        return qry
+
+    def _slice_document(self, doc, slices):
+        """
+        Returns copy of document with lists sliced the same way as by
+        ``$slice`` projection (lists emptied by slicing are removed, as
+        empty lists of fetched documents are).
+        """
+        if not slices:
+            return doc
+        doc = dict(doc)
+        for field, spec in iteritems(slices):
+            if field not in doc:
+                continue
+            values = slice_list(doc[field], spec)
+            if values:
+                doc[field] = values
+            else:
+                del doc[field]
+        return doc
+
+    def _invalidate_caches(self, resource, ids=None):
+        """
+        Invalidates cached pages of all resources stored in the same
+        collection as given resource and removes documents with given ids
+        (all documents if None) from their :attr:`document_cache`.
+        """
+        collection = self.cls_map[resource]._get_collection_name()
+        for name, model_cls in list(iteritems(self.models)):
+            if model_cls._get_collection_name() != collection:
+                continue
+            self.page_cache.bump(name)
+            if name not in config.DOMAIN or \
+                    not self._resource_option(name, 'document_cache'):
+                continue
+            if ids is None:
+                self.document_cache.clear(name)
+            else:
+                self.document_cache.delete(name, ids)
+
+    def find_many_by_ids(self, resource, ids, req=None, **lookup):
+        """
+        Fetches documents with given ids by single ``$in`` query (used by
+        ``ids`` parameter of resource endpoint).
+
+        Unlike Eve's :func:`find_list_of_ids`, this returns list of documents in order of ``ids`` (with None for ids
+        which were not found). Documents are cleaned the same way as in
+        :func:`find_one`; the same document is returned for repeated ids.
+
+        :param resource: name of requested resource as string.
+        :param ids: list of ids (strings are cast as in lookups).
+        :param req: instance of :class:`eve.utils.ParsedRequest` (for client
+                    projection).
+        :param lookup: additional filters.
+        """
+        id_field = config.ID_FIELD
+        lookup[id_field] = {'$in': list(ids)}
+        lookup = self._mongotize(lookup, resource)
+        ids = lookup[id_field]['$in']
+        with self._query_timer(resource, 'find_many_by_ids') as query:
+            qry = query['qry'] = self._find_one_queryset(resource, req,
+                                                         **lookup)
+            self._advise(resource, qry)
+            documents = {}
+            for model in qry:
+                doc = self._clean_doc(resource, model.to_mongo())
+                documents[doc[id_field]] = doc
+        return [documents.get(id_) for id_ in ids]
+
+    def _find_one_queryset(self, resource, req, **lookup):
+        """
+        Builds mongoengine QuerySet for :func:`find_one`, but does not execute
+        it.
+        """
         # transform every field value to correct type for querying
         lookup = self._mongotize(lookup, resource)
 
@@ -434,11 +1693,8 @@ class MongoengineDataLayer(Mongo):
             qry = qry.filter(__raw__=filter_)
 
         qry = self._projection(resource, projection, qry)
-        try:
-            doc = dict(qry.get().to_mongo())
-            return clean_doc(doc)
-        except DoesNotExist:
-            return None
+        return self._slice(resource, self._client_slices(resource, req),
+                           projection, qry)
 
     def _doc_to_model(self, resource, doc):
 
@@ -489,16 +1745,18 @@ class MongoengineDataLayer(Mongo):
                 doc_or_docs = [doc_or_docs]
 
             ids = []
-            for doc in doc_or_docs:
-                model = self._doc_to_model(resource, doc)
-                model.save(write_concern=self._wc(resource))
-                ids.append(model.id)
-                doc.update(dict(model.to_mongo()))
-                doc[config.ID_FIELD] = model.id
-                # Recompute ETag since MongoEngine can modify the data via
-                # save hooks.
-                clean_doc(doc)
-                doc['_etag'] = document_etag(doc)
+            with self._query_timer(resource, 'insert'):
+                for doc in doc_or_docs:
+                    model = self._doc_to_model(resource, doc)
+                    model.save(write_concern=self._wc(resource))
+                    ids.append(model.id)
+                    doc.update(model.to_mongo())
+                    doc[config.ID_FIELD] = model.id
+                    # Recompute ETag since MongoEngine can modify the data via
+                    # save hooks.
+                    self._clean_doc(resource, doc)
+                    doc['_etag'] = document_etag(doc)
+            self._invalidate_caches(resource, ids)
             return ids
         except pymongo.errors.OperationFailure as e:
             # most likely a 'w' (write_concern) setting which needs an
@@ -513,7 +1771,12 @@ class MongoengineDataLayer(Mongo):
     def update(self, resource, id_, updates, *args, **kwargs):
         """Called when performing PATCH request."""
         try:
-            return self.updater.update(resource, id_, updates)
+            with self._query_timer(resource, 'update') as query:
+                query['spec'] = {'_id': id_}
+                try:
+                    return self.updater.update(resource, id_, updates)
+                finally:
+                    self._invalidate_caches(resource, [id_])
         except pymongo.errors.OperationFailure as e:
             # see comment in :func:`insert()`.
             abort(500, description=debug_error_message(
@@ -525,9 +1788,14 @@ class MongoengineDataLayer(Mongo):
     def replace(self, resource, id_, document, *args, **kwargs):
         """Called when performing PUT request."""
         try:
-            # FIXME: filters?
-            model = self._doc_to_model(resource, document)
-            model.save(write_concern=self._wc(resource))
+            with self._query_timer(resource, 'replace') as query:
+                query['spec'] = {'_id': id_}
+                # FIXME: filters?
+                model = self._doc_to_model(resource, document)
+                try:
+                    model.save(write_concern=self._wc(resource))
+                finally:
+                    self._invalidate_caches(resource, [id_])
         except pymongo.errors.OperationFailure as e:
             # see comment in :func:`insert()`.
             abort(500, description=debug_error_message(
@@ -542,11 +1810,20 @@ class MongoengineDataLayer(Mongo):
         datasource, filter_, _, _ = self._datasource_ex(resource, lookup)
 
         try:
-            if not filter_:
-                qry = self.cls_map.objects(resource)
-            else:
-                qry = self.cls_map.objects(resource)(__raw__=filter_)
-            qry.delete(write_concern=self._wc(resource))
+            with self._query_timer(resource, 'remove') as query:
+                if not filter_:
+                    qry = self.cls_map.objects(resource)
+                else:
+                    qry = self.cls_map.objects(resource)(__raw__=filter_)
+                query['qry'] = qry
+                try:
+                    qry.delete(write_concern=self._wc(resource))
+                finally:
+                    ids = [lookup[config.ID_FIELD]] \
+                        if list(lookup) == [config.ID_FIELD] and \
+                        not isinstance(lookup[config.ID_FIELD], dict) \
+                        else None
+                    self._invalidate_caches(resource, ids)
         except pymongo.errors.OperationFailure as e:
             # see comment in :func:`insert()`.
             abort(500, description=debug_error_message(
@@ -0,0 +1,441 @@
+
+"""
+    eve_mongoengine.export
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Streaming export of whole resources into NDJSON (one JSON document per
+    line) or CSV.
+
+    Documents matching the resource (datasource filter and projection
+    apply) are split into ``_id`` ranges, which are scanned in parallel by
+    worker processes directly through pymongo (without building mongoengine
+    documents). Workers encode documents in batches and pass them through a
+    bounded queue, so memory usage does not depend on size of the resource.
+    Order of documents in the output is not defined.
+
+    Export is available as endpoint ``/<resource>/export?format=csv`` (for
+    resources with ``export`` option) and from command line::
+
+        $ python -m eve_mongoengine.export myapp:app person -f csv -o out.csv
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import io
+import os
+import sys
+import csv
+import argparse
+import importlib
+import traceback
+import multiprocessing
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine.connection import (ConnectionError, DEFAULT_CONNECTION_NAME,
+                                    register_connection, get_db, disconnect,
+                                    _connection_settings)
+from flask import current_app as app, request, abort
+
+from eve.auth import requires_auth
+from eve.utils import config, parse_request
+
+from .datalayer import MongoengineJsonEncoder, queryset_to_find_args, clean_doc
+from ._compat import iteritems, basestring, long
+
+
+#: Supported formats and their mimetypes.
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+PY2 = sys.version_info[0] < 3
+
+
+class ExportJsonEncoder(MongoengineJsonEncoder):
+    """
+    JSON encoder used by export workers, which have no access to
+    application config.
+    """
+    def __init__(self, date_format, **kwargs):
+        super(ExportJsonEncoder, self).__init__(**kwargs)
+        self.date_format = date_format
+
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.strftime(self.date_format)
+        return super(ExportJsonEncoder, self).default(obj)
+
+
+def _id_to_number(value):
+    """
+    Returns ``_id`` as number which may be interpolated (ObjectIds as
+    96-bit integers), None for other types.
+    """
+    if isinstance(value, ObjectId):
+        return int(str(value), 16)
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _number_to_id(number, example):
+    """
+    Converts interpolated number back to ``_id`` of the same type as
+    ``example``.
+    """
+    if isinstance(example, ObjectId):
+        return ObjectId('%024x' % number)
+    return number
+
+
+def split_id_ranges(collection, spec, size):
+    """
+    Splits documents matching ``spec`` into ranges of about ``size``
+    documents by their ``_id``. Returns list of ``(lower, upper)`` tuples,
+    lower bound is inclusive, upper exclusive, None means unbounded.
+
+    Documents are not read: bounds are interpolated between the lowest and
+    the highest ``_id`` (found by ``_id`` index) according to number of
+    matching documents, so ranges are even for ids growing steadily
+    (ObjectIds, sequences). Documents with ``_id`` of other types (i.e.
+    strings) are exported as one range.
+    """
+    if hasattr(type(collection), 'count_documents'):
+        count = collection.count_documents(spec)
+    else:
+        count = collection.find(spec).count()
+    parts = -(-count // size)
+    if parts < 2:
+        return [(None, None)]
+    ids = []
+    for direction in (1, -1):
+        cursor = collection.find(spec, {'_id': 1}).sort('_id', direction)
+        ids.extend(doc['_id'] for doc in cursor.limit(1))
+    if len(ids) < 2:
+        return [(None, None)]
+    lowest, highest = _id_to_number(ids[0]), _id_to_number(ids[1])
+    if (lowest is None or highest is None or
+            isinstance(ids[0], ObjectId) != isinstance(ids[1], ObjectId)):
+        return [(None, None)]
+    bounds = []
+    for i in range(1, parts):
+        if isinstance(lowest, float) or isinstance(highest, float):
+            number = lowest + (highest - lowest) * i / float(parts)
+        else:
+            number = lowest + (highest - lowest) * i // parts
+        bound = _number_to_id(number, ids[0])
+        if bound > ids[0] and (not bounds or bound > bounds[-1]):
+            bounds.append(bound)
+    lowers = [None] + bounds
+    uppers = bounds + [None]
+    return list(zip(lowers, uppers))
+
+
+def _range_spec(spec, lower, upper):
+    """
+    Returns query spec restricted to ``_id`` range.
+    """
+    condition = {}
+    if lower is not None:
+        condition['$gte'] = lower
+    if upper is not None:
+        condition['$lt'] = upper
+    if not condition:
+        return spec
+    if '_id' in spec:
+        return {'$and': [spec, {'_id': condition}]}
+    spec = dict(spec)
+    spec['_id'] = condition
+    return spec
+
+
+def _csv_value(encoder, value):
+    """
+    Returns text representation of value for CSV cell. Embedded documents
+    and lists are encoded as JSON.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, basestring):
+        return value
+    if isinstance(value, (bool, dict, list)):
+        return encoder.encode(value)
+    if isinstance(value, (int, long, float)):
+        return repr(value) if isinstance(value, float) else str(value)
+    value = encoder.default(value)
+    if isinstance(value, basestring):
+        return value
+    return encoder.encode(value)
+
+
+class _Writer(object):
+    """
+    Encodes batches of documents into NDJSON or CSV text.
+    """
+    def __init__(self, export_format, columns, date_format):
+        self.format = export_format
+        self.columns = columns
+        self.encoder = ExportJsonEncoder(date_format)
+
+    def _csv(self, rows):
+        output = io.BytesIO() if PY2 else io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        for row in rows:
+            if PY2:
+                row = [cell.encode('utf-8') for cell in row]
+            writer.writerow(row)
+        return output.getvalue()
+
+    def header(self):
+        if self.format == 'csv':
+            return self._csv([self.columns])
+        return ''
+
+    def encode(self, docs):
+        if self.format == 'csv':
+            encoder = self.encoder
+            return self._csv([[_csv_value(encoder, doc.get(column))
+                               for column in self.columns] for doc in docs])
+        return ''.join(self.encoder.encode(doc) + '\n' for doc in docs)
+
+
+def scan_range(collection, spec, fields, lower, upper, writer, batch_size,
+               recursive=False):
+    """
+    Yields encoded batches of documents matching ``spec`` with ``_id`` in
+    given range.
+
+    :param recursive: clean also embedded documents (see
+                      :func:`~eve_mongoengine.datalayer.clean_doc`).
+    """
+    cursor = collection.find(_range_spec(spec, lower, upper), fields or None)
+    batch = []
+    for doc in cursor.batch_size(batch_size):
+        batch.append(clean_doc(doc, recursive))
+        if len(batch) >= batch_size:
+            yield writer.encode(batch)
+            batch = []
+    if batch:
+        yield writer.encode(batch)
+
+
+def _connect(job):
+    """
+    Returns collection of the export job, connected with connection
+    settings of the application by client of the calling process (clients
+    must not be shared by processes).
+    """
+    alias = 'eve_mongoengine_export_%d' % os.getpid()
+    try:
+        db = get_db(alias)
+    except ConnectionError:
+        register_connection(alias, **job['connection'])
+        db = get_db(alias)
+    return db[job['collection']]
+
+
+def _worker(job, tasks, results):
+    """
+    Export worker process: scans ranges from ``tasks`` queue and puts
+    encoded batches into ``results`` queue. None is put when done, error
+    message as tuple on failure.
+    """
+    try:
+        # client inherited from the parent is not fork-safe (and would be
+        # shared by mongoengine with the alias of the job)
+        disconnect(job['alias'])
+        collection = _connect(job)
+        writer = _Writer(job['format'], job['columns'], job['date_format'])
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            lower, upper = task
+            for chunk in scan_range(collection, job['spec'], job['fields'],
+                                    lower, upper, writer, job['batch_size'],
+                                    job['clean_nested']):
+                results.put(chunk)
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+    results.put(None)
+
+
+def _columns(model_cls, fields):
+    """
+    Returns CSV columns (db field names) of model respecting projection.
+    """
+    columns = [model_cls._fields[name].db_field
+               for name in model_cls._fields_ordered]
+    columns.sort(key=lambda column: column != '_id')
+    if fields:
+        # {'$slice': n} projections only limit lists of returned fields
+        fields = dict((key, value) for key, value in iteritems(fields)
+                      if not isinstance(value, dict))
+        included = [key for key, value in iteritems(fields) if value]
+        if included:
+            columns = [c for c in columns if c in included or c == '_id']
+        else:
+            columns = [c for c in columns if c not in fields]
+    return columns
+
+
+def prepare_export(resource, export_format='ndjson', req=None,
+                   range_size=10000, batch_size=1000):
+    """
+    Builds export job of given resource. Has to be called within
+    application context (the job itself does not need it).
+
+    :param resource: resource name.
+    :param export_format: ``ndjson`` or ``csv``.
+    :param req: parsed request (for client projection), optional.
+    :param range_size: approximate number of documents in one ``_id`` range
+                       scanned by one worker at once.
+    :param batch_size: number of documents encoded and sent at once.
+    """
+    if export_format not in FORMATS:
+        raise ValueError("Unknown export format '%s'." % export_format)
+    datalayer = app.data
+    qry = datalayer._find_one_queryset(resource, req)
+    args = queryset_to_find_args(qry)
+    model_cls = qry._document
+    collection = model_cls._get_collection()
+    # settings the model is connected with (URI, replica set, read
+    # preference, ...), credentials of the data layer are used unless given
+    alias = model_cls._meta.get('db_alias', DEFAULT_CONNECTION_NAME)
+    connection = dict(_connection_settings[alias])
+    if not connection.get('username') and app.config.get('MONGO_USERNAME'):
+        connection['username'] = app.config['MONGO_USERNAME']
+        connection['password'] = app.config['MONGO_PASSWORD']
+    return {
+        'alias': alias,
+        'connection': connection,
+        'collection': collection.name,
+        'spec': args['spec'],
+        'fields': args.get('fields'),
+        'columns': _columns(model_cls, args.get('fields')),
+        'format': export_format,
+        'date_format': config.DATE_FORMAT,
+        'batch_size': batch_size,
+        'clean_nested': datalayer._resource_option(
+            resource, 'clean_nested_documents', False),
+        'ranges': split_id_ranges(collection, args['spec'], range_size),
+    }
+
+
+def run_export(job, workers=4):
+    """
+    Yields encoded chunks of export job (see :func:`prepare_export`).
+
+    :param workers: number of worker processes. With 0, ranges are scanned
+                    one by one by the calling process.
+    """
+    writer = _Writer(job['format'], job['columns'], job['date_format'])
+    header = writer.header()
+    if header:
+        yield header
+    if not workers:
+        collection = _connect(job)
+        for lower, upper in job['ranges']:
+            for chunk in scan_range(collection, job['spec'], job['fields'],
+                                    lower, upper, writer, job['batch_size'],
+                                    job['clean_nested']):
+                yield chunk
+        return
+
+    workers = min(workers, len(job['ranges']))
+    tasks = multiprocessing.Queue()
+    for task in job['ranges']:
+        tasks.put(task)
+    for _ in range(workers):
+        tasks.put(None)
+    # bounded, workers wait until the consumer catches up
+    results = multiprocessing.Queue(maxsize=2 * workers)
+    processes = [multiprocessing.Process(target=_worker,
+                                         args=(job, tasks, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+    try:
+        finished = 0
+        while finished < workers:
+            chunk = results.get()
+            if chunk is None:
+                finished += 1
+            elif isinstance(chunk, tuple):
+                raise RuntimeError('Export worker failed:\n%s' % chunk[1])
+            else:
+                yield chunk
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def export_endpoint(**lookup):
+    """
+    View function bound to export URL rule of resources with ``export``
+    option (see :func:`EveMongoengine.add_model`).
+    """
+    resource = request.endpoint.split('|')[0]
+    return get_export(resource)
+
+
+@requires_auth('resource')
+def get_export(resource):
+    """
+    Returns streamed response with all documents of the resource. Format
+    is given by ``format`` query parameter (``ndjson`` or ``csv``), client
+    projection is applied.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        abort(400, description="Unknown export format '%s'" % export_format)
+    datalayer = app.data
+    job = prepare_export(resource, export_format, parse_request(resource),
+                         datalayer._resource_option(resource,
+                                                    'export_range_size'),
+                         datalayer._resource_option(resource,
+                                                    'export_batch_size'))
+    workers = datalayer._resource_option(resource, 'export_workers')
+    return app.response_class(run_export(job, workers),
+                              mimetype=FORMATS[export_format],
+                              direct_passthrough=True)
+
+
+def main(argv=None):
+    """
+    Exports resource of Eve application into file or standard output.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m eve_mongoengine.export',
+        description='Export resource of eve-mongoengine application.')
+    parser.add_argument('app', help='application as module:attribute')
+    parser.add_argument('resource', help='resource name')
+    parser.add_argument('-f', '--format', default='ndjson',
+                        choices=sorted(FORMATS))
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('-o', '--output', help='output file (default stdout)')
+    args = parser.parse_args(argv)
+
+    module_name, _, attr = args.app.partition(':')
+    eve_app = getattr(importlib.import_module(module_name), attr or 'app')
+    with eve_app.app_context():
+        job = prepare_export(args.resource, args.format)
+    mode = 'wb' if PY2 else 'w'
+    output = open(args.output, mode) if args.output else sys.stdout
+    try:
+        for chunk in run_export(job, args.workers):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
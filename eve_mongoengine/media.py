@@ -0,0 +1,127 @@
+
+"""
+    eve_mongoengine.media
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Streaming delivery of files stored in GridFS through mongoengine's
+    FileFields.
+
+    Eve embeds media files into documents as base64 strings, so it has to
+    read whole files into memory. This module implements endpoint
+    ``/<resource>/<id>/<field>``, which sends the file chunk by chunk and
+    supports partial requests (``Range`` and ``If-Range`` headers).
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from flask import current_app as app, request, abort
+from mongoengine import DoesNotExist
+
+from eve.auth import requires_auth
+
+
+def media_endpoint(**lookup):
+    """
+    View function bound to media URL rule of every resource with FileFields
+    (see :func:`EveMongoengine.add_model`).
+    """
+    resource = request.endpoint.split('|')[0]
+    db_field = lookup.pop('media_field')
+    return get_media(resource, db_field, **lookup)
+
+
+@requires_auth('item')
+def get_media(resource, db_field, **lookup):
+    """
+    Returns streamed response with content of the file stored in FileField
+    ``db_field`` of the document.
+
+    Document is looked up through the data layer, so all resource filters
+    apply.
+    """
+    datalayer = app.data
+    qry = datalayer._find_one_queryset(resource, None, **lookup)
+    try:
+        doc = qry.get()
+    except DoesNotExist:
+        abort(404)
+    field_name = doc._reverse_db_field_map[db_field]
+    proxy = getattr(doc, field_name)
+    grid_out = proxy.get() if proxy else None
+    if grid_out is None:
+        abort(404)
+    chunk_size = datalayer._resource_option(resource, 'media_chunk_size')
+    return send_grid_file(grid_out, chunk_size)
+
+
+def _if_range_matches(etag, last_modified):
+    """
+    Returns True if Range header has to be honored (If-Range header is
+    missing or matches current representation of the file).
+    """
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if last_modified is None:
+        return False
+    return if_range.date.replace(tzinfo=None) == \
+        last_modified.replace(microsecond=0, tzinfo=None)
+
+
+def _iter_file(grid_out, start, stop, chunk_size):
+    """
+    Yields content of the file between start and stop offsets, reading at
+    most chunk_size bytes at time.
+    """
+    grid_out.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        data = grid_out.read(min(chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def send_grid_file(grid_out, chunk_size):
+    """
+    Creates streamed response out of GridFS file (instance of
+    :class:`gridfs.GridOut`).
+
+    :param grid_out: file to be sent.
+    :param chunk_size: maximal number of bytes read from GridFS and sent at
+                       once.
+    """
+    length = grid_out.length
+    etag = grid_out.md5 or str(grid_out._id)
+    last_modified = grid_out.upload_date
+    start, stop = 0, length
+    status = 200
+
+    ranges = request.range
+    if ranges is not None and ranges.units == 'bytes' and \
+            len(ranges.ranges) == 1 and _if_range_matches(etag, last_modified):
+        satisfiable = ranges.range_for_length(length)
+        if satisfiable is None:
+            response = app.response_class(status=416)
+            response.headers['Content-Range'] = 'bytes */%d' % length
+            return response
+        start, stop = satisfiable
+        status = 206
+
+    mimetype = grid_out.content_type or 'application/octet-stream'
+    response = app.response_class(
+        _iter_file(grid_out, start, stop, chunk_size), status=status,
+        mimetype=mimetype, direct_passthrough=True)
+    response.content_length = stop - start
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = \
+            'bytes %d-%d/%d' % (start, stop - 1, length)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
@@ -0,0 +1,494 @@
+
+"""
+    eve_mongoengine.memory
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    In-memory data layer for tests, benchmarks and profiling of the
+    framework overhead without MongoDB::
+
+        from eve_mongoengine import EveMongoengine
+        from eve_mongoengine.memory import InMemoryDataLayer, NullDataLayer
+
+        # Eve's default data layer would connect to MongoDB
+        app = Eve(settings=settings, data=NullDataLayer)
+        ext = EveMongoengine()
+        ext.datalayer_class = InMemoryDataLayer
+        ext.init_app(app)
+        ext.add_model(Person)
+
+    Documents are stored per collection as produced by mongoengine
+    (``model.to_mongo()``), after model validation and with mongoengine
+    save signals, so responses are the same as with MongoDB. Query specs
+    (Eve ``where`` in both syntaxes, datasource filters, sub-resource
+    lookups), projections, sorting, pagination, PATCH (including atomic
+    increments), PUT and DELETE are supported; ``$where``, geo and text
+    operators are not. Features working directly with the database (media
+    files, export, bulk import, indexes, caches and query logs) are not
+    available.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import re
+import copy
+import threading
+from datetime import datetime
+from functools import cmp_to_key
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from collections import OrderedDict
+
+from bson import ObjectId
+from flask import abort
+from mongoengine import signals, NotUniqueError
+from eve.utils import config, debug_error_message, document_etag
+
+from .datalayer import MongoengineDataLayer, UNCONDITIONAL_ETAG, _itemize
+from .pagecache import CachedPage
+from ._compat import iteritems, basestring, long
+
+
+_PATTERN_TYPE = type(re.compile(''))
+
+_NUMBER_TYPES = (int, long, float)
+
+
+class UnsupportedQuery(ValueError):
+    """
+    Raised when query uses operator not supported by :func:`match`.
+    """
+
+
+def _values(value, parts):
+    """
+    Returns values at dotted path (split into ``parts``), traversing arrays
+    of embedded documents like MongoDB does.
+    """
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, Mapping):
+        if head in value:
+            return _values(value[head], rest)
+        return []
+    if isinstance(value, list):
+        if head.isdigit():
+            index = int(head)
+            return _values(value[index], rest) if index < len(value) else []
+        result = []
+        for item in value:
+            if isinstance(item, Mapping):
+                result.extend(_values(item, parts))
+        return result
+    return []
+
+
+def _candidates(values):
+    """
+    Values compared by query operators: values themselves and items of
+    array values.
+    """
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            for item in value:
+                yield item
+
+
+def _kind(value):
+    if isinstance(value, bool):
+        return bool
+    if isinstance(value, _NUMBER_TYPES):
+        return float
+    if isinstance(value, basestring):
+        return basestring
+    if isinstance(value, Mapping):
+        return Mapping
+    return type(value)
+
+
+def _equal(values, argument):
+    if isinstance(argument, _PATTERN_TYPE):
+        return any(isinstance(value, basestring) and argument.search(value)
+                   for value in _candidates(values))
+    if argument is None and not values:
+        # missing field matches null
+        return True
+    return any(value == argument and _kind(value) == _kind(argument)
+               for value in _candidates(values))
+
+
+def _compare(values, argument, test):
+    for value in _candidates(values):
+        if value is not None and _kind(value) == _kind(argument):
+            try:
+                if test(value, argument):
+                    return True
+            except TypeError:
+                pass
+    return False
+
+
+def _regex(values, pattern, options=''):
+    flags = 0
+    for option, flag in (('i', re.I), ('m', re.M), ('x', re.X),
+                         ('s', re.S)):
+        if option in options:
+            flags |= flag
+    if not isinstance(pattern, _PATTERN_TYPE):
+        pattern = re.compile(pattern, flags)
+    return any(isinstance(value, basestring) and pattern.search(value)
+               for value in _candidates(values))
+
+
+def _elem_match(values, condition):
+    operators = isinstance(condition, Mapping) and \
+        all(key.startswith('$') for key in condition)
+    for value in values:
+        if not isinstance(value, list):
+            continue
+        for item in value:
+            if operators and _matches([item], condition) or \
+                    not operators and isinstance(item, Mapping) and \
+                    match(item, condition):
+                return True
+    return False
+
+
+def _operator(operator, argument, values, condition):
+    if operator == '$eq':
+        return _equal(values, argument)
+    if operator == '$ne':
+        return not _equal(values, argument)
+    if operator == '$gt':
+        return _compare(values, argument, lambda a, b: a > b)
+    if operator == '$gte':
+        return _compare(values, argument, lambda a, b: a >= b)
+    if operator == '$lt':
+        return _compare(values, argument, lambda a, b: a < b)
+    if operator == '$lte':
+        return _compare(values, argument, lambda a, b: a <= b)
+    if operator == '$in':
+        return any(_equal(values, item) for item in argument)
+    if operator == '$nin':
+        return not any(_equal(values, item) for item in argument)
+    if operator == '$exists':
+        return bool(values) == bool(argument)
+    if operator == '$regex':
+        return _regex(values, argument, condition.get('$options', ''))
+    if operator == '$options':
+        return True
+    if operator == '$all':
+        return bool(argument) and all(_equal(values, item)
+                                      for item in argument)
+    if operator == '$size':
+        return any(isinstance(value, list) and len(value) == argument
+                   for value in values)
+    if operator == '$elemMatch':
+        return _elem_match(values, argument)
+    if operator == '$not':
+        return not _matches(values, argument)
+    if operator == '$mod':
+        divisor, remainder = argument
+        return _compare(values, 0, lambda a, b: a % divisor == remainder)
+    raise UnsupportedQuery('Operator %s is not supported by the in-memory '
+                           'data layer.' % operator)
+
+
+def _matches(values, condition):
+    """
+    Returns True if values of a field match condition (value or dict of
+    operators).
+    """
+    if isinstance(condition, Mapping) and condition and \
+            all(key.startswith('$') for key in condition):
+        return all(_operator(operator, argument, values, condition)
+                   for operator, argument in iteritems(condition))
+    if isinstance(condition, _PATTERN_TYPE):
+        return _regex(values, condition)
+    return _equal(values, condition)
+
+
+def match(document, spec):
+    """
+    Returns True if document matches MongoDB query spec.
+    """
+    for key, condition in iteritems(spec):
+        if key == '$and':
+            if not all(match(document, part) for part in condition):
+                return False
+        elif key == '$or':
+            if not any(match(document, part) for part in condition):
+                return False
+        elif key == '$nor':
+            if any(match(document, part) for part in condition):
+                return False
+        elif key.startswith('$'):
+            raise UnsupportedQuery('Operator %s is not supported by the '
+                                   'in-memory data layer.' % key)
+        elif not _matches(_values(document, key.split('.')), condition):
+            return False
+    return True
+
+
+#: Order of types in sorting (as in MongoDB).
+_SORT_RANKS = ((type(None), 0), (_NUMBER_TYPES, 1), (basestring, 2),
+               (Mapping, 3), (list, 4), (ObjectId, 7), (bool, 8),
+               (datetime, 9))
+
+
+def _sort_rank(value):
+    if isinstance(value, bool):
+        return 8
+    for types, rank in _SORT_RANKS:
+        if isinstance(value, types):
+            return rank
+    return 10
+
+
+def _compare_values(a, b):
+    rank_a, rank_b = _sort_rank(a), _sort_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if rank_a in (3, 4, 10):
+        a, b = repr(a), repr(b)
+    if a == b:
+        return 0
+    return -1 if a < b else 1
+
+
+_sort_key = cmp_to_key(_compare_values)
+
+
+def sort_documents(documents, sort):
+    """
+    Sorts documents by list of ``(field, direction)`` pairs in place.
+    """
+    # stable sorts from the least significant field
+    for field, direction in reversed(list(_itemize(sort))):
+        parts = field.split('.')
+        documents.sort(key=lambda document: _sort_key(
+            (_values(document, parts) or [None])[0]), reverse=direction < 0)
+
+
+class NullDataLayer(object):
+    """
+    Placeholder data layer for Eve constructor, which does not connect to
+    MongoDB. It is replaced by data layer of the extension in
+    :func:`EveMongoengine.init_app`.
+    """
+    def __init__(self, app):
+        self.app = app
+
+
+class InMemoryDataLayer(MongoengineDataLayer):
+    """
+    Data layer storing documents in process memory (see :mod:`memory`).
+    Storage is shared by all threads of the application and lost with the
+    process.
+    """
+    def __init__(self, ext):
+        self.lock = threading.RLock()
+        #: collection name -> OrderedDict of documents keyed by primary key
+        self.collections = {}
+        super(InMemoryDataLayer, self).__init__(ext)
+
+    def _connect(self, app_config):
+        # nothing to connect to
+        self.conn = None
+        self.driver = None
+
+    def _collection(self, resource):
+        model_cls = self.cls_map[resource]
+        name = model_cls._get_collection_name()
+        return self.collections.setdefault(name, OrderedDict())
+
+    def _class_filter(self, resource):
+        """
+        Returns filter by ``_cls`` mongoengine adds to queries of models
+        with inheritance.
+        """
+        model_cls = self.cls_map[resource]
+        if model_cls._meta.get('allow_inheritance') is not True:
+            return {}
+        subclasses = list(model_cls._subclasses)
+        if len(subclasses) == 1:
+            return {'_cls': subclasses[0]}
+        return {'_cls': {'$in': subclasses}}
+
+    def _matching(self, resource, spec):
+        """
+        Returns stored documents of resource matching spec (not copied).
+        """
+        spec = dict(spec, **self._class_filter(resource))
+        try:
+            return [document for document in
+                    list(self._collection(resource).values())
+                    if match(document, spec)]
+        except UnsupportedQuery as e:
+            abort(400, description=debug_error_message(str(e)))
+
+    def _output(self, resource, document, projection=None):
+        document = self._clean_doc(resource, copy.deepcopy(document))
+        return self._project_document(resource, document, projection)
+
+    def find(self, resource, req, sub_resource_lookup):
+        spec, projection, sort = self._find_spec(resource, req,
+                                                 sub_resource_lookup)
+        if not sort:
+            # default ordering of the model
+            model_cls = self.cls_map[resource]
+            sort = [(model_cls._db_field_map.get(field.lstrip('+-'),
+                                                 field.lstrip('+-')),
+                     -1 if field.startswith('-') else 1)
+                    for field in model_cls._meta.get('ordering') or ()]
+        with self.lock:
+            documents = self._matching(resource, spec)
+        if sort:
+            sort_documents(documents, sort)
+        total = len(documents)
+        if req.max_results:
+            skip = (req.page - 1) * req.max_results if req.page > 1 else 0
+            documents = documents[skip:skip + int(req.max_results)]
+        return CachedPage([self._output(resource, document, projection)
+                           for document in documents], total)
+
+    def find_one(self, resource, req, **lookup):
+        lookup = self._mongotize(lookup, resource)
+        _, filter_, projection, _ = self._datasource_ex(
+            resource, lookup, self._client_projection(req))
+        slices = self._client_slices(resource, req)
+        with self.lock:
+            documents = self._matching(resource, filter_)
+            if not documents:
+                return None
+            doc = self._output(resource, documents[0], projection)
+        doc = self._slice_document(doc, slices)
+        if req is None and self.updater.is_unconditional(resource):
+            # document fetched by Eve for the etag precondition check
+            doc[config.ETAG] = UNCONDITIONAL_ETAG
+        return doc
+
+    def find_one_raw(self, resource, _id):
+        return self.find_one(resource, None, **{config.ID_FIELD: _id})
+
+    def find_list_of_ids(self, resource, ids, client_projection=None):
+        id_field = config.ID_FIELD
+        ids = self._mongotize({id_field: {'$in': list(ids)}},
+                              resource)[id_field]['$in']
+        _, filter_, projection, _ = self._datasource_ex(
+            resource, {id_field: {'$in': ids}}, client_projection)
+        with self.lock:
+            documents = dict((document[id_field], document) for document
+                             in self._matching(resource, filter_))
+            # order of ids is preserved as by Eve's mongo layer
+            return [self._output(resource, documents[id_], projection)
+                    for id_ in ids if id_ in documents]
+
+    def find_many_by_ids(self, resource, ids, req=None, **lookup):
+        id_field = config.ID_FIELD
+        lookup[id_field] = {'$in': list(ids)}
+        lookup = self._mongotize(lookup, resource)
+        ids = lookup[id_field]['$in']
+        _, filter_, projection, _ = self._datasource_ex(
+            resource, lookup, self._client_projection(req))
+        slices = self._client_slices(resource, req)
+        with self.lock:
+            documents = dict(
+                (document[id_field], self._slice_document(
+                    self._output(resource, document, projection), slices))
+                for document in self._matching(resource, filter_))
+        return [documents.get(id_) for id_ in ids]
+
+    def is_empty(self, resource):
+        _, filter_, _, _ = self._datasource(resource)
+        with self.lock:
+            return not self._matching(resource, filter_)
+
+    def _save(self, resource, model, created):
+        """
+        Validates and stores model like ``Document.save()`` does (with its
+        signals).
+        """
+        model_cls = model.__class__
+        signals.pre_save.send(model_cls, document=model)
+        model.validate()
+        if model.pk is None:
+            model.pk = ObjectId()
+        signals.pre_save_post_validation.send(model_cls, document=model,
+                                              created=created)
+        document = model.to_mongo()
+        collection = self._collection(resource)
+        for name, field in iteritems(model_cls._fields):
+            if not field.unique or field.db_field not in document:
+                continue
+            value = document[field.db_field]
+            for pk, other in iteritems(collection):
+                if pk != model.pk and other.get(field.db_field) == value:
+                    raise NotUniqueError('Tried to save duplicate unique '
+                                         'keys (%s)' % field.db_field)
+        collection[model.pk] = document
+        signals.post_save.send(model_cls, document=model, created=created)
+        return document
+
+    def insert(self, resource, doc_or_docs):
+        if not isinstance(doc_or_docs, list):
+            doc_or_docs = [doc_or_docs]
+        ids = []
+        with self.lock:
+            for doc in doc_or_docs:
+                model = self._doc_to_model(resource, doc)
+                document = self._save(resource, model, True)
+                ids.append(model.pk)
+                doc.update(copy.deepcopy(document))
+                doc[config.ID_FIELD] = model.pk
+                self._clean_doc(resource, doc)
+                doc[config.ETAG] = document_etag(doc)
+        self._invalidate_caches(resource, ids)
+        return ids
+
+    def update(self, resource, id_, updates, *args, **kwargs):
+        updates.pop(config.ETAG, None)
+        state = self.updater.state
+        with self.lock:
+            collection = self._collection(resource)
+            model_cls = self.cls_map[resource]
+            model = model_cls._from_son(copy.deepcopy(collection[id_]))
+            self.updater._update_document(model, updates)
+            for db_field, value in iteritems(state.increments):
+                name = model_cls._reverse_db_field_map[db_field]
+                model[name] = (model[name] or 0) + value
+            document = self._save(resource, model, False)
+            state.etag_doc = copy.deepcopy(document)
+        self._invalidate_caches(resource, [id_])
+        return state.etag_doc
+
+    def replace(self, resource, id_, document, *args, **kwargs):
+        with self.lock:
+            model = self._doc_to_model(resource, document)
+            self._save(resource, model, False)
+        self._invalidate_caches(resource, [id_])
+
+    def remove(self, resource, lookup):
+        lookup = self._mongotize(lookup, resource)
+        _, filter_, _, _ = self._datasource_ex(resource, lookup)
+        with self.lock:
+            collection = self._collection(resource)
+            ids = [document['_id']
+                   for document in self._matching(resource, filter_)]
+            for id_ in ids:
+                del collection[id_]
+        self._invalidate_caches(resource, ids)
+
+    def drop(self):
+        """
+        Removes all documents of all collections.
+        """
+        with self.lock:
+            self.collections.clear()
+        for resource in self.models:
+            self.page_cache.bump(resource)
+        self.document_cache = self.document_cache_class()
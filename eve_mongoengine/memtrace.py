@@ -0,0 +1,282 @@
+
+"""
+    eve_mongoengine.memtrace
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Memory accounting of requests (see ``trace_memory`` and
+    ``max_page_memory`` options in
+    :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    Traced request is split into phases:
+
+    - ``request`` - parsing of the request before the data layer is called,
+    - ``query`` - building of the query,
+    - ``hydrate`` - fetching documents from MongoDB and creating mongoengine
+      Documents of them,
+    - ``clean`` - converting Documents to cleaned dicts returned to Eve
+      (including processing of every dict by Eve),
+    - ``response`` - building of the response after the page was fetched,
+    - ``encode`` - serialization of the response.
+
+    For every phase, net ``allocated`` bytes (memory still held when the
+    phase ends) and ``peak`` (maximal bytes held above the start of the
+    phase) are recorded. Big peak with small allocation in ``hydrate``
+    phase means transient Documents, allocation of ``clean`` phase is the
+    page kept in memory until the response is encoded.
+
+    Allocations are traced by :mod:`tracemalloc` (Python 3.4+), which
+    traces the whole process, so only one request is traced at a time and
+    numbers include allocations of other threads. Phase peaks are exact on
+    Python 3.9+ (earlier they are measured since the start of the request).
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import random
+import threading
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+from eve.exceptions import ConfigException
+
+from ._compat import iteritems
+
+
+_local = threading.local()
+
+
+def phase(name):
+    """
+    Starts new phase of memory trace of current thread, if it is traced.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.phase(name)
+
+
+def tracing():
+    """
+    Returns True if request handled by current thread is traced.
+    """
+    return getattr(_local, 'trace', None) is not None
+
+
+def estimate_size(value):
+    """
+    Returns estimated number of bytes taken by document (dict, list or
+    scalar value) including its items.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in iteritems(value):
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+def _reset_peak():
+    # python 3.9+
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+class MemoryTrace(object):
+    """
+    Memory allocated by one request.
+    """
+    def __init__(self, resource, operation, snapshot=False):
+        self.resource = resource
+        self.operation = operation
+        #: phase name -> {'allocated': bytes, 'peak': bytes}
+        self.phases = {}
+        #: maximal number of bytes held by the request
+        self.peak = 0
+        #: number of bytes still held when the request ended (including
+        #: the response)
+        self.retained = 0
+        #: allocation sites of retained memory (``location``, ``size`` and
+        #: ``count`` of blocks), the biggest first
+        self.retained_sites = []
+        self._snapshot = tracemalloc.take_snapshot() if snapshot else None
+        self._start = tracemalloc.get_traced_memory()[0]
+        self._phase = None
+        self._phase_start = self._start
+        self.phase('request')
+
+    def phase(self, name):
+        """
+        Ends current phase, starts phase ``name`` (None for no phase).
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if self._phase is not None:
+            stats = self.phases.setdefault(self._phase,
+                                           {'allocated': 0, 'peak': 0})
+            stats['allocated'] += current - self._phase_start
+            stats['peak'] = max(stats['peak'], peak - self._phase_start)
+        self.peak = max(self.peak, peak - self._start)
+        self._phase = name
+        self._phase_start = current
+        _reset_peak()
+
+    def finish(self, top):
+        """
+        Ends the last phase, computes retained memory and its ``top``
+        allocation sites.
+        """
+        self.phase(None)
+        self.retained = tracemalloc.get_traced_memory()[0] - self._start
+        if self._snapshot is None:
+            return
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__)]
+        end = tracemalloc.take_snapshot().filter_traces(ignored)
+        start = self._snapshot.filter_traces(ignored)
+        self._snapshot = None
+        for diff in end.compare_to(start, 'lineno')[:top]:
+            if diff.size_diff <= 0:
+                break
+            frame = diff.traceback[0]
+            self.retained_sites.append({
+                'location': '%s:%d' % (frame.filename, frame.lineno),
+                'size': diff.size_diff,
+                'count': diff.count_diff,
+            })
+
+    def as_dict(self):
+        return {
+            'peak': self.peak,
+            'retained': self.retained,
+            'phases': dict((name, dict(stats))
+                           for name, stats in iteritems(self.phases)),
+            'retained_sites': list(self.retained_sites),
+        }
+
+
+class MemoryTracer(object):
+    """
+    Traces memory of requests and aggregates it per resource and operation
+    (request method and Eve endpoint, i.e. ``GET_resource``).
+
+    Instance is available as ``app.data.memory_tracer``.
+    """
+    #: Number of allocation sites of retained memory recorded per request,
+    #: 0 disables snapshots of traced memory (which are slow).
+    top = 10
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self._trace = None
+        # whether tracemalloc was started by the tracer
+        self._started = False
+        #: number of requests not traced because other one was traced
+        self.skipped = 0
+        # (resource, operation) -> aggregated traces
+        self._records = {}
+
+    def wanted(self, option):
+        """
+        Returns True if request should be traced: ``trace_memory`` option
+        is True, or it is sampling rate and the request was chosen.
+        """
+        return option is True or bool(option) and random.random() < option
+
+    def start(self, resource, operation):
+        """
+        Starts tracing of request handled by current thread. Returns its
+        :class:`MemoryTrace` or None if other request is being traced.
+        """
+        if tracemalloc is None:
+            raise ConfigException("Option 'trace_memory' requires "
+                                  "python 3.4+.")
+        with self.lock:
+            if self._trace is not None:
+                self.skipped += 1
+                return None
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._trace = MemoryTrace(resource, operation, self.top > 0)
+            _local.trace = self._trace
+        return self._trace
+
+    def stop(self):
+        """
+        Stops tracing of current thread (if it is traced) and aggregates its
+        trace. Returns the :class:`MemoryTrace` or None.
+        """
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return None
+        _local.trace = None
+        trace.finish(self.top)
+        with self.lock:
+            self._trace = None
+            if self._started:
+                tracemalloc.stop()
+                self._started = False
+            key = (trace.resource, trace.operation)
+            record = self._records.setdefault(key, {
+                'requests': 0, 'peak': 0, 'peak_total': 0,
+                'retained_total': 0, 'phases': {}, 'last': None})
+            record['requests'] += 1
+            record['peak'] = max(record['peak'], trace.peak)
+            record['peak_total'] += trace.peak
+            record['retained_total'] += trace.retained
+            for name, stats in iteritems(trace.phases):
+                phase_record = record['phases'].setdefault(
+                    name, {'allocated_total': 0, 'peak': 0})
+                phase_record['allocated_total'] += stats['allocated']
+                phase_record['peak'] = max(phase_record['peak'],
+                                           stats['peak'])
+            record['last'] = trace.as_dict()
+        return trace
+
+    def stats(self, resource=None):
+        """
+        Returns statistics of traced requests as dict
+        ``{resource: {operation: stats}}`` (only ``{operation: stats}`` of
+        given resource). Stats contain number of ``requests``, maximal and
+        mean ``peak``, mean ``retained`` bytes, maximal peak and mean
+        allocation of every phase and the ``last`` trace.
+        """
+        result = {}
+        with self.lock:
+            for (name, operation), record in iteritems(self._records):
+                if resource is not None and name != resource:
+                    continue
+                requests = record['requests']
+                phases = dict(
+                    (phase_name, {
+                        'allocated_mean': stats['allocated_total'] // requests,
+                        'peak': stats['peak'],
+                    }) for phase_name, stats in iteritems(record['phases']))
+                result.setdefault(name, {})[operation] = {
+                    'requests': requests,
+                    'peak': record['peak'],
+                    'peak_mean': record['peak_total'] // requests,
+                    'retained_mean': record['retained_total'] // requests,
+                    'phases': phases,
+                    'last': record['last'],
+                }
+        if resource is not None:
+            return result.get(resource, {})
+        return result
+
+    def reset(self):
+        """
+        Drops aggregated traces.
+        """
+        with self.lock:
+            self._records.clear()
+            self.skipped = 0
@@ -0,0 +1,102 @@
+
+"""
+    eve_mongoengine.multiget
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Batched fetching of items by ids. Collection endpoints accept query
+    parameter ``ids`` (comma separated list), i.e.
+    ``GET /people?ids=<id1>,<id2>,<id3>``, and return the requested items
+    (fetched by single ``$in`` query) in the order of request together with
+    list of ids which were not found::
+
+        {"_items": [...], "_missing": ["<id2>"]}
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from flask import current_app as app, request, abort
+
+from eve.auth import requires_auth
+from eve.endpoints import collections_endpoint as eve_collections_endpoint
+from eve.methods.common import (ratelimit, epoch, pre_event,
+                                build_response_document,
+                                resolve_embedded_fields)
+from eve.render import send_response
+from eve.utils import config, parse_request, request_method
+
+
+#: Name of query parameter with list of requested ids.
+IDS_PARAM = 'ids'
+
+#: Name of response field with list of ids which were not found.
+MISSING = '_missing'
+
+
+def collections_endpoint(**lookup):
+    """
+    Replacement of Eve's collection endpoint (see
+    :func:`EveMongoengine.add_model`), which handles GET requests with
+    ``ids`` parameter and passes other requests to Eve.
+    """
+    if request_method() in ('GET', 'HEAD') and IDS_PARAM in request.args:
+        resource = request.endpoint.split('|')[0]
+        return send_response(resource, get_list_of_ids(resource, **lookup))
+    return eve_collections_endpoint(**lookup)
+
+
+def _parse_ids(max_ids=None):
+    """
+    Returns list of unique ids requested by ``ids`` parameter (in order of
+    request). Aborts with 400 if more than ``max_ids`` ids are sent
+    (including repeated ones) or none.
+    """
+    values = request.args[IDS_PARAM].split(',')
+    if max_ids is not None and len(values) > max_ids:
+        abort(400, description='At most %d ids may be requested at once'
+                               % max_ids)
+    ids, seen = [], set()
+    for id_ in values:
+        id_ = id_.strip()
+        if id_ and id_ not in seen:
+            seen.add(id_)
+            ids.append(id_)
+    if not ids:
+        abort(400, description='Parameter %s has to contain at least one '
+                               'id' % IDS_PARAM)
+    return ids
+
+
+@ratelimit()
+@requires_auth('resource')
+@pre_event
+def get_list_of_ids(resource, **lookup):
+    """
+    Returns response with documents of given resource, whose ids were
+    requested by ``ids`` parameter.
+
+    Documents are processed the same way as by Eve's item endpoint (etag,
+    links, media, embedded documents), ``on_fetched_resource`` events are
+    fired for the response.
+    """
+    ids = _parse_ids(app.data._resource_option(resource, 'multiget_max_ids'))
+    req = parse_request(resource)
+    embedded_fields = resolve_embedded_fields(resource, req)
+    documents = app.data.find_many_by_ids(resource, ids, req, **lookup)
+
+    items, missing = [], []
+    last_update = epoch()
+    for id_, document in zip(ids, documents):
+        if document is None:
+            missing.append(id_)
+            continue
+        build_response_document(document, resource, embedded_fields)
+        items.append(document)
+        if document[config.LAST_UPDATED] > last_update:
+            last_update = document[config.LAST_UPDATED]
+    last_modified = last_update if last_update > epoch() else None
+    response = {config.ITEMS: items, MISSING: missing}
+
+    getattr(app, "on_fetched_resource")(resource, response)
+    getattr(app, "on_fetched_resource_%s" % resource)(response)
+    return response, last_modified, None, 200
@@ -0,0 +1,168 @@
+
+"""
+    eve_mongoengine.pagecache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cache of whole pages returned by :func:`MongoengineDataLayer.find` (see
+    ``page_cache`` option in :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    Pages are keyed by resource, generation of the resource and the query
+    sent to MongoDB (spec, sort, projection, skip and limit). Every write
+    through the data layer increments generation of the resource, so all
+    its cached pages become unreachable at once (without scanning the
+    cache); they are evicted as least recently used.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from bson import json_util
+from eve.utils import config
+
+from ._compat import iteritems
+
+
+class CachedPage(object):
+    """
+    Page of documents served by the cache, behaves like cursor returned by
+    :func:`MongoengineDataLayer.find`.
+    """
+    def __init__(self, documents, total, truncated=False):
+        self.documents = documents
+        self.total = total
+        self.truncated = truncated
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def count(self, with_limit_and_skip=False):
+        if with_limit_and_skip:
+            return len(self.documents)
+        return self.total
+
+    def extra(self, response):
+        if self.truncated:
+            response.setdefault(config.META, {})['truncated'] = True
+
+
+class PageCache(object):
+    """
+    In-process LRU cache of pages limited by their total (pickled) size.
+
+    Instance is available as ``app.data.page_cache``.
+    """
+    #: Maximal total size of cached pages in bytes.
+    max_bytes = 64 * 1024 * 1024
+
+    #: Pages larger than this number of bytes are not cached.
+    max_page_bytes = 1024 * 1024
+
+    #: Number of seconds after which cached page expires (writes done by
+    #: other processes are not seen until then), None for no expiration.
+    ttl = 60
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self.generations = {}
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._hits = {}
+        self._misses = {}
+
+    @staticmethod
+    def key(find_args):
+        """
+        Returns normalized query (see :func:`datalayer.queryset_to_find_args`)
+        used as a key of page.
+        """
+        return json_util.dumps(find_args, sort_keys=True)
+
+    def generation(self, resource):
+        """
+        Returns current generation of resource.
+        """
+        return self.generations.get(resource, 0)
+
+    def bump(self, resource):
+        """
+        Invalidates all cached pages of resource.
+        """
+        with self.lock:
+            self.generations[resource] = self.generations.get(resource, 0) + 1
+
+    def get(self, resource, generation, key):
+        """
+        Returns :class:`CachedPage` (with its own copy of documents) or None.
+        """
+        full_key = (resource, generation, key)
+        with self.lock:
+            entry = self._data.pop(full_key, None)
+            if entry is not None and entry[0] is not None and \
+                    entry[0] < time.time():
+                self._bytes -= len(entry[1])
+                entry = None
+            counters = self._misses if entry is None else self._hits
+            counters[resource] = counters.get(resource, 0) + 1
+            if entry is None:
+                return None
+            self._data[full_key] = entry
+        documents, total = pickle.loads(entry[1])
+        return CachedPage(documents, total)
+
+    def set(self, resource, generation, key, documents, total):
+        """
+        Stores page fetched by query started in given generation of the
+        resource (pages of old generations are never served).
+        """
+        data = pickle.dumps((documents, total), pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_page_bytes:
+            return
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        full_key = (resource, generation, key)
+        with self.lock:
+            if generation != self.generations.get(resource, 0):
+                # written meanwhile
+                return
+            old = self._data.pop(full_key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._data[full_key] = (expires, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        """
+        Removes all cached pages.
+        """
+        with self.lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self, resource=None):
+        """
+        Returns dict with numbers of ``hits`` and ``misses``, ``hit_ratio``
+        (of given resource or all of them), number of cached ``pages`` and
+        their size in ``bytes``.
+        """
+        with self.lock:
+            if resource is None:
+                hits = sum(self._hits.values())
+                misses = sum(self._misses.values())
+            else:
+                hits = self._hits.get(resource, 0)
+                misses = self._misses.get(resource, 0)
+            total = hits + misses
+            return {'hits': hits, 'misses': misses,
+                    'hit_ratio': float(hits) / total if total else None,
+                    'pages': len(self._data), 'bytes': self._bytes}
@@ -0,0 +1,189 @@
+
+"""
+    eve_mongoengine.profiler
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Sampling profiler of requests (see ``profile`` option in
+    :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    While a profiled request is handled, a background thread periodically
+    records the stack of the thread handling it. Stacks are aggregated per
+    resource and operation (request method and Eve endpoint, i.e.
+    ``GET_resource`` or ``PATCH_item_lookup``) in collapsed format (one
+    line per distinct stack: frames separated by semicolons and number of
+    samples), which is accepted by flamegraph tools::
+
+        $ flamegraph.pl profiles/person.GET_resource.collapsed > person.svg
+
+    Requests which are not profiled only pay for the decision.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import threading
+from collections import defaultdict
+try:
+    from hmac import compare_digest
+except ImportError:
+    compare_digest = lambda a, b: a == b
+
+from ._compat import iteritems
+
+
+class Profile(object):
+    """
+    Stacks sampled from one thread.
+    """
+    def __init__(self, resource, operation, max_depth):
+        self.resource = resource
+        self.operation = operation
+        self.max_depth = max_depth
+        self.counts = defaultdict(int)
+        self.samples = 0
+
+    def sample(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append('%s:%s' % (frame.f_globals.get('__name__', '?'),
+                                    frame.f_code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        self.counts[';'.join(stack)] += 1
+        self.samples += 1
+
+
+class SamplingProfiler(object):
+    """
+    Samples stacks of threads handling profiled requests and aggregates
+    them per resource and operation.
+
+    Instance is available as ``app.data.profiler``.
+    """
+    #: Number of seconds between samples.
+    interval = 0.005
+
+    #: Directory to which collapsed stacks are written (file
+    #: ``<resource>.<operation>.collapsed`` is rewritten after every
+    #: profiled request). None to keep them only in memory (see
+    #: :func:`collapsed`).
+    output_dir = None
+
+    #: Request header activating profiling of the request, if its value is
+    #: equal to :attr:`token`.
+    header = 'X-Eve-Mongoengine-Profile'
+
+    #: Secret shared with trusted clients, None disables the header.
+    token = None
+
+    #: Maximal number of recorded frames of a stack (the innermost ones
+    #: are dropped).
+    max_depth = 128
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        # thread id -> Profile of requests being profiled
+        self._active = {}
+        self._thread = None
+        # (resource, operation) -> {stack: number of samples}
+        self.profiles = {}
+
+    def wanted(self, headers, option):
+        """
+        Returns True if request should be profiled: the resource's
+        ``profile`` option is True, or it is sampling rate and the request
+        was chosen, or the request has header with :attr:`token`.
+        """
+        if option is True or option and random.random() < option:
+            return True
+        if self.token is not None:
+            value = headers.get(self.header)
+            return value is not None and compare_digest(str(value),
+                                                        str(self.token))
+        return False
+
+    def start(self, resource, operation):
+        """
+        Starts profiling of current thread.
+        """
+        profile = Profile(resource, operation, self.max_depth)
+        with self.lock:
+            self._active[threading.current_thread().ident] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='eve-mongoengine-'
+                                                     'profiler')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        """
+        Stops profiling of current thread (if it is profiled), aggregates
+        and writes its stacks. Returns its :class:`Profile` or None.
+        """
+        if not self._active:
+            return None
+        with self.lock:
+            profile = self._active.pop(threading.current_thread().ident,
+                                       None)
+            if profile is None or not profile.samples:
+                return profile
+            key = (profile.resource, profile.operation)
+            counts = self.profiles.setdefault(key, defaultdict(int))
+            for stack, count in iteritems(profile.counts):
+                counts[stack] += count
+            if self.output_dir is not None:
+                self._write(key)
+        return profile
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(iteritems(self._active))
+            frames = sys._current_frames()
+            for ident, profile in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.sample(frame)
+            del frames
+            time.sleep(self.interval)
+
+    def collapsed(self, resource, operation):
+        """
+        Returns aggregated stacks of resource and operation in collapsed
+        format.
+        """
+        counts = self.profiles.get((resource, operation), {})
+        return ''.join('%s %d\n' % (stack, count)
+                       for stack, count in sorted(iteritems(counts)))
+
+    def _write(self, key):
+        name = re.sub(r'[^\w.-]', '_', '%s.%s' % key)
+        path = os.path.join(self.output_dir, name + '.collapsed')
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.collapsed(*key))
+        # readers never see partially written file
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(path + '.tmp', path)
+
+    def reset(self):
+        """
+        Drops aggregated stacks.
+        """
+        with self.lock:
+            self.profiles.clear()
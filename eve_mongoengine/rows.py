@@ -0,0 +1,155 @@
+
+"""
+    eve_mongoengine.rows
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Lightweight read-only rows of documents (see ``lightweight_rows`` option
+    in :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    Mongoengine Document created for every fetched document carries
+    ``_data``, ``_changed_fields``, ``_dynamic_fields`` and sends signals,
+    although :func:`find` only converts it back to SON. Row class generated
+    per model keeps converted field values in ``__slots__`` and converts
+    them by the same field ``to_python()`` and ``to_mongo()`` methods, so
+    :func:`Row.to_mongo` returns the same SON as ``Document.to_mongo()``.
+
+    Documents of models which cannot be represented by rows (dynamic
+    documents, models with auto-generated fields or overriding
+    ``to_mongo()``) are hydrated into Documents as usual, as well as all
+    documents while receivers of init signals are connected.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+from bson import SON
+from mongoengine import signals
+from mongoengine.base import BaseDocument, get_document
+from mongoengine.base.common import ALLOW_INHERITANCE
+
+
+class Row(object):
+    """
+    Base class of read-only rows, subclass per model is created by
+    :func:`row_class`. Field values are available as attributes.
+    """
+    __slots__ = ()
+
+    #: model class of the row
+    _model = None
+
+    # (slot setter, field name, db field, field) in model's field order
+    _converters = ()
+
+    def __init__(self, son, only_fields=()):
+        # the same defaults as Document._from_son(son, only_fields)
+        for setter, name, db_field, field in self._converters:
+            value = son.get(db_field)
+            if value is not None:
+                value = field.to_python(value)
+            elif db_field in only_fields and db_field not in son:
+                continue
+            elif not field.null and field.default is not None:
+                value = field.default
+                if callable(value):
+                    value = value()
+            setter(self, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Rows are read-only.")
+
+    def __iter__(self):
+        return iter(self._model._fields_ordered)
+
+    def __repr__(self):
+        return '<%s row: %s>' % (self._model.__name__,
+                                 getattr(self, 'id', None))
+
+    def to_mongo(self):
+        """
+        Returns SON of the row, equal to ``to_mongo()`` of Document.
+        """
+        data = SON()
+        data['_id'] = None
+        data['_cls'] = self._model._class_name
+        for setter, name, db_field, field in self._converters:
+            value = getattr(self, name, None)
+            if value is not None:
+                data[db_field] = field.to_mongo(value)
+        if data['_id'] is None:
+            data.pop('_id')
+        if not self._model._meta.get('allow_inheritance', ALLOW_INHERITANCE):
+            data.pop('_cls')
+        return data
+
+
+# model class -> row class or None
+_row_classes = {}
+
+
+def _supported(model_cls):
+    if model_cls._dynamic:
+        return False
+    # field names would shadow methods of rows
+    if set(model_cls._fields) & set(dir(Row)):
+        return False
+    if any(field._auto_gen for field in model_cls._fields.values()):
+        return False
+    for klass in model_cls.__mro__:
+        if klass is BaseDocument:
+            break
+        if 'to_mongo' in vars(klass) or '_from_son' in vars(klass):
+            return False
+    return True
+
+
+def row_class(model_cls):
+    """
+    Returns read-only row class of given model (created on first use) or
+    None if documents of the model have to be hydrated into Documents.
+    """
+    try:
+        return _row_classes[model_cls]
+    except KeyError:
+        pass
+    cls = None
+    if _supported(model_cls):
+        names = list(model_cls._fields_ordered)
+        cls = type('%sRow' % model_cls.__name__, (Row,),
+                   {'__slots__': tuple(names), '_model': model_cls})
+        fields = model_cls._fields
+        cls._converters = tuple(
+            (cls.__dict__[name].__set__, name, fields[name].db_field,
+             fields[name]) for name in names)
+    _row_classes[model_cls] = cls
+    return cls
+
+
+def iterate_rows(qs):
+    """
+    Iterates documents matched by mongoengine QuerySet as read-only rows
+    (or Documents of models not supported by rows).
+    """
+    if signals.signals_available and (signals.pre_init.receivers or
+                                      signals.post_init.receivers):
+        # receivers expect Documents
+        for document in qs:
+            yield document
+        return
+    if qs._limit == 0 or qs._none:
+        return
+    model_cls = qs._document
+    # QuerySet.only_fields is not available in older mongoengine
+    only_fields = getattr(qs, 'only_fields', None)
+    kwargs = {'only_fields': only_fields} if only_fields else {}
+    only_fields = set(only_fields or ())
+    for son in qs._cursor:
+        class_name = son.get('_cls', model_cls._class_name)
+        document_cls = model_cls
+        if class_name != model_cls._class_name:
+            document_cls = get_document(class_name)
+        cls = row_class(document_cls)
+        if cls is None:
+            yield document_cls._from_son(son, **kwargs)
+        else:
+            yield cls(son, only_fields)
@@ -18,7 +18,8 @@ from mongoengine import (StringField, IntField, FloatField, BooleanField,
                          EmbeddedDocumentField, SortedListField, DictField,
                          MapField, UUIDField, ObjectIdField, LineStringField,
                          GeoPointField, PointField, PolygonField, BinaryField,
-                         ReferenceField, DynamicField, FileField)
+                         ReferenceField, DynamicField, FileField,
+                         GenericEmbeddedDocumentField)
 from mongoengine import DynamicDocument
 
 from eve.exceptions import SchemaException
@@ -60,6 +61,16 @@ class SchemaMapper(object):
         # GenericEmbeddedDocumentField
     }
 
+    #: Field classes whose values are suggested to be excluded from
+    #: collection listings (directly or as items of lists), see
+    #: :func:`suggest_list_profile`.
+    _list_profile_excluded = (BinaryField, FileField)
+
+    #: Item field classes of lists suggested to be excluded from collection
+    #: listings.
+    _list_profile_excluded_items = (EmbeddedDocumentField,
+                                    GenericEmbeddedDocumentField)
+
     @classmethod
     def _resolve_field_class(cls, field):
         """
@@ -171,6 +182,30 @@ class SchemaMapper(object):
 
         return fdict
 
+    @classmethod
+    def suggest_list_profile(cls, model_cls):
+        """
+        Returns sorted names (db fields) of fields of model, which are
+        suggested to be left out of collection listings: binary data, files
+        and lists of embedded documents (see ``list_profile`` option of the
+        data layer).
+
+        :param model_cls: Mongoengine model class, subclass of
+                        :class:`mongoengine.Document`.
+        """
+        excluded = []
+        for field in model_cls._fields.values():
+            if getattr(field, 'eve_field', False) or field.primary_key:
+                continue
+            item = field
+            while isinstance(item, ListField):
+                item = item.field
+            if isinstance(item, cls._list_profile_excluded) or (
+                    item is not field and
+                    isinstance(item, cls._list_profile_excluded_items)):
+                excluded.append(field.db_field)
+        return sorted(excluded)
+
     @classmethod
     def get_subresource_settings(cls, model_cls, resource_name,
                                  resource_settings, lowercase=True):
@@ -0,0 +1,99 @@
+
+"""
+    eve_mongoengine.singleflight
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Coalescing of identical concurrent reads (see ``coalesce_reads`` option
+    in :attr:`MongoengineDataLayer.mongoengine_options`).
+
+    The first caller of :func:`SingleFlight.do` with given key executes the
+    query, callers arriving while it is in flight wait for its result
+    instead of sending the same query to MongoDB.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import sys
+import threading
+
+from ._compat import iteritems
+
+
+class _Call(object):
+    """
+    Query in flight.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """
+    Executes at most one call per key at a time and shares its result (or
+    exception) with all concurrent callers. The result is shared, so it
+    must not be mutated by the callers.
+
+    Instance used by the data layer is available as ``app.data.flights``.
+    """
+    #: Default number of seconds a caller waits for the result of call in
+    #: flight, after which it executes the call itself.
+    timeout = 1.0
+
+    def __init__(self, **options):
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Returns result of ``fn()``, executed only if there is no call with
+        the same key in flight. Waits at most ``timeout`` seconds (default
+        :attr:`timeout`) for the result of call in flight.
+        """
+        with self.lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+        if leader:
+            try:
+                call.result = fn()
+            except Exception:
+                call.exc_info = sys.exc_info()
+                raise
+            finally:
+                with self.lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+        if timeout is None:
+            timeout = self.timeout
+        if not call.done.wait(timeout):
+            with self.lock:
+                self.timeouts += 1
+                self.executed += 1
+            return fn()
+        with self.lock:
+            self.coalesced += 1
+        if call.exc_info is not None:
+            raise call.exc_info[1]
+        return call.result
+
+    def stats(self):
+        """
+        Returns dict with numbers of ``executed`` calls, calls served by
+        call in flight (``coalesced``) and ``timeouts`` of waiting.
+        """
+        with self.lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced,
+                    'timeouts': self.timeouts, 'in_flight': len(self._calls)}
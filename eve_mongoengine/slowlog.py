@@ -0,0 +1,211 @@
+
+"""
+    eve_mongoengine.slowlog
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Log of slow queries executed by the data layer. Queries slower than
+    ``slow_query_threshold`` option (see
+    :attr:`MongoengineDataLayer.mongoengine_options`) are passed to
+    :class:`SlowQueryLog`, which builds log entries (shape of the query, its
+    duration and optionally explain output) and hands them over to pluggable
+    sink.
+
+    :copyright: (c) 2014 by Stanislav Heller.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import time
+import logging
+import threading
+
+from bson import json_util, SON
+from pymongo.errors import PyMongoError, OperationFailure
+
+from ._compat import iteritems
+from .advisor import filter_shape, parse_explain, _shape_to_json
+
+
+logger = logging.getLogger('eve_mongoengine.slowlog')
+
+#: Operations, whose slow queries may be explained (see
+#: :attr:`SlowQueryLog.explain`).
+EXPLAINED_OPERATIONS = ('find', 'find_one', 'find_many_by_ids', 'count',
+                        'remove')
+
+
+def logging_sink(entry):
+    """
+    Default sink of :class:`SlowQueryLog`: logs entry serialized into
+    MongoDB extended JSON by logger ``eve_mongoengine.slowlog`` at WARNING
+    level.
+    """
+    logger.warning('Slow query: %s', json_util.dumps(entry, sort_keys=True))
+
+
+def explain_query(collection, find_args, verbosity='executionStats'):
+    """
+    Returns explain output of query given by arguments of pymongo's
+    ``find()`` (see :func:`datalayer.queryset_to_find_args`), including
+    execution statistics. The query is executed.
+    """
+    command = SON([('find', collection.name),
+                   ('filter', find_args['spec'])])
+    if find_args.get('sort'):
+        command['sort'] = SON(find_args['sort'])
+    if find_args.get('fields'):
+        command['projection'] = find_args['fields']
+    for key in ('skip', 'limit'):
+        if find_args.get(key):
+            command[key] = find_args[key]
+    try:
+        return collection.database.command(
+            SON([('explain', command), ('verbosity', verbosity)]))
+    except OperationFailure:
+        # MongoDB < 3.0 has no explain command
+        cursor = collection.find(find_args['spec'], find_args.get('fields'))
+        if find_args.get('sort'):
+            cursor = cursor.sort(find_args['sort'])
+        return cursor.explain()
+
+
+def explain_summary(explain):
+    """
+    Returns values-free summary of explain output: keys of
+    :func:`advisor.parse_explain` and execution statistics (numbers of
+    returned documents, examined keys and documents and duration).
+    """
+    summary = parse_explain(explain)
+    stats = explain.get('executionStats', explain)
+    for key in ('nReturned', 'totalKeysExamined', 'totalDocsExamined',
+                'executionTimeMillis', 'n', 'nscanned', 'nscannedObjects',
+                'millis'):
+        if key in stats:
+            summary[key] = stats[key]
+    return summary
+
+
+class SlowQueryLog(object):
+    """
+    Rate-limited log of slow queries.
+
+    Instance is available as ``app.data.slow_query_log``. Entries are dicts
+    with keys ``resource``, ``operation``, ``duration_ms``, ``suppressed``
+    (number of entries dropped by rate limit since the previous one) and,
+    if known, ``filter`` (shape of the filter without values, see
+    :func:`advisor.filter_shape`), ``sort``, ``projection``, ``skip``,
+    ``limit``, ``explain`` and ``spec`` (raw filter sent to MongoDB, only
+    with :attr:`log_values`). They are passed to :attr:`sink`.
+    """
+    #: If True, slow queries of :data:`EXPLAINED_OPERATIONS` are explained
+    #: (with execution stats) and the summary of the output (see
+    #: :func:`explain_summary`) is added to the log entry. Note that explain
+    #: executes the query again.
+    explain = False
+
+    #: If True, explained entries are built and passed to the sink in
+    #: background thread, not in the request.
+    background = True
+
+    #: If True, entries contain also raw ``spec`` and whole explain output,
+    #: which include values sent by clients (possibly personal data).
+    log_values = False
+
+    #: Maximal number of entries passed to the sink during
+    #: :attr:`rate_period` seconds. Other entries are dropped.
+    rate_limit = 10
+
+    #: Length of rate limiting window in seconds.
+    rate_period = 60
+
+    def __init__(self, sink=None, **options):
+        """
+        Constructor.
+
+        :param sink: callable accepting log entry (dict), default
+                     :func:`logging_sink`.
+        :param options: overrides of class attributes.
+        """
+        for name, value in iteritems(options):
+            if not hasattr(self.__class__, name):
+                raise TypeError("Unknown option '%s'." % name)
+            setattr(self, name, value)
+        self.sink = sink or logging_sink
+        self.lock = threading.Lock()
+        self._window_start = 0
+        self._window_count = 0
+        self._suppressed = 0
+
+    def _acquire(self):
+        """
+        Returns None if the entry has to be dropped by rate limit, else
+        number of entries dropped since the last passed one.
+        """
+        now = time.time()
+        with self.lock:
+            if now - self._window_start >= self.rate_period:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.rate_limit:
+                self._suppressed += 1
+                return None
+            self._window_count += 1
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def log(self, resource, operation, duration, model_cls=None,
+            find_args=None):
+        """
+        Passes entry about slow query to the sink (unless rate limit is
+        exceeded).
+
+        :param resource: resource name.
+        :param operation: name of data layer method (``find``, ``insert``...).
+        :param duration: duration of the query in seconds.
+        :param model_cls: queried mongoengine model.
+        :param find_args: query as arguments of pymongo's ``find()``.
+        """
+        suppressed = self._acquire()
+        if suppressed is None:
+            return
+        entry = {
+            'resource': resource,
+            'operation': operation,
+            'duration_ms': int(round(duration * 1000)),
+            'suppressed': suppressed,
+        }
+        explained = False
+        if find_args:
+            entry['filter'] = _shape_to_json(filter_shape(find_args['spec']))
+            if self.log_values:
+                entry['spec'] = find_args['spec']
+            for key, name in (('sort', 'sort'), ('fields', 'projection'),
+                              ('skip', 'skip'), ('limit', 'limit')):
+                if find_args.get(key):
+                    entry[name] = find_args[key]
+            explained = self.explain and model_cls is not None and \
+                operation in EXPLAINED_OPERATIONS
+        if not explained:
+            self._emit(entry)
+        elif self.background:
+            thread = threading.Thread(target=self._explain_and_emit,
+                                      args=(entry, model_cls, find_args))
+            thread.daemon = True
+            thread.start()
+        else:
+            self._explain_and_emit(entry, model_cls, find_args)
+
+    def _explain_and_emit(self, entry, model_cls, find_args):
+        try:
+            explain = explain_query(model_cls._get_collection(), find_args)
+            entry['explain'] = explain if self.log_values \
+                else explain_summary(explain)
+        except PyMongoError as e:
+            entry['explain_error'] = str(e)
+        self._emit(entry)
+
+    def _emit(self, entry):
+        try:
+            self.sink(entry)
+        except Exception:
+            # broken sink must not break the request
+            logger.exception('Slow query sink failed.')
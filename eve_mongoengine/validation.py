@@ -14,11 +14,22 @@
     :license: BSD, see LICENSE for more details.
 """
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from bson import ObjectId
+from cerberus import errors
+from cerberus import ValidationError as DocumentError
 from flask import current_app as app
-from mongoengine import ValidationError, FileField
+from mongoengine import ValidationError, FileField, GridFSProxy
 
 from eve.io.mongo.validation import Validator
 from eve_mongoengine._compat import iteritems
+from eve_mongoengine.datalayer import (is_increment, INCREMENT_OPERATOR,
+                                       MongoengineUpdater)
+from eve_mongoengine.compiler import compiled_validator
 
 
 class EveMongoengineValidator(Validator):
@@ -26,6 +37,10 @@ class EveMongoengineValidator(Validator):
     Helper validator which adapts mongoengine special-purpose fields
     to cerberus validator API.
     """
+    #: Types, whose validation differs from cerberus only in updates (used
+    #: by :mod:`compiler`).
+    update_only_types = ('integer', 'float')
+
     def validate(self, document, schema=None, update=False, context=None):
         """
         Main validation method which simply tries to validate against cerberus
@@ -45,8 +60,23 @@ class EveMongoengineValidator(Validator):
             translate = lambda x: model_cls._reverse_db_field_map.get(x, x)
             document = {translate(k): document[k] for k in document}
 
+            # Do not assign uploaded files to GridFS-backed fields - model
+            # would store them into GridFS just to validate the document and
+            # Eve stores them again afterwards. Placeholder proxy is enough.
+            uploads = {}
+            for attr, field in iteritems(model_cls._fields):
+                if attr in document and isinstance(field, FileField) and \
+                        field.proxy_class is GridFSProxy:
+                    uploads[attr] = document.pop(attr)
+
             doc = model_cls(**document)
-            # rewind all file-like's
+            for attr, upload in iteritems(uploads):
+                if upload is not None:
+                    proxy = model_cls._fields[attr].get_proxy_obj(
+                        key=attr, instance=doc)
+                    proxy.grid_id = ObjectId()
+                    doc._data[attr] = proxy
+            # rewind all other file-like's
             for attr, field in iteritems(model_cls._fields):
                 if isinstance(field, FileField) and attr in document:
                     document[attr].stream.seek(0)
@@ -59,6 +89,77 @@ class EveMongoengineValidator(Validator):
 
         return True
 
+    def _compiled(self, schema):
+        """
+        Returns compiled validation function of resource's schema if the
+        resource has ``compiled_validation`` option and the validator
+        validates by the resource's schema (not nested one), else None.
+        """
+        if schema is not None or not self.resource or \
+                self.ignore_none_values:
+            return None
+        resource_schema = app.config['DOMAIN'][self.resource]['schema']
+        if self.schema is not resource_schema or \
+                not app.data._resource_option(self.resource,
+                                              'compiled_validation'):
+            return None
+        return compiled_validator(self.__class__, self.resource,
+                                  resource_schema)
+
+    def _validate(self, document, schema=None, update=False, context=None):
+        """
+        Validates document by compiled schema (see :mod:`compiler`) if
+        enabled, else by cerberus.
+        """
+        validate = self._compiled(schema)
+        if validate is None:
+            Validator._validate(self, document, schema, update, context)
+        else:
+            self._errors = {}
+            self.update = update
+            if document is None:
+                raise DocumentError(errors.ERROR_DOCUMENT_MISSING)
+            if not isinstance(document, Mapping):
+                raise DocumentError(errors.ERROR_DOCUMENT_FORMAT
+                                    % str(document))
+            self.document = context if context is not None else document
+            validate(self, document)
+        if update and context is None and self.resource:
+            self._validate_increments(document)
+        return len(self._errors) == 0
+
+    def _validate_increments(self, document):
+        """
+        Rejects increments of fields which mongoengine cannot increment
+        (i.e. ``{"$inc": 1}`` sent as value of DictField or DynamicField).
+        """
+        model_cls = app.data.models[self.resource]
+        for db_field, value in iteritems(document):
+            if not is_increment(value):
+                continue
+            field_name = model_cls._reverse_db_field_map.get(db_field)
+            field = model_cls._fields.get(field_name)
+            if not isinstance(field,
+                              MongoengineUpdater.increment_field_classes):
+                self._error(db_field, 'increments are allowed only for '
+                                      'numeric fields')
+
+    def _validate_type_integer(self, field, value):
+        """
+        Allows atomic increments of integer fields in updates.
+        """
+        if self.update and is_increment(value):
+            value = value[INCREMENT_OPERATOR]
+        Validator._validate_type_integer(self, field, value)
+
+    def _validate_type_float(self, field, value):
+        """
+        Allows atomic increments of float fields in updates.
+        """
+        if self.update and is_increment(value):
+            value = value[INCREMENT_OPERATOR]
+        Validator._validate_type_float(self, field, value)
+
     def _validate_type_dynamic(self, field, value):
         """
         Dummy validation method just to convince cerberus not to validate that
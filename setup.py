@@ -13,7 +13,11 @@ except:
 exec(open('eve_mongoengine/__version__.py').read())
 VERSION = get_version()
 
-extra_opts = dict()
+extra_opts = dict(
+    extras_require={
+        'asyncio': ['motor'],
+    },
+)
 
 # Project Setup
 setup(
@@ -27,7 +31,7 @@ setup(
     description='An Eve extension for Mongoengine ODM support',
     long_description=LONG_DESCRIPTION,
     platforms=['any'],
-    packages=find_packages(exclude=["test*"]),
+    packages=find_packages(exclude=["test*", "benchmarks*"]),
     test_suite="tests",
     license='MIT',
     include_package_data=True,
@@ -1,11 +1,15 @@
 
+import os
+import copy
 import json
+import unittest
 from flask import Response as BaseResponse
 from mongoengine import *
 import mongoengine.signals
 from eve import Eve
 
 from eve_mongoengine import EveMongoengine
+from eve_mongoengine.memory import InMemoryDataLayer, NullDataLayer
 
 SETTINGS = {
     'MONGO_HOST': 'localhost',
@@ -37,6 +41,13 @@ class Response(BaseResponse):
         else:
             raise TypeError("Not an application/json response")
 
+# EVE_MONGOENGINE_TEST_BACKEND=memory runs test classes with memory = True
+# on in-memory data layer, without MongoDB
+MEMORY_BACKEND = os.environ.get('EVE_MONGOENGINE_TEST_BACKEND') == 'memory'
+
+# skips tests of memory = True classes which need MongoDB anyway
+mongodb_only = unittest.skipIf(MEMORY_BACKEND, 'needs MongoDB')
+
 # inject new reponse class for testing
 Eve.response_class = Response
 
@@ -128,12 +139,23 @@ mongoengine.signals.pre_save.connect(update_b, sender=HawkeyDoc)
 
 
 class BaseTest(object):
+    # the class uses the database only through the test client and helpers
+    # below, so it may run on in-memory data layer
+    memory = False
+
     @classmethod
     def setUpClass(cls):
         SETTINGS['DOMAIN'] = {'eve-mongoengine':{}}
-        app = Eve(settings=SETTINGS)
-        app.debug = True
-        ext = EveMongoengine(app)
+        if MEMORY_BACKEND and cls.memory:
+            app = Eve(settings=SETTINGS, data=NullDataLayer)
+            app.debug = True
+            ext = EveMongoengine()
+            ext.datalayer_class = InMemoryDataLayer
+            ext.init_app(app)
+        else:
+            app = Eve(settings=SETTINGS)
+            app.debug = True
+            ext = EveMongoengine(app)
         ext.add_model([SimpleDoc, ComplexDoc, LimitedDoc, FieldsDoc,
                        NonStructuredDoc, Inherited, HawkeyDoc])
         cls.ext = ext
@@ -142,6 +164,65 @@ class BaseTest(object):
 
     @classmethod
     def tearDownClass(cls):
+        if isinstance(cls.app.data, InMemoryDataLayer):
+            cls.app.data.drop()
+            return
         # deletes the whole test database
         cls.app.data.conn.drop_database(SETTINGS['MONGO_DBNAME'])
 
+    # helpers working with models on both MongoDB and in-memory data layer
+
+    def _in_memory(self, model_cls):
+        data = self.app.data
+        if not isinstance(data, InMemoryDataLayer):
+            return None
+        for resource, registered in data.models.items():
+            if registered is model_cls:
+                return resource
+
+    def save_doc(self, doc):
+        resource = self._in_memory(type(doc))
+        if resource is None:
+            return doc.save()
+        with self.app.app_context(), self.app.data.lock:
+            self.app.data._save(resource, doc, doc.pk is None)
+            self.app.data._invalidate_caches(resource, [doc.pk])
+        return doc
+
+    def delete_doc(self, *docs):
+        for doc in docs:
+            resource = self._in_memory(type(doc))
+            if resource is None:
+                doc.delete()
+            else:
+                with self.app.app_context():
+                    self.app.data.remove(resource, {'_id': doc.pk})
+
+    def delete_all(self, model_cls):
+        resource = self._in_memory(model_cls)
+        if resource is None:
+            model_cls.objects.delete()
+        else:
+            with self.app.app_context():
+                self.app.data.remove(resource, {})
+
+    def raw_document(self, model_cls, id_):
+        resource = self._in_memory(model_cls)
+        if resource is None:
+            return model_cls._get_collection().find_one({'_id': id_})
+        with self.app.data.lock:
+            return copy.deepcopy(self.app.data._collection(resource).get(id_))
+
+    def documents(self, model_cls):
+        resource = self._in_memory(model_cls)
+        if resource is None:
+            return list(model_cls.objects)
+        with self.app.app_context(), self.app.data.lock:
+            return [model_cls._from_son(copy.deepcopy(document)) for document
+                    in self.app.data._matching(resource, {})]
+
+    def document(self, model_cls):
+        # the only document of the model
+        documents = self.documents(model_cls)
+        self.assertEqual(len(documents), 1)
+        return documents[0]
@@ -0,0 +1,129 @@
+
+import os
+import json
+import tempfile
+import unittest
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.advisor import (IndexAdvisor, query_shape, suggest_index,
+                                     parse_explain, format_report)
+
+
+class TestQueryShapes(unittest.TestCase):
+
+    def test_shape_ignores_values(self):
+        s1 = query_shape({'spec': {'a': 1, 'b': {'$gt': 5}},
+                          'sort': [('c', -1)]})
+        s2 = query_shape({'spec': {'b': {'$gt': 7}, 'a': 2},
+                          'sort': [('c', -1)]})
+        s3 = query_shape({'spec': {'a': 1, 'b': {'$lt': 5}},
+                          'sort': [('c', -1)]})
+        self.assertEqual(s1, s2)
+        self.assertNotEqual(s1, s3)
+
+    def test_shape_and_or(self):
+        shape = query_shape({'spec': {'$and': [{'a': 1}, {'b': {'$gt': 1}}],
+                                      '$or': [{'c': 1}, {'d': 1}]}})
+        self.assertEqual(shape[0], (('$or', ((('c', '$eq'),),
+                                              (('d', '$eq'),))),
+                                    ('a', '$eq'), ('b', '$gt')))
+
+    def test_suggest_index(self):
+        shape = query_shape({'spec': {'a': {'$gt': 1}, 'b': {'$in': [1, 2]},
+                                      'loc': {'$near': [0, 0]}},
+                             'sort': [('c', -1)]})
+        self.assertEqual(suggest_index(shape), [('b', 1), ('c', -1),
+                                                ('a', 1)])
+        self.assertIsNone(suggest_index(query_shape({'spec': {}})))
+
+    def test_parse_explain(self):
+        plan = parse_explain({'queryPlanner': {'winningPlan': {
+            'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}})
+        self.assertEqual(plan, {'collscan': True, 'in_memory_sort': True,
+                                'indexes': []})
+        plan = parse_explain({'queryPlanner': {'winningPlan': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN',
+                                             'indexName': 'a_1'}}}})
+        self.assertEqual(plan, {'collscan': False, 'in_memory_sort': False,
+                                'indexes': ['a_1']})
+        # MongoDB < 3.0
+        plan = parse_explain({'cursor': 'BasicCursor', 'scanAndOrder': True})
+        self.assertEqual(plan, {'collscan': True, 'in_memory_sort': True,
+                                'indexes': []})
+
+
+class TestIndexAdvisor(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        self.advisor = self.app.data.index_advisor
+        self.advisor.reset()
+        self.advisor.explain_interval = 3600
+        self.app.config['DOMAIN']['simpledoc']['index_advisor'] = True
+        for i in range(3):
+            SimpleDoc(a='x%d' % i, b=i).save()
+
+    def tearDown(self):
+        del self.app.config['DOMAIN']['simpledoc']['index_advisor']
+        del self.advisor.explain_interval
+        self.advisor.reset()
+        SimpleDoc.objects.delete()
+
+    def test_disabled(self):
+        del self.app.config['DOMAIN']['simpledoc']['index_advisor']
+        try:
+            self.client.get('/simpledoc/')
+            self.assertEqual(self.advisor.report(), [])
+        finally:
+            self.app.config['DOMAIN']['simpledoc']['index_advisor'] = True
+
+    def test_report(self):
+        for value in ('x1', 'x2'):
+            self.client.get('/simpledoc/?where={"a": "%s"}&sort=[("b", -1)]'
+                            % value)
+        self.client.get('/simpledoc/%s' % SimpleDoc.objects[0].id)
+        report = self.advisor.report('simpledoc')
+        self.assertEqual(len(report), 2)
+        self.assertEqual(report[0]['count'], 2)
+        self.assertFalse(report[0]['explained'])
+
+        self.advisor.analyze()
+        report = self.advisor.report('simpledoc')
+        self.assertTrue(report[0]['explained'])
+        self.assertTrue(report[0]['in_memory_sort'])
+        self.assertEqual(report[0]['suggested_index'][-2:],
+                         [['a', 1], ['b', -1]])
+        self.assertFalse(report[0]['declared'])
+        # lookup by _id uses index
+        self.assertFalse(report[1]['collscan'])
+        self.assertIsNone(report[1]['suggested_index'])
+        self.assertIn('suggested index', format_report(report))
+
+    def test_save(self):
+        self.client.get('/simpledoc/?where={"b": {"$gt": 0}}')
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.advisor.save(path)
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            os.remove(path)
+        self.assertEqual(report, self.advisor.report())
+        self.assertIn(['b', '$gt'], report[0]['filter'])
+
+    def test_options(self):
+        advisor = IndexAdvisor(sample_rate=0)
+        advisor.record('simpledoc', SimpleDoc, {'spec': {}})
+        self.assertEqual(advisor.report(), [])
+        self.assertRaises(TypeError, IndexAdvisor, unknown=1)
+
+    def test_max_shapes(self):
+        advisor = IndexAdvisor(max_shapes=2)
+        for field in ('a', 'b', 'a', 'c'):
+            advisor.record('simpledoc', SimpleDoc, {'spec': {field: 1}})
+        # 'b' was seen least recently
+        self.assertEqual(sorted(item['filter'][0][0]
+                                for item in advisor.report()), ['a', 'c'])
+        self.assertEqual(advisor.dropped, 1)
+        advisor.reset()
+        self.assertEqual(advisor.dropped, 0)
@@ -0,0 +1,198 @@
+
+import unittest
+
+from eve.utils import parse_request
+from mongoengine.connection import get_db
+
+from tests import BaseTest, SimpleDoc, Inherited, ComplexDoc, Inner
+
+try:
+    import asyncio
+    from eve_mongoengine.async_datalayer import (AsyncMongoengineDataLayer,
+                                                 AsyncIOMotorClient)
+except (ImportError, SyntaxError):
+    AsyncMongoengineDataLayer = AsyncIOMotorClient = None
+
+
+def resolved(value=None, exception=None):
+    """
+    Returns future already resolved to value (or exception).
+    """
+    future = asyncio.get_event_loop().create_future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(value)
+    return future
+
+
+class FakeAsyncCursor(object):
+    """
+    Asyncio cursor iterating synchronous pymongo cursor.
+    """
+    def __init__(self, cursor, limits):
+        self.cursor = cursor
+        self.limits = limits
+
+    def sort(self, *args):
+        self.cursor.sort(*args)
+        return self
+
+    def skip(self, skip):
+        self.cursor.skip(skip)
+        return self
+
+    def limit(self, limit):
+        self.cursor.limit(limit)
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        self.limits.append(max_time_ms)
+        self.cursor.max_time_ms(max_time_ms)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        try:
+            return resolved(next(self.cursor))
+        except StopIteration:
+            return resolved(exception=StopAsyncIteration())
+
+
+class FakeAsyncCollection(object):
+    """
+    Subset of motor's collection API over synchronous pymongo collection.
+    """
+    def __init__(self, collection, limits):
+        self.collection = collection
+        self.limits = limits
+
+    def find(self, spec, fields=None):
+        return FakeAsyncCursor(self.collection.find(spec, fields),
+                               self.limits)
+
+    def find_one(self, spec, fields=None):
+        return resolved(self.collection.find_one(spec, fields))
+
+    def count_documents(self, spec, maxTimeMS=None):
+        cursor = self.collection.find(spec)
+        if maxTimeMS is not None:
+            self.limits.append(maxTimeMS)
+            cursor.max_time_ms(maxTimeMS)
+        return resolved(cursor.count())
+
+
+class FakeAsyncDatabase(object):
+    """
+    In-process stand-in of motor's database.
+    """
+    def __init__(self, db):
+        self.db = db
+        # time limits set on cursors and counts
+        self.limits = []
+
+    def __getitem__(self, name):
+        return FakeAsyncCollection(self.db[name], self.limits)
+
+
+@unittest.skipIf(AsyncMongoengineDataLayer is None, "requires asyncio")
+class TestAsyncDataLayer(BaseTest, unittest.TestCase):
+
+    def async_db(self):
+        return FakeAsyncDatabase(get_db())
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.data = AsyncMongoengineDataLayer(self.app.data,
+                                              self.async_db())
+        self.docs = [SimpleDoc(a='x%d' % i, b=i).save() for i in range(5)]
+
+    def tearDown(self):
+        SimpleDoc.objects.delete()
+        ComplexDoc.objects.delete()
+        self.loop.close()
+
+    def find(self, url):
+        with self.app.test_request_context(url):
+            req = parse_request('simpledoc')
+            return self.data.find('simpledoc', req, {})
+
+    def test_find(self):
+        pending = self.find('/simpledoc/?where={"b": {"$gt": 1}}'
+                            '&sort=[("b", -1)]')
+        # query is executed outside of request context
+        docs = self.loop.run_until_complete(pending)
+        self.assertEqual([d['b'] for d in docs], [4, 3, 2])
+        self.assertEqual(docs[0]['a'], 'x4')
+        self.assertEqual(docs[0]['_id'], self.docs[4].id)
+
+    def test_find_projection_and_pagination(self):
+        pending = self.find('/simpledoc/?projection={"a": 1}'
+                            '&sort=[("b", 1)]&max_results=2&page=2')
+        docs = self.loop.run_until_complete(pending)
+        self.assertEqual([d['a'] for d in docs], ['x2', 'x3'])
+        self.assertNotIn('b', docs[0])
+
+    def test_find_inherited(self):
+        Inherited(a='inherited', c='y').save()
+        with self.app.test_request_context('/inherited/'):
+            req = parse_request('inherited')
+            pending = self.data.find('inherited', req, {})
+        docs = self.loop.run_until_complete(pending)
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0]['C'], 'y')
+
+    def test_find_one(self):
+        with self.app.test_request_context('/simpledoc/'):
+            pending = self.data.find_one('simpledoc', None,
+                                         _id=str(self.docs[1].id))
+            missing = self.data.find_one('simpledoc', None, a='unknown')
+        doc = self.loop.run_until_complete(pending)
+        self.assertEqual(doc['a'], 'x1')
+        self.assertIsNone(self.loop.run_until_complete(missing))
+
+    def test_find_one_projection_and_slice(self):
+        doc = ComplexDoc(l=['a', 'b', 'c'], i=Inner(a='x'),
+                         o=[Inner(a='y')]).save()
+        url = '/complexdoc/?slice={"l": 2}&projection={"o": 0}'
+        with self.app.test_request_context(url):
+            req = parse_request('complexdoc')
+            pending = self.data.find_one('complexdoc', req, _id=str(doc.id))
+            expected = self.app.data.find_one('complexdoc', req,
+                                              _id=str(doc.id))
+        item = self.loop.run_until_complete(pending)
+        self.assertEqual(item['l'], ['a', 'b'])
+        self.assertNotIn('o', item)
+        self.assertEqual(item, expected)
+
+    def test_max_time_ms(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['max_time_ms'] = 1000
+        try:
+            docs = self.loop.run_until_complete(self.find('/simpledoc/'))
+            with self.app.test_request_context('/simpledoc/'):
+                req = parse_request('simpledoc')
+                pending = self.data.count('simpledoc', req, {})
+            self.assertEqual(self.loop.run_until_complete(pending), 5)
+        finally:
+            del settings['max_time_ms']
+        self.assertEqual(len(docs), 5)
+        if isinstance(self.data.db, FakeAsyncDatabase):
+            self.assertEqual(self.data.db.limits, [1000, 1000])
+
+    def test_count(self):
+        with self.app.test_request_context('/simpledoc/?where={"b": 2}'):
+            req = parse_request('simpledoc')
+            pending = self.data.count('simpledoc', req, {})
+        self.assertEqual(self.loop.run_until_complete(pending), 1)
+
+
+@unittest.skipIf(AsyncIOMotorClient is None, "requires asyncio and motor")
+class TestMotorDataLayer(TestAsyncDataLayer):
+
+    def async_db(self):
+        # motor client connected by application config
+        return None
@@ -0,0 +1,79 @@
+
+import unittest
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.batching import BatchSizer
+
+
+class FakeCursor(object):
+    retrieved = 0
+
+
+class TestBatchSizer(unittest.TestCase):
+
+    def test_observer(self):
+        sizer = BatchSizer(sampled_documents=2)
+        cursor = FakeCursor()
+        observer = sizer.observer('person', cursor, 2)
+        for retrieved in (2, 2, 4, 4, 5):
+            cursor.retrieved = retrieved
+            observer({'a': 'x' * 100})
+        observer.finish()
+        observer.finish()
+        stats = sizer.stats('person')
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['documents'], 5)
+        self.assertEqual(stats['getmores'], 2)
+        self.assertEqual(stats['last_batch_size'], 2)
+        self.assertTrue(100 < stats['average_size'] < 150)
+        self.assertEqual(list(sizer.stats()), ['person'])
+
+    def test_batch_size(self):
+        sizer = BatchSizer()
+        self.assertIsNone(sizer.batch_size('person', 1000))
+        sizer._sizes['person'] = 100.0
+        self.assertEqual(sizer.batch_size('person', 1000), 10)
+        self.assertEqual(sizer.batch_size('person', 1000, limit=5), 5)
+        self.assertEqual(sizer.batch_size('person', 10), 2)
+        self.assertEqual(sizer.batch_size('person', 10 ** 9), 100000)
+        self.assertRaises(TypeError, BatchSizer, unknown=1)
+
+
+class TestFindBatches(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        for n in range(30):
+            SimpleDoc(a='doc %d' % n, b=n).save()
+        self.settings = self.app.config['DOMAIN']['simpledoc']
+
+    def tearDown(self):
+        self.settings.pop('batch_size', None)
+        self.settings.pop('batch_bytes', None)
+        self.app.data.batch_sizer.reset()
+        SimpleDoc.objects.delete()
+
+    def test_batch_size(self):
+        self.settings['batch_size'] = 5
+        response = self.client.get('/simpledoc/?max_results=25')
+        self.assertEqual(response.status_code, 200)
+        stats = self.app.data.batch_sizer.stats('simpledoc')
+        self.assertEqual(stats['documents'], 25)
+        self.assertEqual(stats['last_getmores'], 4)
+
+    def test_batch_bytes(self):
+        sizer = self.app.data.batch_sizer
+        self.settings['batch_bytes'] = 10 ** 6
+        self.client.get('/simpledoc/?max_results=25')
+        self.assertIsNone(sizer.stats('simpledoc')['last_batch_size'])
+        self.assertIsNotNone(sizer.average_size('simpledoc'))
+        # whole page fits the budget
+        self.client.get('/simpledoc/?max_results=25')
+        stats = sizer.stats('simpledoc')
+        self.assertEqual(stats['last_batch_size'], 25)
+        self.assertEqual(stats['last_getmores'], 0)
+        # small budget
+        self.settings['batch_bytes'] = sizer.average_size('simpledoc') * 10
+        self.client.get('/simpledoc/?max_results=25')
+        stats = sizer.stats('simpledoc')
+        self.assertTrue(8 <= stats['last_batch_size'] <= 12)
+        self.assertGreater(stats['last_getmores'], 0)
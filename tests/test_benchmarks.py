@@ -0,0 +1,36 @@
+
+import unittest
+
+from benchmarks import runner
+from benchmarks.runner import Case
+
+
+class TestRunner(unittest.TestCase):
+
+    def test_case_name(self):
+        case = Case('patch', None, {'doc': 'small'}, 'complexdoc',
+                    {'use_atomic_update_for_patch': False,
+                     'document_cache': True})
+        self.assertEqual(case.name, 'patch[doc=small,document_cache,'
+                                    'use_atomic_update_for_patch=False]')
+        self.assertEqual(Case('delete', None).name, 'delete')
+
+    def test_measure(self):
+        stats = runner.measure([lambda: None] * 10)
+        self.assertEqual(stats['repeat'], 10)
+        self.assertTrue(stats['min'] <= stats['median'] <= stats['p95'])
+
+    def test_measure_memory(self):
+        peak = runner.measure_memory([lambda: [0] * 100000] * 2)
+        self.assertGreater(peak, 800000)
+
+    def test_compare(self):
+        base = {'results': {'a': {'median': 1.0}, 'b': {'median': 1.0},
+                            'c': {'median': 1.0}, 'd': {'median': 1.0}}}
+        current = {'results': {'a': {'median': 1.3}, 'b': {'median': 0.5},
+                               'c': {'median': 1.05}}}
+        rows, regressions = runner.compare(base, current, 0.1)
+        self.assertEqual(regressions, 1)
+        self.assertEqual([(row[0], row[4]) for row in rows],
+                         [('a', 'REGRESSION'), ('b', 'improvement'),
+                          ('c', '')])
@@ -0,0 +1,181 @@
+
+import unittest
+
+from eve.utils import config
+
+from tests import BaseTest, SimpleDoc, Inherited
+from eve_mongoengine.cache import LocalCache, SharedCache, MemoryClient
+
+
+class TestLocalCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = LocalCache(max_size=2)
+        cache.set('r', 1, {'a': 1})
+        cache.set('r', 2, {'a': 2})
+        cache.get('r', 1)
+        cache.set('r', 3, {'a': 3})
+        self.assertIsNone(cache.get('r', 2))
+        self.assertEqual(cache.get('r', 1), {'a': 1})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_copies(self):
+        cache = LocalCache()
+        doc = {'l': [1]}
+        cache.set('r', 1, doc)
+        doc['l'].append(2)
+        cache.get('r', 1)['l'].append(3)
+        self.assertEqual(cache.get('r', 1), {'l': [1]})
+
+    def test_ttl(self):
+        cache = LocalCache(ttl=-1)
+        cache.set('r', 1, {'a': 1})
+        self.assertIsNone(cache.get('r', 1))
+        self.assertRaises(TypeError, LocalCache, unknown=1)
+
+    def test_delete_and_clear(self):
+        cache = LocalCache()
+        for id_ in (1, 2):
+            cache.set('r', id_, {})
+            cache.set('s', id_, {})
+        cache.delete('r', [1])
+        self.assertIsNone(cache.get('r', 1))
+        cache.clear('s')
+        self.assertIsNone(cache.get('s', 2))
+        self.assertEqual(cache.get('r', 2), {})
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def test_shared(self):
+        client = MemoryClient()
+        cache, other = SharedCache(client), SharedCache(client)
+        cache.set('r', 1, {'a': 1})
+        cache.set('r', 2, {'a': 2})
+        self.assertEqual(other.get('r', 1), {'a': 1})
+        other.delete('r', [1])
+        self.assertIsNone(cache.get('r', 1))
+        other.clear('r')
+        self.assertIsNone(cache.get('r', 2))
+        self.assertEqual(cache.stats()['hit_ratio'], 0)
+
+    def test_ttl(self):
+        cache = SharedCache(MemoryClient(), ttl=-1)
+        cache.set('r', 1, {'a': 1})
+        self.assertIsNone(cache.get('r', 1))
+
+
+class TestDocumentCache(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        for resource in ('simpledoc', 'inherited'):
+            self.app.config['DOMAIN'][resource]['document_cache'] = True
+        self.doc = SimpleDoc(a='jimmy', b=23)
+        self.doc.save()
+        self.url = '/simpledoc/%s' % self.doc.id
+
+    def tearDown(self):
+        for resource in ('simpledoc', 'inherited'):
+            del self.app.config['DOMAIN'][resource]['document_cache']
+        self.app.data.document_cache = LocalCache()
+        SimpleDoc.objects.delete()
+
+    def update_behind_cache(self, **kwargs):
+        # bypasses the data layer
+        SimpleDoc._get_collection().update({'_id': self.doc.id},
+                                           {'$set': kwargs})
+
+    def test_cached(self):
+        self.assertEqual(self.client.get(self.url).get_json()['b'], 23)
+        self.update_behind_cache(b=24)
+        response = self.client.get(self.url).get_json()
+        self.assertEqual(response['b'], 23)
+        self.assertEqual(self.app.data.document_cache.stats()['hits'], 1)
+
+    def test_not_cached_after_write(self):
+        data = self.app.data
+        fetch_one = data._fetch_one
+
+        def fetch_and_write(resource, qry):
+            doc = fetch_one(resource, qry)
+            # write finished while the document was being fetched
+            data._invalidate_caches(resource, [self.doc.id])
+            return doc
+        data._fetch_one = fetch_and_write
+        try:
+            self.client.get(self.url)
+        finally:
+            del data._fetch_one
+        self.assertIsNone(data.document_cache.get('simpledoc', self.doc.id))
+        self.client.get(self.url)
+        self.assertIsNotNone(data.document_cache.get('simpledoc',
+                                                     self.doc.id))
+
+    def test_concurrency_control_not_cached(self):
+        self.client.get(self.url)
+        self.update_behind_cache(b=24)
+        with self.app.test_request_context():
+            doc = self.app.data.find_one('simpledoc', None,
+                                         **{config.ID_FIELD: self.doc.id})
+        self.assertEqual(doc['b'], 24)
+
+    def test_projection(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url + '?projection={"a": 1}')
+        data = response.get_json()
+        self.assertEqual(data['a'], 'jimmy')
+        self.assertNotIn('b', data)
+        data = self.client.get(self.url + '?projection={"a": 0}').get_json()
+        self.assertNotIn('a', data)
+        self.assertEqual(data['b'], 23)
+
+    def test_invalidated_by_patch(self):
+        etag = self.client.get(self.url).get_json()[config.ETAG]
+        response = self.client.patch(self.url, data='{"b": 42}',
+                                     content_type='application/json',
+                                     headers=[('If-Match', etag)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).get_json()['b'], 42)
+
+    def test_invalidated_by_put(self):
+        etag = self.client.get(self.url).get_json()[config.ETAG]
+        response = self.client.put(self.url, data='{"a": "greg"}',
+                                   content_type='application/json',
+                                   headers=[('If-Match', etag)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).get_json()['a'], 'greg')
+
+    def test_invalidated_by_delete(self):
+        etag = self.client.get(self.url).get_json()[config.ETAG]
+        response = self.client.delete(self.url,
+                                      headers=[('If-Match', etag)])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_invalidated_by_delete_of_collection(self):
+        self.client.get(self.url)
+        self.client.delete('/simpledoc/')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_shared_collection(self):
+        doc = Inherited(a='x', c='y')
+        doc.save()
+        url = '/inherited/%s' % doc.id
+        self.client.get(url)
+        response = self.client.get('/simpledoc/%s' % doc.id)
+        etag = response.get_json()[config.ETAG]
+        self.client.patch('/simpledoc/%s' % doc.id, data='{"a": "z"}',
+                          content_type='application/json',
+                          headers=[('If-Match', etag)])
+        self.assertEqual(self.client.get(url).get_json()['a'], 'z')
+
+    def test_shared_backend(self):
+        self.app.data.document_cache = SharedCache(MemoryClient())
+        self.client.get(self.url)
+        self.update_behind_cache(b=24)
+        self.assertEqual(self.client.get(self.url).get_json()['b'], 23)
+        with self.app.app_context():
+            self.app.data.remove('simpledoc', {config.ID_FIELD: self.doc.id})
+        self.assertEqual(self.client.get(self.url).status_code, 404)
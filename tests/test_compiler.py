@@ -0,0 +1,136 @@
+
+import json
+import unittest
+from datetime import datetime
+
+from cerberus import Validator
+
+from tests import BaseTest, LimitedDoc, ComplexDoc
+from eve_mongoengine.compiler import SchemaCompiler, compiled_validator
+from eve_mongoengine.validation import EveMongoengineValidator
+
+
+SCHEMA = {
+    'a': {'type': 'string', 'nullable': True, 'maxlength': 5,
+          'minlength': 2, 'allowed': ('aa', 'bbb', 'cccccc', 'x')},
+    'b': {'type': 'integer', 'nullable': True, 'min': 1, 'max': 10,
+          'required': True},
+    'c': {'type': 'float'},
+    'd': {'type': 'dict', 'schema': {
+        'x': {'type': 'string', 'required': True},
+        'y': {'type': 'list', 'schema': {'type': 'integer', 'max': 3}}}},
+    'e': {'type': 'list', 'schema': {'type': 'dict', 'schema': {
+        'p': {'type': 'string', 'allowed': ('u', 'v')},
+        'q': {'type': 'boolean', 'required': True}}}},
+    'f': {'type': 'list', 'allowed': ('u', 'v')},
+    'g': {'type': 'datetime'},
+    'h': {'empty': False},
+}
+
+DOCUMENTS = [
+    {},
+    {'b': 5},
+    {'a': 'x', 'b': None, 'c': None},
+    {'a': 'toolongvalue', 'b': 11, 'c': 'str'},
+    {'a': 'e', 'b': 0, 'c': 2.5, 'g': datetime.now(), 'h': ''},
+    {'a': 3, 'b': True, 'f': ['u', 'z'], 'g': 'now'},
+    {'d': {'y': [1, 5, 'a']}, 'e': [{'p': 'w'}, {'q': 1}, 5]},
+    {'d': {'x': 'a', 'y': 'str', 'z': 1}, 'e': 'str', 'unknown': 1},
+    {'d': {'y': [1]}, 'e': [{'q': True, 'unknown': 1}]},
+]
+
+
+class TestSchemaCompiler(unittest.TestCase):
+
+    def assertSameErrors(self, schema, document, update=False,
+                         allow_unknown=False):
+        interpreted = Validator(schema)
+        interpreted.allow_unknown = allow_unknown
+        interpreted.validate(document, update=update)
+        validator = Validator(schema)
+        validator.allow_unknown = allow_unknown
+        validator._errors = {}
+        validator.update = update
+        validator.document = document
+        SchemaCompiler(Validator).compile(schema)(validator, document)
+        self.assertEqual(validator.errors, interpreted.errors)
+
+    def test_errors(self):
+        for document in DOCUMENTS:
+            self.assertSameErrors(SCHEMA, document)
+            self.assertSameErrors(SCHEMA, document, update=True)
+            self.assertSameErrors(SCHEMA, document, allow_unknown=True)
+
+    def test_delegated_rules(self):
+        class CustomValidator(Validator):
+            def _validate_type_string(self, field, value):
+                self._error(field, 'custom')
+
+            def _validate_even(self, even, field, value):
+                if value % 2:
+                    self._error(field, 'odd')
+
+        schema = {'a': {'type': 'string'}, 'b': {'type': 'integer',
+                                                 'even': True}}
+        validator = CustomValidator(schema)
+        validator._errors = {}
+        validator.update = False
+        validator.document = {'a': 'x', 'b': 3}
+        SchemaCompiler(CustomValidator).compile(schema)(validator,
+                                                        validator.document)
+        self.assertEqual(validator.errors, {'a': 'custom', 'b': 'odd'})
+
+    def test_cache(self):
+        schema = dict(SCHEMA)
+        validate = compiled_validator(Validator, 'test', schema)
+        self.assertIs(compiled_validator(Validator, 'test', schema), validate)
+        self.assertIsNot(compiled_validator(Validator, 'test', dict(schema)),
+                         validate)
+
+
+class TestCompiledValidation(BaseTest, unittest.TestCase):
+
+    def tearDown(self):
+        LimitedDoc.objects.delete()
+        ComplexDoc.objects.delete()
+
+    def post_errors(self, url, document):
+        response = self.client.post(url, data=json.dumps(document),
+                                    content_type='application/json')
+        return response.status_code, response.get_json()
+
+    def compare(self, resource, document):
+        settings = self.app.config['DOMAIN'][resource]
+        interpreted = self.post_errors('/%s/' % resource, document)
+        settings['compiled_validation'] = True
+        try:
+            compiled = self.post_errors('/%s/' % resource, document)
+        finally:
+            del settings['compiled_validation']
+        self.assertEqual(compiled[0], interpreted[0])
+        if compiled[0] != 201:
+            self.assertEqual(compiled[1], interpreted[1])
+
+    def test_limited_doc(self):
+        self.compare('limiteddoc', {'b': 'x', 'c': 'w', 'd': 'a' * 11,
+                                    'e': 'short', 'f': 12, 'g': 'val4'})
+        self.compare('limiteddoc', {'a': 1, 'f': 'x', 'unknown': 2})
+        self.compare('limiteddoc', {'a': 'x', 'f': 6})
+
+    def test_complex_doc(self):
+        self.compare('complexdoc', {'i': {'a': 1, 'b': 'x'},
+                                    'l': ['a', 2], 'o': [{'a': 'x'}, 5],
+                                    'p': [{'ll': ['a', 1]}]})
+
+    def test_used_for_resource_schema(self):
+        settings = self.app.config['DOMAIN']['limiteddoc']
+        settings['compiled_validation'] = True
+        try:
+            with self.app.app_context():
+                validator = EveMongoengineValidator(settings['schema'],
+                                                    'limiteddoc')
+                self.assertIsNotNone(validator._compiled(None))
+                validator.schema = {'a': {'type': 'string'}}
+                self.assertIsNone(validator._compiled(None))
+        finally:
+            del settings['compiled_validation']
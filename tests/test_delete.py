@@ -6,6 +6,7 @@ from tests import BaseTest, SimpleDoc, ComplexDoc
 
 
 class TestHttpDelete(BaseTest, unittest.TestCase):
+    memory = True
     def setUp(self):
         response = self.client.post('/simpledoc/',
             data='[{"a": "jimmy", "b": 23}, {"a": "steve", "b": 77}]',
@@ -20,7 +21,7 @@ class TestHttpDelete(BaseTest, unittest.TestCase):
         self._id2 = response[config.ITEMS][1][config.ID_FIELD]
 
     def tearDown(self):
-        SimpleDoc.objects().delete()
+        self.delete_all(SimpleDoc)
 
     def delete(self, url):
         return self.client.delete(url, headers=[('If-Match', self.etag)])
@@ -42,7 +43,7 @@ class TestHttpDelete(BaseTest, unittest.TestCase):
         self.assertEqual(len(response.get_json()['_items']), 0)
 
     def test_delete_empty_resource(self):
-        SimpleDoc.objects().delete()
+        self.delete_all(SimpleDoc)
         response = self.delete('/simpledoc')
         self.assertEqual(response.status_code, 204)
 
@@ -57,8 +58,8 @@ class TestHttpDelete(BaseTest, unittest.TestCase):
 
     def test_delete_subresource_item(self):
         # create new resource and subresource
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        d = ComplexDoc(l=['a', 'b'], n=999, r=s).save()
+        s = self.save_doc(SimpleDoc(a="Answer to everything", b=42))
+        d = self.save_doc(ComplexDoc(l=['a', 'b'], n=999, r=s))
 
         response = self.client.get('/simpledoc/%s/complexdoc/%s' % (s.id, d.id))
         etag = response.get_json()[config.ETAG]
@@ -71,13 +72,13 @@ class TestHttpDelete(BaseTest, unittest.TestCase):
         # check, if really deleted
         response = self.client.get('/simpledoc/%s/complexdoc/%s' % (s.id, d.id))
         self.assertEqual(response.status_code, 404)
-        s.delete()
+        self.delete_doc(s)
 
     def test_delete_subresource(self):
         # more subresources -> delete them all
-        s = SimpleDoc(a="James Bond", b=7).save()
-        c1 = ComplexDoc(l=['p', 'q', 'r'], n=1, r=s).save()
-        c2 = ComplexDoc(l=['s', 't', 'u'], n=2, r=s).save()
+        s = self.save_doc(SimpleDoc(a="James Bond", b=7))
+        c1 = self.save_doc(ComplexDoc(l=['p', 'q', 'r'], n=1, r=s))
+        c2 = self.save_doc(ComplexDoc(l=['s', 't', 'u'], n=2, r=s))
 
         # delete subresources
         del_url = '/simpledoc/%s/complexdoc' % s.id
@@ -88,4 +89,4 @@ class TestHttpDelete(BaseTest, unittest.TestCase):
         json_data = response.get_json()
         self.assertEqual(json_data[config.ITEMS], [])
         # cleanup
-        s.delete()
+        self.delete_doc(s)
@@ -0,0 +1,106 @@
+
+import uuid
+import unittest
+from decimal import Decimal
+from datetime import datetime, date
+
+import simplejson
+from bson import ObjectId, DBRef, Binary
+from mongoengine.fields import GridFSProxy
+
+from eve.utils import date_to_str
+
+from tests import BaseTest, FieldsDoc
+from eve_mongoengine.datalayer import MongoengineJsonEncoder, json_backends
+
+
+class OrjsonEncoder(MongoengineJsonEncoder):
+    backend = 'orjson'
+
+
+class TestJsonEncoder(BaseTest, unittest.TestCase):
+    memory = True
+
+    def setUp(self):
+        oid = ObjectId()
+        now = datetime(2015, 3, 14, 15, 9, 26)
+        self.data = {
+            'uuid': uuid.UUID('12345678123456781234567812345678'),
+            'oid': oid,
+            'ref': DBRef('simpledoc', oid),
+            'created': now,
+            'day': date(2015, 3, 14),
+            'price': Decimal('1.5'),
+            'bin': Binary(b'\x00\x01'),
+            'file': GridFSProxy(grid_id=oid),
+            'empty_file': GridFSProxy(),
+            'nested': [{'oid': oid, 'n': 1}],
+        }
+        self.expected = {
+            'uuid': '12345678-1234-5678-1234-567812345678',
+            'oid': str(oid),
+            'ref': {'$ref': 'simpledoc', '$id': str(oid)},
+            'day': '2015-03-14',
+            'price': 1.5,
+            'bin': 'AAE=',
+            'file': str(oid),
+            'empty_file': None,
+            'nested': [{'oid': str(oid), 'n': 1}],
+        }
+
+    def encode(self, cls=MongoengineJsonEncoder):
+        with self.app.app_context():
+            self.expected['created'] = date_to_str(self.data['created'])
+            return simplejson.dumps(self.data, cls=cls, sort_keys=True)
+
+    def test_serializers(self):
+        self.assertEqual(simplejson.loads(self.encode()), self.expected)
+
+    def test_subclass_serializer(self):
+        class MyUUID(uuid.UUID):
+            pass
+        self.data['uuid'] = MyUUID(self.data['uuid'].hex)
+        self.assertEqual(simplejson.loads(self.encode()), self.expected)
+
+    def test_binary(self):
+        # bytes are not UTF-8 strings
+        self.data = {'bin': Binary(b'\xff\x00'), 'raw': b'\xfe',
+                     'nested': [{'bin': Binary(b'\x00\x01')}, 1],
+                     'created': self.data['created']}
+        self.expected = {'bin': '/wA=', 'raw': '/g==',
+                         'nested': [{'bin': 'AAE='}, 1]}
+        self.assertEqual(simplejson.loads(self.encode()), self.expected)
+        # encoded data is not modified
+        self.assertIsInstance(self.data['nested'][0]['bin'], Binary)
+
+    def test_unknown_type(self):
+        self.data['unknown'] = object()
+        self.assertRaises(TypeError, self.encode)
+
+    def test_datalayer_encoder(self):
+        self.assertIs(self.app.data.json_encoder_class, MongoengineJsonEncoder)
+        d = self.save_doc(FieldsDoc(g=uuid.uuid4()))
+        try:
+            response = self.client.get('/fieldsdoc/%s' % d.id)
+            self.assertEqual(response.get_json()['g'], str(d.g))
+        finally:
+            self.delete_doc(d)
+
+    @unittest.skipIf('orjson' not in json_backends, "requires orjson")
+    def test_orjson_backend(self):
+        self.assertEqual(simplejson.loads(self.encode(OrjsonEncoder)),
+                         simplejson.loads(self.encode()))
+
+    @unittest.skipIf('orjson' not in json_backends, "requires orjson")
+    def test_orjson_equal_to_simplejson(self):
+        self.data['raw'] = b'\xfe'
+        self.data['nested'].append({'bin': Binary(b'\xff')})
+        self.assertEqual(simplejson.loads(self.encode(OrjsonEncoder)),
+                         simplejson.loads(self.encode()))
+        self.assertEqual(simplejson.loads(self.encode())['raw'], '/g==')
+
+    @unittest.skipIf('orjson' not in json_backends, "requires orjson")
+    def test_orjson_fallback(self):
+        # integers out of 64-bit range are not supported by orjson
+        self.data['big'] = 2 ** 70
+        self.assertEqual(self.encode(OrjsonEncoder), self.encode())
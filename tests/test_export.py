@@ -0,0 +1,127 @@
+
+import csv
+import json
+import unittest
+
+from tests import BaseTest, SimpleDoc, Inherited, ComplexDoc
+from eve_mongoengine.export import (prepare_export, run_export,
+                                    split_id_ranges, _columns)
+
+
+class TestExport(BaseTest, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        BaseTest.setUpClass()
+        for resource in ('simpledoc', 'inherited'):
+            settings = cls.app.config['DOMAIN'][resource]
+            settings['export'] = True
+            settings['export_workers'] = 0
+            settings['export_range_size'] = 2
+            cls.ext._add_export_url_rule(resource)
+
+    def setUp(self):
+        for i in range(5):
+            SimpleDoc(a='x%d' % i, b=i).save()
+        Inherited(a='y', b=10, c='z', d={'e': [1, 2]}).save()
+
+    def tearDown(self):
+        SimpleDoc.objects.delete()
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True).splitlines()
+
+    def test_split_id_ranges(self):
+        collection = SimpleDoc._get_collection()
+        ranges = split_id_ranges(collection, {}, 2)
+        self.assertEqual(len(ranges), 3)
+        self.assertIsNone(ranges[0][0])
+        self.assertIsNone(ranges[-1][1])
+        self.assertEqual(ranges[0][1], ranges[1][0])
+        ids = [doc['_id'] for doc in collection.find({}, {'_id': 1})]
+        counts = [len([id_ for id_ in ids
+                       if (lower is None or id_ >= lower) and
+                       (upper is None or id_ < upper)])
+                  for lower, upper in ranges]
+        self.assertEqual(sum(counts), len(ids))
+        self.assertEqual(split_id_ranges(collection, {'b': -1}, 2),
+                         [(None, None)])
+        self.assertEqual(split_id_ranges(collection, {}, 10), [(None, None)])
+
+    def test_columns_slice(self):
+        columns = _columns(ComplexDoc, {'l': {'$slice': 2}})
+        self.assertIn('l', columns)
+        self.assertIn('i', columns)
+        self.assertEqual(_columns(ComplexDoc, {'i': 1, 'l': {'$slice': 2}}),
+                         ['_id', 'i'])
+
+    def test_ndjson(self):
+        response = self.client.get('/simpledoc/export')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        docs = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual(sorted(doc['b'] for doc in docs),
+                         [0, 1, 2, 3, 4, 10])
+        doc = [doc for doc in docs if doc['b'] == 0][0]
+        self.assertEqual(doc['a'], 'x0')
+        self.assertIn('_updated', doc)
+        self.assertIsInstance(doc['_id'], type(u''))
+
+    def test_csv_projection(self):
+        response = self.client.get('/simpledoc/export?format=csv'
+                                   '&projection={"a": 1}')
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.reader(self.lines(response)))
+        self.assertEqual(rows[0][0], '_id')
+        self.assertIn('a', rows[0])
+        self.assertNotIn('b', rows[0])
+        self.assertEqual(len(rows), 7)
+        column = rows[0].index('a')
+        self.assertIn('x3', [row[column] for row in rows])
+
+    def test_datasource_filter(self):
+        response = self.client.get('/inherited/export?format=csv')
+        rows = list(csv.reader(self.lines(response)))
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['C'], 'z')
+        self.assertEqual(json.loads(row['d']), {'e': [1, 2]})
+
+    def test_unknown_format(self):
+        response = self.client.get('/simpledoc/export?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+    def test_worker_processes(self):
+        with self.app.app_context():
+            job = prepare_export('simpledoc', range_size=2, batch_size=1)
+        single = sorted(''.join(run_export(job, workers=0)).splitlines())
+        parallel = sorted(''.join(run_export(job, workers=2)).splitlines())
+        self.assertEqual(len(single), 6)
+        self.assertEqual(single, parallel)
+
+    def test_clean_nested_documents(self):
+        settings = self.app.config['DOMAIN']['complexdoc']
+        d = ComplexDoc(d={'x': [], 'y': 1}, l=[]).save()
+        try:
+            settings['clean_nested_documents'] = True
+            with self.app.app_context():
+                job = prepare_export('complexdoc')
+            docs = [json.loads(line) for line in
+                    ''.join(run_export(job, workers=0)).splitlines()]
+            self.assertEqual(docs[0]['d'], {'y': 1})
+            self.assertNotIn('l', docs[0])
+        finally:
+            del settings['clean_nested_documents']
+            d.delete()
+
+    def test_connection_settings(self):
+        with self.app.app_context():
+            job = prepare_export('simpledoc')
+        self.assertEqual(job['connection']['name'],
+                         self.app.config['MONGO_DBNAME'])
+        self.assertEqual(job['connection']['host'],
+                         self.app.config['MONGO_HOST'])
+
+    def test_disabled(self):
+        response = self.client.get('/limiteddoc/export')
+        self.assertEqual(response.status_code, 404)
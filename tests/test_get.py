@@ -3,14 +3,22 @@ import uuid
 import unittest
 from operator import attrgetter
 from eve_mongoengine import EveMongoengine
+from eve_mongoengine.datalayer import (clean_doc, slice_list,
+                                      PymongoQuerySet)
+from bson import ObjectId
+from pymongo.errors import ExecutionTimeout
+from werkzeug.exceptions import ServiceUnavailable
+from eve_mongoengine.schema import SchemaMapper
 from tests import (BaseTest, Eve, SimpleDoc, ComplexDoc, Inner, LimitedDoc,
-                   WrongDoc, NonStructuredDoc, Inherited, SETTINGS)
+                   WrongDoc, NonStructuredDoc, Inherited, FieldsDoc,
+                   SETTINGS, mongodb_only)
 from eve.utils import config
 
 class TestHttpGet(BaseTest, unittest.TestCase):
+    memory = True
 
     def test_find_one(self):
-        d = SimpleDoc(a='Tom', b=223).save()
+        d = self.save_doc(SimpleDoc(a='Tom', b=223))
         response = self.client.get('/simpledoc/%s' % d.id)
         # has to return one record
         json_data = response.get_json()
@@ -19,10 +27,10 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         self.assertEqual(json_data['_id'], str(d.id))
         self.assertEqual(json_data['a'], 'Tom')
         self.assertEqual(json_data['b'], 223)
-        d.delete()
+        self.delete_doc(d)
 
     def test_find_one_projection(self):
-        d = SimpleDoc(a='Tom', b=223).save()
+        d = self.save_doc(SimpleDoc(a='Tom', b=223))
         response = self.client.get('/simpledoc/%s?projection={"a":1}' % d.id)
         # has to return one record
         json_data = response.get_json()
@@ -38,20 +46,21 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         self.assertIn('b', json_data)
         self.assertNotIn('a', json_data)
         self.assertEqual(json_data['_id'], str(d.id))
-        d.delete()
+        self.delete_doc(d)
 
     def test_find_one_nonexisting(self):
         response = self.client.get('/simpledoc/abcdef')
         self.assertEqual(response.status_code, 404)
         
     def test_projection_on_non_structured_doc(self):
-        d = NonStructuredDoc(new_york="great").save()
+        d = self.save_doc(NonStructuredDoc(new_york="great"))
         response = self.client.get('/nonstructureddoc/%s' % str(d.id))
         self.assertEqual(response.status_code, 200)
         json_data = response.get_json()
         self.assertIn('NewYork', json_data)
         self.assertEqual(json_data['NewYork'], 'great')
 
+    @mongodb_only
     def test_datasource_projection(self):
         SETTINGS['DOMAIN'] = {'eve-mongoengine':{}}
         app = Eve(settings=SETTINGS)
@@ -74,7 +83,7 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         for data in ({'a': "Hello", 'b':1},
                      {'a': "Hi", 'b': 2},
                      {'a': "Seeya", 'b': 3}):
-            d = SimpleDoc(**data).save()
+            d = self.save_doc(SimpleDoc(**data))
             _all.append(d)
         response = self.client.get('/simpledoc')
         self.assertEqual(response.status_code, 200)
@@ -83,10 +92,10 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         self.assertSetEqual(set(['Hello', 'Hi', 'Seeya']), s)
         # delete records
         for d in _all:
-            d.delete()
+            self.delete_doc(d)
 
     def test_find_all_projection(self):
-        d = SimpleDoc(a='Tom', b=223).save()
+        d = self.save_doc(SimpleDoc(a='Tom', b=223))
         response = self.client.get('/simpledoc?projection={"a": 1}')
         self.assertNotIn('b', response.get_json()['_items'][0])
         response = self.client.get('/simpledoc?projection={"a": 1, "b": 1}')
@@ -97,14 +106,201 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         data = response.get_json()['_items'][0]
         self.assertIn('b', data)
         self.assertNotIn('a', data)
-        d.delete()
+        self.delete_doc(d)
 
     def test_find_all_pagination(self):
         self.skipTest("Not implemented yet.")
 
+    def test_find_all_concurrent_count(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['concurrent_count'] = True
+        docs = [self.save_doc(SimpleDoc(a='x', b=i)) for i in range(3)]
+        try:
+            response = self.client.get('/simpledoc?max_results=2&page=2'
+                                       '&where={"b": {"$gt": 0}}')
+            json_data = response.get_json()
+            self.assertEqual(len(json_data['_items']), 0)
+            self.assertEqual(json_data[config.META]['total'], 2)
+            response = self.client.get('/simpledoc?max_results=2')
+            json_data = response.get_json()
+            self.assertEqual(len(json_data['_items']), 2)
+            self.assertEqual(json_data[config.META]['total'], 3)
+        finally:
+            del settings['concurrent_count']
+            for d in docs:
+                self.delete_doc(d)
+
+    @mongodb_only
+    def test_max_time_ms(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['max_time_ms'] = 100
+        limits = []
+        original = self.app.data._max_time_ms
+
+        def max_time_ms(qry, max_time_ms):
+            limits.append(max_time_ms)
+            return original(qry, max_time_ms)
+        self.app.data._max_time_ms = max_time_ms
+        try:
+            response = self.client.get('/simpledoc/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(limits, [100])
+            # concurrent count runs on a clone of the query
+            del limits[:]
+            settings['concurrent_count'] = True
+            response = self.client.get('/simpledoc/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(limits, [100, 100])
+        finally:
+            del self.app.data._max_time_ms
+            settings.pop('concurrent_count', None)
+            del settings['max_time_ms']
+
+    def test_max_time_ms_exceeded(self):
+        class TimeoutQuerySet(object):
+            def __iter__(self):
+                raise ExecutionTimeout('operation exceeded time limit')
+
+            def count(self, with_limit_and_skip=False):
+                raise ExecutionTimeout('operation exceeded time limit')
+        cursor = PymongoQuerySet(TimeoutQuerySet())
+        self.assertRaises(ServiceUnavailable, list, cursor)
+        self.assertRaises(ServiceUnavailable, cursor.count)
+
+    def test_query_operators_denylist(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['query_operators_denylist'] = ['$nin']
+        try:
+            response = self.client.get('/simpledoc?where={"b": {"$nin": [1]}}')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?where={"b": {"$in": [1]}}')
+            self.assertEqual(response.status_code, 200)
+        finally:
+            del settings['query_operators_denylist']
+
+    def test_query_operators_allowlist(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['query_operators_allowlist'] = ['$in']
+        try:
+            response = self.client.get('/simpledoc?where={"b": {"$gt": 1}}')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?where={"b": {"$in": [1]}}')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/simpledoc?where={"b": 1}')
+            self.assertEqual(response.status_code, 200)
+        finally:
+            del settings['query_operators_allowlist']
+
+    def test_deny_unindexed_filters(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['deny_unindexed_filters'] = True
+        d = self.save_doc(SimpleDoc(a='x', b=1))
+        try:
+            response = self.client.get('/simpledoc?where={"a": "x"}')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?where={"$or": '
+                                       '[{"_id": "%s"}, {"a": "x"}]}' % d.id)
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?where={"_id": "%s", '
+                                       '"a": "x"}' % d.id)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/simpledoc')
+            self.assertEqual(response.status_code, 200)
+            # sorts
+            response = self.client.get('/simpledoc?sort=[("a", 1)]')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?sort=[("_id", -1), '
+                                       '("a", 1)]')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/simpledoc?where={"_id": "%s"}'
+                                       '&sort=[("a", 1)]' % d.id)
+            self.assertEqual(response.status_code, 200)
+            settings['unindexed_filters_allowlist'] = ['a']
+            response = self.client.get('/simpledoc?where={"a": "x"}')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/simpledoc?sort=[("a", 1)]')
+            self.assertEqual(response.status_code, 200)
+        finally:
+            del settings['deny_unindexed_filters']
+            settings.pop('unindexed_filters_allowlist', None)
+            self.delete_doc(d)
+
+    def test_find_list_of_ids(self):
+        docs = [self.save_doc(SimpleDoc(a='x%d' % i, b=i)) for i in range(3)]
+        missing = str(ObjectId())
+        try:
+            url = '/simpledoc?ids=%s,%s,%s' % (docs[2].id, missing, docs[0].id)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            json_data = response.get_json()
+            items = json_data[config.ITEMS]
+            self.assertEqual([item['a'] for item in items], ['x2', 'x0'])
+            self.assertEqual(json_data['_missing'], [missing])
+            # same representation as item endpoint
+            item = self.client.get('/simpledoc/%s' % docs[2].id).get_json()
+            self.assertEqual(items[0][config.ETAG], item[config.ETAG])
+            # projection
+            response = self.client.get('/simpledoc?ids=%s&projection='
+                                       '{"a": 1}' % docs[1].id)
+            self.assertNotIn('b', response.get_json()[config.ITEMS][0])
+        finally:
+            for d in docs:
+                self.delete_doc(d)
+
+    def test_find_list_of_ids_contract(self):
+        # Eve's data layer method keeps its signature and semantics
+        docs = [self.save_doc(SimpleDoc(a='x%d' % i, b=i)) for i in range(2)]
+        try:
+            with self.app.test_request_context():
+                found = list(self.app.data.find_list_of_ids(
+                    'simpledoc', [docs[1].id, ObjectId(), docs[0].id],
+                    {'a': 1}))
+            self.assertEqual([d['a'] for d in found], ['x1', 'x0'])
+            self.assertNotIn('b', found[0])
+        finally:
+            for d in docs:
+                self.delete_doc(d)
+
+    def test_find_list_of_ids_limits(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['multiget_max_ids'] = 1
+        try:
+            response = self.client.get('/simpledoc?ids=%s,%s'
+                                       % (ObjectId(), ObjectId()))
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get('/simpledoc?ids=')
+            self.assertEqual(response.status_code, 400)
+            # ids are counted before removing repeated ones
+            id_ = ObjectId()
+            response = self.client.get('/simpledoc?ids=%s,%s' % (id_, id_))
+            self.assertEqual(response.status_code, 400)
+            settings['multiget_max_ids'] = 2
+            response = self.client.get('/simpledoc?ids=%s,%s' % (id_, id_))
+            self.assertEqual(response.get_json()['_missing'], [str(id_)])
+        finally:
+            del settings['multiget_max_ids']
+
+    def test_clean_nested_documents(self):
+        settings = self.app.config['DOMAIN']['complexdoc']
+        d = self.save_doc(ComplexDoc(d={'x': [], 'y': 1}, l=[], i=Inner()))
+        try:
+            item = self.client.get('/complexdoc/%s' % d.id).get_json()
+            self.assertEqual(item['d'], {'x': [], 'y': 1})
+            self.assertNotIn('l', item)
+            settings['clean_nested_documents'] = True
+            item = self.client.get('/complexdoc/%s' % d.id).get_json()
+            feed = self.client.get('/complexdoc/').get_json()
+            self.assertEqual(item['d'], {'y': 1})
+            self.assertEqual(feed[config.ITEMS][0]['d'], {'y': 1})
+            self.assertEqual(feed[config.ITEMS][0][config.ETAG],
+                             item[config.ETAG])
+        finally:
+            del settings['clean_nested_documents']
+            self.delete_doc(d)
+
     def test_find_all_sorting(self):
-        d = SimpleDoc(a='abz', b=3).save()
-        d2 = SimpleDoc(a='abc', b=-7).save()
+        d = self.save_doc(SimpleDoc(a='abz', b=3))
+        d2 = self.save_doc(SimpleDoc(a='abc', b=-7))
         response = self.client.get('/simpledoc?sort={"a":1}')
         json_data = response.get_json()
         real = [x['a'] for x in json_data['_items']]
@@ -113,8 +309,8 @@ class TestHttpGet(BaseTest, unittest.TestCase):
             self.assertListEqual(real, expected)
         except Exception as e:
             # reset
-            d.delete()
-            d2.delete()
+            self.delete_doc(d)
+            self.delete_doc(d2)
             raise
 
         response = self.client.get('/simpledoc?sort={"b":-1}')
@@ -124,13 +320,13 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         try:
             self.assertListEqual(real, expected)
         finally:
-            d.delete()
-            d2.delete()
+            self.delete_doc(d)
+            self.delete_doc(d2)
 
     def test_find_all_default_sort(self):
         s = self.app.config['DOMAIN']['simpledoc']['datasource']
-        d = SimpleDoc(a='abz', b=3).save()
-        d2 = SimpleDoc(a='abc', b=-7).save()
+        d = self.save_doc(SimpleDoc(a='abz', b=3))
+        d2 = self.save_doc(SimpleDoc(a='abc', b=-7))
 
         # set default sort to 'b', desc.
         if 'default_sort' in s:
@@ -148,8 +344,8 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         except Exception as e:
             # reset
             s['default_sort'] = default
-            d.delete()
-            d2.delete()
+            self.delete_doc(d)
+            self.delete_doc(d2)
             raise
 
         # set default sort to 'b', asc.
@@ -164,35 +360,35 @@ class TestHttpGet(BaseTest, unittest.TestCase):
         finally:
             # reset
             s['default_sort'] = default
-            d.delete()
-            d2.delete()
+            self.delete_doc(d)
+            self.delete_doc(d2)
 
     def test_find_all_filtering(self):
-        d = SimpleDoc(a='x', b=987).save()
-        d2 = SimpleDoc(a='y', b=123).save()
+        d = self.save_doc(SimpleDoc(a='x', b=987))
+        d2 = self.save_doc(SimpleDoc(a='y', b=123))
         response = self.client.get('/simpledoc?where={"a": "y"}')
         json_data = response.get_json()
         try:
             self.assertEqual(len(json_data['_items']), 1)
             self.assertEqual(json_data['_items'][0]['b'], 123)
         finally:
-            d.delete()
-            d2.delete()
+            self.delete_doc(d)
+            self.delete_doc(d2)
 
     def test_etag_in_item_and_resource(self):
         # etag of some entity has to be the same when fetching one item compared
         # to etag of part of feed (resource)
-        d = ComplexDoc().save()
+        d = self.save_doc(ComplexDoc())
         feed = self.client.get('/complexdoc/').get_json()
         item = self.client.get('/complexdoc/%s' % d.id).get_json()
         try:
             self.assertEqual(feed[config.ITEMS][0][config.ETAG], item[config.ETAG])
         finally:
-            d.delete()
+            self.delete_doc(d)
 
     def test_embedded_resource_serialization(self):
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        d = ComplexDoc(r=s).save()
+        s = self.save_doc(SimpleDoc(a="Answer to everything", b=42))
+        d = self.save_doc(ComplexDoc(r=s))
         response = self.client.get('/complexdoc?embedded={"r":1}')
         json_data = response.get_json()
         expected = {'a': "Answer to everything", 'b': 42}
@@ -203,9 +399,10 @@ class TestHttpGet(BaseTest, unittest.TestCase):
             self.assertIn(config.DATE_CREATED, emb)
             self.assertIn(config.LAST_UPDATED, emb)
         finally:
-            d.delete()
-            s.delete()
+            self.delete_doc(d)
+            self.delete_doc(s)
 
+    @mongodb_only
     def test_uppercase_resource_names(self):
         # Sanity Check: the Default Setting is Uppercase Off
         response = self.client.get('/SimpleDoc')
@@ -237,9 +434,9 @@ class TestHttpGet(BaseTest, unittest.TestCase):
 
 
     def test_get_subresource(self):
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        d = ComplexDoc(l=['a', 'b'], r=s).save()
-        d2 = ComplexDoc(l=['c', 'd'], r=s).save()
+        s = self.save_doc(SimpleDoc(a="Answer to everything", b=42))
+        d = self.save_doc(ComplexDoc(l=['a', 'b'], r=s))
+        d2 = self.save_doc(ComplexDoc(l=['c', 'd'], r=s))
         response = self.client.get('/simpledoc/%s/complexdoc' % s.id)
         self.assertEqual(response.status_code, 200)
         json_data = response.get_json()
@@ -250,10 +447,122 @@ class TestHttpGet(BaseTest, unittest.TestCase):
 
     def test_inherited(self):
         # tests if inherited documents behave the same way
-        i = Inherited(a='Answer', b=42, c='BarBaz').save()
+        i = self.save_doc(Inherited(a='Answer', b=42, c='BarBaz'))
         response = self.client.get('/inherited/%s/' % i.id)
         self.assertIn('C', response.get_json())
         self.assertEqual(response.status_code, 200)
         # cannot throw mongoengine.LookUpError!
         response = self.client.get('/inherited/')
         self.assertEqual(response.status_code, 200)
+
+
+class TestCleanDoc(unittest.TestCase):
+
+    def test_clean_doc(self):
+        doc = {'a': [], 'b': {}, 'c': 0, 'd': '', 'e': {'f': []},
+               '_etag': 'abc'}
+        self.assertIs(clean_doc(doc), doc)
+        self.assertEqual(doc, {'c': 0, 'd': '', 'e': {'f': []}})
+
+    def test_clean_doc_recursive(self):
+        doc = {'a': {'b': {'c': []}}, 'd': [{'e': {}, 'f': 1}, {'g': []}],
+               'h': {'i': 1, 'j': {}}}
+        clean_doc(doc, recursive=True)
+        self.assertEqual(doc, {'d': [{'f': 1}, {}], 'h': {'i': 1}})
+
+
+class TestListProfile(BaseTest, unittest.TestCase):
+    memory = True
+
+    def setUp(self):
+        self.settings = self.app.config['DOMAIN']['complexdoc']
+        self.doc = ComplexDoc(l=['a'], o=[Inner(a='x')], i=Inner(a='y'))
+        self.save_doc(self.doc)
+
+    def tearDown(self):
+        self.settings.pop('list_profile', None)
+        self.delete_all(ComplexDoc)
+
+    def test_suggest(self):
+        self.assertEqual(SchemaMapper.suggest_list_profile(ComplexDoc),
+                         ['o', 'p'])
+        self.assertEqual(SchemaMapper.suggest_list_profile(FieldsDoc),
+                         ['i', 'p'])
+        self.assertEqual(SchemaMapper.suggest_list_profile(SimpleDoc), [])
+
+    def test_find(self):
+        self.settings['list_profile'] = 'auto'
+        item = self.client.get('/complexdoc/').get_json()[config.ITEMS][0]
+        self.assertNotIn('o', item)
+        self.assertEqual((item['l'], item['i']), (['a'], {'a': 'y'}))
+        self.assertIn(config.ETAG, item)
+        # find_one returns whole document
+        item = self.client.get('/complexdoc/%s' % self.doc.id).get_json()
+        self.assertEqual(item['o'], [{'a': 'x'}])
+        # client projection takes precedence
+        url = '/complexdoc/?projection={"o": 1}'
+        item = self.client.get(url).get_json()[config.ITEMS][0]
+        self.assertEqual(item['o'], [{'a': 'x'}])
+        self.assertNotIn('l', item)
+        self.settings['list_profile'] = ['l', 'i']
+        item = self.client.get('/complexdoc/').get_json()[config.ITEMS][0]
+        self.assertNotIn('l', item)
+        self.assertNotIn('i', item)
+        self.assertIn('o', item)
+
+
+class TestSlice(BaseTest, unittest.TestCase):
+    memory = True
+
+    def setUp(self):
+        self.settings = self.app.config['DOMAIN']['complexdoc']
+        self.doc = ComplexDoc(l=['item %d' % n for n in range(10)],
+                              o=[Inner(a=str(n)) for n in range(3)],
+                              i=Inner(a='y'))
+        self.save_doc(self.doc)
+
+    def tearDown(self):
+        self.settings.pop('document_cache', None)
+        self.app.data.document_cache.clear('complexdoc')
+        self.delete_all(ComplexDoc)
+
+    def get(self, query):
+        url = '/complexdoc/%s?%s' % (self.doc.id, query)
+        return self.client.get(url)
+
+    def test_slice_list(self):
+        values = list(range(10))
+        self.assertEqual(slice_list(values, 3), [0, 1, 2])
+        self.assertEqual(slice_list(values, -2), [8, 9])
+        self.assertEqual(slice_list(values, [2, 3]), [2, 3, 4])
+        self.assertEqual(slice_list(values, [-4, 2]), [6, 7])
+        self.assertEqual(slice_list(values, [-20, 2]), [0, 1])
+        self.assertEqual(slice_list(values, [12, 2]), [])
+
+    def test_find_one(self):
+        for cached in (False, True):
+            self.settings['document_cache'] = cached
+            item = self.get('slice={"l": [2, 3], "o": -1}').get_json()
+            self.assertEqual(item['l'], ['item 2', 'item 3', 'item 4'])
+            self.assertEqual(item['o'], [{'a': '2'}])
+            self.assertEqual(item['i'], {'a': 'y'})
+            # slice past the end of the list
+            item = self.get('slice={"l": [20, 3]}').get_json()
+            self.assertNotIn('l', item)
+            # fields left out by projection are not sliced
+            item = self.get('slice={"l": 2, "o": 2}&projection={"o": 0}')\
+                .get_json()
+            self.assertEqual(item['l'], ['item 0', 'item 1'])
+            self.assertNotIn('o', item)
+            item = self.get('slice={"l": 2}&projection={"o": 1}').get_json()
+            self.assertNotIn('l', item)
+            self.assertEqual(len(item['o']), 3)
+        # cached document stays whole
+        item = self.get('').get_json()
+        self.assertEqual(len(item['l']), 10)
+
+    def test_invalid(self):
+        for query in ('slice=[1]', 'slice={"l": "a"}', 'slice={"i": 1}',
+                      'slice={"x": 1}', 'slice={"l": [1, 0]}',
+                      'slice={"l": [1, 2, 3]}', 'slice={"l": true}'):
+            self.assertEqual(self.get(query).status_code, 400, query)
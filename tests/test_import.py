@@ -0,0 +1,101 @@
+
+import json
+import unittest
+
+from eve.utils import config
+
+from tests import BaseTest, LimitedDoc
+from eve_mongoengine.bulkimport import BulkImport
+
+
+class OwnerAuth(object):
+    def authorized(self, allowed_roles, resource, method):
+        return True
+
+    def get_request_auth_value(self):
+        return 'owner'
+
+
+class TestBulkImport(BaseTest, unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        BaseTest.setUpClass()
+        settings = cls.app.config['DOMAIN']['limiteddoc']
+        settings['bulk_import'] = True
+        settings['bulk_import_workers'] = 0
+        settings['bulk_import_batch_size'] = 2
+        cls.ext._add_import_url_rule('limiteddoc')
+
+    def tearDown(self):
+        LimitedDoc.objects.delete()
+
+    def post_import(self, lines):
+        response = self.client.post('/limiteddoc/import',
+                                    data='\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_data(as_text=True)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_import(self):
+        report = self.post_import([
+            '{"a": "x", "b": "1", "f": 6}',
+            '',
+            '{"a": "y", "c": "w"}',
+            '{"b": "2"}',
+            'not json',
+            '{"a": "z", "g": "val2"}',
+        ])
+        self.assertEqual([entry['line'] for entry in report[:-1]], [3, 4, 5])
+        self.assertIn('c', report[0][config.ISSUES])
+        self.assertIn('a', report[1][config.ISSUES])
+        self.assertIn('exception', report[2][config.ISSUES])
+        self.assertEqual(report[-1], {config.STATUS: config.STATUS_ERR,
+                                      'lines': 5, 'inserted': 2,
+                                      'failed': 3})
+        doc = LimitedDoc.objects.get(a='x')
+        self.assertEqual(doc.f, 6)
+        self.assertIsNotNone(doc.created)
+        self.assertEqual(LimitedDoc.objects.get(a='z').g, 'val2')
+
+    def test_duplicate_keys(self):
+        report = self.post_import(['{"a": "x", "b": "1"}',
+                                   '{"a": "y", "b": "1"}'])
+        self.assertEqual(report[0]['line'], 2)
+        self.assertIn('database', report[0][config.ISSUES])
+        self.assertEqual(report[-1]['inserted'], 1)
+        self.assertEqual(LimitedDoc.objects.count(), 1)
+
+    def test_ok(self):
+        report = self.post_import(['{"a": "x"}', '{"a": "y"}', '{"a": "z"}'])
+        self.assertEqual(report, [{config.STATUS: config.STATUS_OK,
+                                   'lines': 3, 'inserted': 3, 'failed': 0}])
+
+    def test_auth_field(self):
+        settings = self.app.config['DOMAIN']['limiteddoc']
+        auth, auth_field = settings['authentication'], settings['auth_field']
+        settings['authentication'] = OwnerAuth()
+        settings['auth_field'] = 'd'
+        try:
+            report = self.post_import(['{"a": "x"}', '{"a": "y", "d": "z"}'])
+        finally:
+            settings['authentication'] = auth
+            settings['auth_field'] = auth_field
+        self.assertEqual(report[-1]['inserted'], 2)
+        self.assertEqual(sorted(doc.d for doc in LimitedDoc.objects),
+                         ['owner', 'owner'])
+
+    def test_worker_processes(self):
+        lines = ['{"a": "%d"}' % i for i in range(10)] + ['{"f": 1}']
+        importer = BulkImport('limiteddoc', workers=2, batch_size=3)
+        with self.app.app_context():
+            report = list(importer.run(lines))
+        self.assertEqual([entry['line'] for entry in report], [11])
+        self.assertEqual(importer.inserted, 10)
+        self.assertEqual(LimitedDoc.objects.count(), 10)
+
+    def test_disabled(self):
+        response = self.client.post('/simpledoc/import', data='{"a": "x"}',
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,70 @@
+
+import unittest
+
+from mongoengine import Document, StringField, IntField
+
+from eve_mongoengine import EveMongoengine
+
+from tests import Eve, SETTINGS
+
+
+class IndexedDoc(Document):
+    a = StringField()
+    b = IntField(db_field='B')
+    meta = {'ordering': ['-b']}
+
+
+class TestDateIndexes(unittest.TestCase):
+
+    def create_ext(self, **settings):
+        app = Eve(settings=SETTINGS)
+        app.debug = True
+        ext = EveMongoengine(app)
+        ext.add_model(IndexedDoc, **settings)
+        return ext
+
+    def index_keys(self):
+        info = IndexedDoc._get_collection().index_information()
+        return [[tuple(k) for k in i['key']] for i in info.values()]
+
+    def tearDown(self):
+        IndexedDoc.drop_collection()
+        IndexedDoc._meta['index_specs'] = []
+
+    def test_disabled_by_default(self):
+        ext = self.create_ext()
+        self.assertEqual(ext.date_index_report, {})
+        self.assertNotIn([('_updated', 1)], self.index_keys())
+
+    def test_dry_run(self):
+        ext = self.create_ext(date_indexes='dry_run')
+        expected = [[('_updated', 1)], [('_created', 1)],
+                    [('B', -1), ('_updated', 1)]]
+        self.assertEqual(ext.date_index_report['indexeddoc'], expected)
+        for key in expected:
+            self.assertNotIn(key, self.index_keys())
+        self.assertEqual(IndexedDoc._meta['index_specs'], [])
+
+    def test_create(self):
+        ext = self.create_ext(date_indexes=True)
+        keys = self.index_keys()
+        self.assertIn([('_updated', 1)], keys)
+        self.assertIn([('_created', 1)], keys)
+        self.assertIn([('B', -1), ('_updated', 1)], keys)
+        self.assertEqual(len(IndexedDoc._meta['index_specs']), 3)
+        # nothing left to create
+        self.assertEqual(ext.ensure_date_indexes('indexeddoc'), [])
+        self.assertEqual(len(IndexedDoc._meta['index_specs']), 3)
+
+    def test_default_sort(self):
+        ext = self.create_ext(date_indexes='dry_run',
+                              datasource={'default_sort': [('a', 1)]})
+        self.assertIn([('a', 1), ('_updated', 1)],
+                      ext.date_index_report['indexeddoc'])
+
+    def test_existing_prefix(self):
+        IndexedDoc._get_collection().create_index([('_created', 1),
+                                                   ('a', 1)])
+        ext = self.create_ext(date_indexes='dry_run')
+        self.assertNotIn([('_created', 1)],
+                         ext.date_index_report['indexeddoc'])
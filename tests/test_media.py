@@ -0,0 +1,114 @@
+
+import unittest
+from io import BytesIO
+
+from eve.utils import config
+
+from tests import BaseTest, FieldsDoc
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class TestMedia(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        self.content = b'0123456789' * 100
+        self.doc = FieldsDoc()
+        self.doc.p.put(self.content, content_type='text/plain')
+        self.doc.save()
+        self.url = '/fieldsdoc/%s/p' % self.doc.id
+
+    def tearDown(self):
+        for doc in FieldsDoc.objects:
+            doc.p.delete()
+        FieldsDoc.objects.delete()
+
+    def test_get_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertEqual(response.get_data(), self.content)
+        self.assertEqual(response.content_length, len(self.content))
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertIsNotNone(response.headers.get('ETag'))
+
+    def test_get_file_missing(self):
+        doc = FieldsDoc().save()
+        response = self.client.get('/fieldsdoc/%s/p' % doc.id)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/fieldsdoc/%s/a' % self.doc.id)
+        self.assertEqual(response.status_code, 404)
+
+    def test_range(self):
+        response = self.client.get(self.url, headers=[('Range', 'bytes=5-14')])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), self.content[5:15])
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes 5-14/%d' % len(self.content))
+        response = self.client.get(self.url, headers=[('Range', 'bytes=-3')])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), self.content[-3:])
+
+    def test_range_not_satisfiable(self):
+        response = self.client.get(self.url,
+                                   headers=[('Range', 'bytes=5000-6000')])
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'],
+                         'bytes */%d' % len(self.content))
+
+    def test_if_range(self):
+        etag = self.client.get(self.url).headers['ETag']
+        response = self.client.get(self.url, headers=[('Range', 'bytes=0-1'),
+                                                      ('If-Range', etag)])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), self.content[:2])
+        # representation changed -> full content
+        response = self.client.get(self.url, headers=[('Range', 'bytes=0-1'),
+                                                      ('If-Range', '"abc"')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.content)
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url).headers['ETag']
+        response = self.client.get(self.url, headers=[('If-None-Match', etag)])
+        self.assertEqual(response.status_code, 304)
+
+    def test_upload_stored_once(self):
+        files = FieldsDoc._get_db()['fs.files']
+        before = files.count()
+        response = self.client.post('/fieldsdoc/', data={
+            'p': (BytesIO(b'uploaded'), 'test.txt')
+        })
+        self.assertEqual(response.get_json()[config.STATUS], 'OK')
+        # validation must not store the file into GridFS
+        self.assertEqual(files.count(), before + 1)
+        _id = response.get_json()[config.ID_FIELD]
+        response = self.client.get('/fieldsdoc/%s/p' % _id)
+        self.assertEqual(response.get_data(), b'uploaded')
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_streaming_memory(self):
+        size = 32 * 1024 * 1024
+        content = b'x' * size
+        doc = FieldsDoc()
+        doc.p.put(content, content_type='application/octet-stream')
+        doc.save()
+        del content
+
+        tracemalloc.start()
+        try:
+            response = self.client.get('/fieldsdoc/%s/p' % doc.id,
+                                       buffered=False)
+            received = 0
+            for chunk in response.response:
+                received += len(chunk)
+            response.close()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(received, size)
+        # only few chunks may be held in memory at once
+        self.assertLess(peak, 4 * 1024 * 1024)
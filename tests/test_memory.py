@@ -0,0 +1,153 @@
+
+import json
+import unittest
+
+from eve import Eve
+from eve.utils import config, parse_request
+
+from eve_mongoengine import EveMongoengine
+from eve_mongoengine.memory import (InMemoryDataLayer, NullDataLayer, match,
+                                    sort_documents)
+from tests import SETTINGS, SimpleDoc, ComplexDoc, LimitedDoc, Inherited
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_operators(self):
+        doc = {'a': 'jimmy', 'b': 23, 'l': ['x', 'y'],
+               'o': [{'a': 'p', 'b': 1}, {'a': 'q', 'b': 5}]}
+        self.assertTrue(match(doc, {'b': {'$gt': 20, '$lte': 23}}))
+        self.assertFalse(match(doc, {'b': {'$gt': 'a'}}))
+        self.assertTrue(match(doc, {'l': 'x', 'o.a': 'q'}))
+        self.assertTrue(match(doc, {'missing': None, 'a': {'$ne': 'x'}}))
+        self.assertTrue(match(doc, {'$or': [{'a': 'x'}, {'b': 23}]}))
+        self.assertTrue(match(doc, {'a': {'$regex': '^JIM',
+                                          '$options': 'i'}}))
+        self.assertFalse(match(doc, {'o': {'$elemMatch': {'a': 'p',
+                                                          'b': 5}}}))
+        self.assertTrue(match(doc, {'l': {'$all': ['x', 'y'], '$size': 2}}))
+
+    def test_sort(self):
+        docs = [{'a': 3}, {'a': 's'}, {}, {'a': 1, 'b': 1}, {'a': 1, 'b': 2}]
+        sort_documents(docs, [('a', 1), ('b', -1)])
+        self.assertEqual(docs, [{}, {'a': 1, 'b': 2}, {'a': 1, 'b': 1},
+                                {'a': 3}, {'a': 's'}])
+
+
+class TestInMemoryDataLayer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        settings = dict(SETTINGS, DOMAIN={'eve-mongoengine': {}})
+        app = Eve(settings=settings, data=NullDataLayer)
+        app.debug = True
+        ext = EveMongoengine()
+        ext.datalayer_class = InMemoryDataLayer
+        ext.init_app(app)
+        ext.add_model([SimpleDoc, ComplexDoc, LimitedDoc, Inherited])
+        cls.app = app
+        cls.client = app.test_client()
+
+    def tearDown(self):
+        self.app.data.drop()
+
+    def post(self, url, data):
+        response = self.client.post(url, data=json.dumps(data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.get_data())
+        return response.get_json()
+
+    def get_items(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.get_data())
+        return response.get_json()
+
+    def test_post_and_get(self):
+        post = self.post('/simpledoc/', {'a': 'jimmy', 'b': 23})
+        url = '/simpledoc/%s' % post[config.ID_FIELD]
+        data = self.client.get(url).get_json()
+        self.assertEqual((data['a'], data['b']), ('jimmy', 23))
+        self.assertEqual(data[config.ETAG], post[config.ETAG])
+        self.assertIn(config.LAST_UPDATED, data)
+        self.assertEqual(self.client.get('/simpledoc/%s' % ('0' * 24))
+                         .status_code, 404)
+
+    def test_find(self):
+        for i in range(5):
+            self.post('/simpledoc/', {'a': 'doc%d' % i, 'b': i})
+        data = self.get_items('/simpledoc/?where={"b": {"$gte": 2}}'
+                              '&sort=[("b", -1)]&max_results=2&page=2')
+        self.assertEqual([item['b'] for item in data[config.ITEMS]], [2])
+        self.assertEqual(data['_meta']['total'], 3)
+        data = self.get_items('/simpledoc/?where=b==1')
+        self.assertEqual(data[config.ITEMS][0]['a'], 'doc1')
+        data = self.get_items('/simpledoc/?projection={"a": 0}')
+        self.assertNotIn('a', data[config.ITEMS][0])
+        self.assertIn('b', data[config.ITEMS][0])
+
+    def test_inheritance(self):
+        self.post('/simpledoc/', {'a': 'parent'})
+        self.post('/inherited/', {'a': 'child', 'C': 'x'})
+        self.assertEqual(self.get_items('/simpledoc/')['_meta']['total'], 2)
+        data = self.get_items('/inherited/')
+        self.assertEqual([item['a'] for item in data[config.ITEMS]],
+                         ['child'])
+        self.assertEqual(data[config.ITEMS][0]['C'], 'x')
+
+    def test_embedded(self):
+        self.post('/complexdoc/', {'i': {'a': 'inner', 'b': 1},
+                                   'o': [{'a': 'x'}, {'a': 'y'}]})
+        data = self.get_items('/complexdoc/?where={"o.a": "y"}')
+        self.assertEqual(data[config.ITEMS][0]['i'], {'a': 'inner', 'b': 1})
+        data = self.get_items('/complexdoc/?where={"i.b": 2}')
+        self.assertEqual(data[config.ITEMS], [])
+
+    def test_slice(self):
+        post = self.post('/complexdoc/', {'l': ['a', 'b', 'c', 'd'],
+                                          'o': [{'a': 'x'}, {'a': 'y'}]})
+        url = '/complexdoc/%s' % post[config.ID_FIELD]
+        data = self.get_items(url + '?slice={"l": [1, 2], "o": -1}')
+        self.assertEqual(data['l'], ['b', 'c'])
+        self.assertEqual(data['o'], [{'a': 'y'}])
+        with self.app.test_request_context(url + '?slice={"l": 1}'):
+            docs = self.app.data.find_many_by_ids(
+                'complexdoc', [post[config.ID_FIELD]],
+                parse_request('complexdoc'))
+        self.assertEqual(docs[0]['l'], ['a'])
+
+    def test_unique(self):
+        doc = {'a': 'x', 'b': 'unique', 'e': 'long enough value'}
+        self.post('/limiteddoc/', doc)
+        response = self.client.post('/limiteddoc/', data=json.dumps(doc),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 422)
+
+    def test_patch_put_delete(self):
+        post = self.post('/simpledoc/', {'a': 'jimmy', 'b': 23})
+        url = '/simpledoc/%s' % post[config.ID_FIELD]
+        response = self.client.patch(
+            url, data='{"b": 42}', content_type='application/json',
+            headers=[('If-Match', post[config.ETAG])])
+        self.assertEqual(response.status_code, 200)
+        data = self.client.get(url).get_json()
+        self.assertEqual((data['a'], data['b']), ('jimmy', 42))
+        self.assertEqual(data[config.ETAG], response.get_json()[config.ETAG])
+        response = self.client.put(
+            url, data='{"a": "greg"}', content_type='application/json',
+            headers=[('If-Match', data[config.ETAG])])
+        self.assertEqual(response.status_code, 200)
+        data = self.client.get(url).get_json()
+        self.assertEqual(data['a'], 'greg')
+        self.assertNotIn('b', data)
+        response = self.client.delete(
+            url, headers=[('If-Match', data[config.ETAG])])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_delete_resource(self):
+        self.post('/simpledoc/', {'a': 'parent'})
+        self.post('/inherited/', {'a': 'child'})
+        self.client.delete('/inherited/')
+        data = self.get_items('/simpledoc/')
+        self.assertEqual([item['a'] for item in data[config.ITEMS]],
+                         ['parent'])
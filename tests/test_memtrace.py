@@ -0,0 +1,108 @@
+
+import sys
+import unittest
+
+from eve.utils import config
+
+from tests import BaseTest, ComplexDoc
+from eve_mongoengine import memtrace
+from eve_mongoengine.memtrace import MemoryTracer, estimate_size
+
+
+@unittest.skipIf(memtrace.tracemalloc is None, 'requires tracemalloc')
+class TestMemoryTracer(unittest.TestCase):
+
+    def test_phases(self):
+        tracer = MemoryTracer()
+        trace = tracer.start('person', 'GET_resource')
+        memtrace.phase('hydrate')
+        transient = [str(i) * 10 for i in range(10000)]
+        del transient
+        memtrace.phase('clean')
+        kept = [str(i) * 10 for i in range(10000)]
+        self.assertIsNone(tracer.start('person', 'GET_resource'))
+        self.assertIs(tracer.stop(), trace)
+        self.assertIsNone(tracer.stop())
+        self.assertFalse(memtrace.tracing())
+        hydrate, clean = trace.phases['hydrate'], trace.phases['clean']
+        self.assertGreater(hydrate['peak'], 100000)
+        self.assertLess(hydrate['allocated'], hydrate['peak'] // 10)
+        self.assertGreater(clean['allocated'], 100000)
+        self.assertGreaterEqual(trace.peak, clean['allocated'])
+        self.assertGreater(trace.retained, 100000)
+        self.assertTrue(any(site['location'].startswith(__file__ + ':')
+                            for site in trace.retained_sites))
+        stats = tracer.stats('person')['GET_resource']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['peak'], trace.peak)
+        self.assertEqual(tracer.skipped, 1)
+        del kept
+
+    def test_options(self):
+        tracer = MemoryTracer(top=0)
+        trace = tracer.start('person', 'GET_resource')
+        tracer.stop()
+        self.assertEqual(trace.retained_sites, [])
+        self.assertFalse(tracer.wanted(False))
+        self.assertTrue(tracer.wanted(True))
+        self.assertRaises(TypeError, MemoryTracer, unknown=1)
+
+
+class TestEstimateSize(unittest.TestCase):
+
+    def test_nested(self):
+        doc = {'a': 'x' * 1000, 'l': [{'b': 'y' * 1000}]}
+        self.assertGreater(estimate_size(doc), 2000)
+        self.assertGreater(estimate_size(doc), sys.getsizeof(doc))
+
+
+class TestMemoryLimits(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        for n in range(10):
+            ComplexDoc(l=['x' * 1000] * 10).save()
+        self.settings = self.app.config['DOMAIN']['complexdoc']
+
+    def tearDown(self):
+        for option in ('trace_memory', 'max_page_memory',
+                       'max_page_memory_action', 'page_cache'):
+            self.settings.pop(option, None)
+        self.app.data.memory_tracer.reset()
+        ComplexDoc.objects.delete()
+
+    @unittest.skipIf(memtrace.tracemalloc is None, 'requires tracemalloc')
+    def test_trace_memory(self):
+        self.settings['trace_memory'] = True
+        self.assertEqual(self.client.get('/complexdoc/').status_code, 200)
+        stats = self.app.data.memory_tracer.stats('complexdoc')
+        phases = stats['GET_resource']['phases']
+        for phase in ('query', 'hydrate', 'clean', 'encode'):
+            self.assertIn(phase, phases)
+        self.assertGreater(phases['encode']['peak'], 100000)
+
+    def test_abort(self):
+        self.settings['max_page_memory'] = 50000
+        response = self.client.get('/complexdoc/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get('/complexdoc/?max_results=2')
+                         .status_code, 200)
+
+    def test_truncate(self):
+        self.settings['max_page_memory'] = 50000
+        self.settings['max_page_memory_action'] = 'truncate'
+        response = self.client.get('/complexdoc/')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(0 < len(data[config.ITEMS]) < 10)
+        self.assertEqual(data['_meta']['total'], 10)
+        self.assertTrue(data['_meta']['truncated'])
+        data = self.client.get('/complexdoc/?max_results=2').get_json()
+        self.assertNotIn('truncated', data['_meta'])
+
+    def test_truncate_cached(self):
+        self.settings['max_page_memory'] = 50000
+        self.settings['max_page_memory_action'] = 'truncate'
+        self.settings['page_cache'] = True
+        for _ in range(2):
+            data = self.client.get('/complexdoc/').get_json()
+            self.assertTrue(data['_meta']['truncated'])
@@ -0,0 +1,123 @@
+
+import json
+import unittest
+
+from eve.utils import config
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.pagecache import PageCache
+
+
+class TestPageCache(unittest.TestCase):
+
+    def test_generations(self):
+        cache = PageCache()
+        cache.set('r', 0, 'k', [{'a': 1}], 10)
+        page = cache.get('r', 0, 'k')
+        self.assertEqual(list(page), [{'a': 1}])
+        self.assertEqual(page.count(), 10)
+        self.assertEqual(page.count(with_limit_and_skip=True), 1)
+        cache.bump('r')
+        self.assertIsNone(cache.get('r', cache.generation('r'), 'k'))
+        # query started before the write
+        cache.set('r', 0, 'k', [{'a': 1}], 10)
+        self.assertIsNone(cache.get('r', 1, 'k'))
+        stats = cache.stats('r')
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertEqual(stats['hit_ratio'], 1 / 3.0)
+
+    def test_copies(self):
+        cache = PageCache()
+        documents = [{'l': [1]}]
+        cache.set('r', 0, 'k', documents, 1)
+        documents[0]['l'].append(2)
+        list(cache.get('r', 0, 'k'))[0]['l'].append(3)
+        self.assertEqual(list(cache.get('r', 0, 'k')), [{'l': [1]}])
+
+    def test_memory_caps(self):
+        cache = PageCache(max_bytes=3000, max_page_bytes=1500)
+        cache.set('r', 0, 'big', ['x' * 2000], 1)
+        self.assertIsNone(cache.get('r', 0, 'big'))
+        for key in ('a', 'b', 'c'):
+            cache.set('r', 0, key, ['x' * 1000], 1)
+        self.assertIsNone(cache.get('r', 0, 'a'))
+        self.assertIsNotNone(cache.get('r', 0, 'c'))
+        self.assertLessEqual(cache.stats()['bytes'], 3000)
+        self.assertRaises(TypeError, PageCache, unknown=1)
+
+    def test_ttl(self):
+        cache = PageCache(ttl=-1)
+        cache.set('r', 0, 'k', [], 0)
+        self.assertIsNone(cache.get('r', 0, 'k'))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+class TestPageCacheDataLayer(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        for resource in ('simpledoc', 'inherited'):
+            self.app.config['DOMAIN'][resource]['page_cache'] = True
+        for i in range(3):
+            SimpleDoc(a='doc%d' % i, b=i).save()
+
+    def tearDown(self):
+        for resource in ('simpledoc', 'inherited'):
+            del self.app.config['DOMAIN'][resource]['page_cache']
+        self.app.data.page_cache = PageCache()
+        SimpleDoc.objects.delete()
+
+    def get_items(self, url='/simpledoc/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_cached(self):
+        data = self.get_items()
+        SimpleDoc._get_collection().update({}, {'$set': {'b': 42}},
+                                           multi=True)
+        cached = self.get_items()
+        self.assertEqual(cached[config.ITEMS], data[config.ITEMS])
+        self.assertEqual(cached['_meta']['total'], 3)
+        self.assertEqual(self.app.data.page_cache.stats('simpledoc')['hits'],
+                         1)
+
+    def test_keyed_by_query(self):
+        self.get_items('/simpledoc/?where={"b": 1}')
+        data = self.get_items('/simpledoc/?where={"b": 2}')
+        self.assertEqual(data[config.ITEMS][0]['a'], 'doc2')
+        data = self.get_items('/simpledoc/?sort=-b&max_results=1&page=2')
+        self.assertEqual(data[config.ITEMS][0]['a'], 'doc1')
+        self.assertEqual(self.app.data.page_cache.stats()['hits'], 0)
+
+    def test_invalidated_by_post(self):
+        self.get_items()
+        response = self.client.post('/simpledoc/',
+                                    data=json.dumps({'a': 'new', 'b': 9}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_items()['_meta']['total'], 4)
+
+    def test_invalidated_by_patch(self):
+        item = self.get_items('/simpledoc/?where={"b": 0}')[config.ITEMS][0]
+        url = '/simpledoc/%s' % item[config.ID_FIELD]
+        etag = self.client.get(url).get_json()[config.ETAG]
+        response = self.client.patch(url, data='{"b": 7}',
+                                     content_type='application/json',
+                                     headers=[('If-Match', etag)])
+        self.assertEqual(response.status_code, 200)
+        data = self.get_items('/simpledoc/?where={"b": 0}')
+        self.assertEqual(data[config.ITEMS], [])
+
+    def test_invalidated_by_delete(self):
+        self.get_items()
+        self.client.delete('/simpledoc/')
+        self.assertEqual(self.get_items()['_meta']['total'], 0)
+
+    def test_shared_collection(self):
+        self.get_items('/inherited/')
+        response = self.client.post('/simpledoc/',
+                                    data=json.dumps({'a': 'new'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(self.app.data.page_cache.generation('inherited'),
+                            0)
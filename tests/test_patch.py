@@ -26,7 +26,7 @@ def post_simple_item(f):
         try:
             f(self)
         finally:
-            SimpleDoc.objects().delete()
+            self.delete_all(SimpleDoc)
     return wrapper
 
 def post_complex_item(f):
@@ -47,11 +47,12 @@ def post_complex_item(f):
         try:
             f(self)
         finally:
-            ComplexDoc.objects().delete()
+            self.delete_all(ComplexDoc)
     return wrapper
 
 
 class TestHttpPatch(BaseTest, unittest.TestCase):
+    memory = True
 
     def do_patch(self, url=None, data=None, headers=None):
         if url is None:
@@ -87,12 +88,12 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
     @post_simple_item
     def test_patch_overwrite_subset(self):
         # test what was really updated
-        raw = SimpleDoc._get_collection().find_one({"_id": ObjectId(self._id)})
+        raw = self.raw_document(SimpleDoc, ObjectId(self._id))
         response = self.do_patch(data='{"a": "greg"}')
         self.assert_correct_etag(response)
         expected = dict(raw)
         expected['a'] = 'greg'
-        real = SimpleDoc._get_collection().find_one({"_id": ObjectId(self._id)})
+        real = self.raw_document(SimpleDoc, ObjectId(self._id))
         self.assertDictEqual(real, expected)
         # test if GET response returns corrent response
         response = self.client.get(self.url).get_json()
@@ -103,42 +104,42 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
 
     @post_complex_item
     def test_patch_dict_field(self):
-        test = ComplexDoc.objects[0]
+        test = self.documents(ComplexDoc)[0]
         self.assertListEqual(test.l, ['m', 'n'])
         self.assertEqual(test.d['x'], None)
         self.assertEqual(test.i.a, "hello")
         # do PATCH
         response = self.do_patch(data='{"d": {"x": "789"}}')
         self.assert_correct_etag(response)
-        real = ComplexDoc.objects[0]
+        real = self.documents(ComplexDoc)[0]
         self.assertEqual(real.d['x'], "789")
         self.assertListEqual(real.l, ['m', 'n'])
         self.assertEqual(real.i.a, "hello")
 
     @post_complex_item
     def test_patch_embedded_document(self):
-        self.assertEqual(ComplexDoc.objects[0].i.a, "hello")
+        self.assertEqual(self.documents(ComplexDoc)[0].i.a, "hello")
         response = self.do_patch(data='{"i": {"a": "bye"}}')
         self.assert_correct_etag(response)
-        self.assertEqual(ComplexDoc.objects[0].i.a, "bye")
+        self.assertEqual(self.documents(ComplexDoc)[0].i.a, "bye")
 
     @post_complex_item
     def test_patch_embedded_document_in_list(self):
-        self.assertEqual(ComplexDoc.objects[0].o[0].a, "hi")
-        self.assertEqual(len(ComplexDoc.objects[0].o), 2)
+        self.assertEqual(self.documents(ComplexDoc)[0].o[0].a, "hi")
+        self.assertEqual(len(self.documents(ComplexDoc)[0].o), 2)
         response = self.do_patch(data='{"o": [{"a": "bye"}]}')
         self.assert_correct_etag(response)
-        self.assertEqual(ComplexDoc.objects[0].o[0].a, "bye")
-        self.assertEqual(len(ComplexDoc.objects[0].o), 1)
+        self.assertEqual(self.documents(ComplexDoc)[0].o[0].a, "bye")
+        self.assertEqual(len(self.documents(ComplexDoc)[0].o), 1)
 
     @post_complex_item
     def test_patch_list(self):
-        self.assertEqual(ComplexDoc.objects[0].l, ["m", "n"])
+        self.assertEqual(self.documents(ComplexDoc)[0].l, ["m", "n"])
         # full one
         response = self.do_patch(data='{"l": ["n"]}')
         self.assert_correct_etag(response)
         self.etag = response.get_json()[config.ETAG]
-        doc = ComplexDoc.objects[0]
+        doc = self.documents(ComplexDoc)[0]
         self.assertEqual(doc.l, ["n"])
         self.assertEqual(doc.i.a, "hello")
 
@@ -153,7 +154,7 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
         # empty one
         response = self.do_patch(data='{"l": []}')
         self.assert_correct_etag(response)
-        doc = ComplexDoc.objects[0]
+        doc = self.documents(ComplexDoc)[0]
         self.assertEqual(doc.l, [])
         self.assertEqual(doc.i.a, "hello")
 
@@ -163,33 +164,33 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
         # Empty List and Empty Dictionary
         response = self.do_patch(data='{"l": [], "d": {}}')
         self.assert_correct_etag(response)
-        doc = ComplexDoc.objects[0]
+        doc = self.documents(ComplexDoc)[0]
         self.assertEqual(doc.l, [])
         self.assertEqual(doc.d, {})
         self.assertEqual(doc.i.a, "hello")
 
     @post_complex_item
     def test_patch_list_in_list(self):
-        self.assertEqual(ComplexDoc.objects[0].p[0].ll, ["q", "w"])
+        self.assertEqual(self.documents(ComplexDoc)[0].p[0].ll, ["q", "w"])
         response = self.do_patch(data='{"p": [{"ll": ["y"]}]}')
         self.assert_correct_etag(response)
         self.etag = response.get_json()[config.ETAG]
-        doc = ComplexDoc.objects[0]
+        doc = self.documents(ComplexDoc)[0]
         self.assertEqual(doc.p[0].ll, ["y"])
 
     @post_complex_item
     def test_patch_empty_list_in_list(self):
-        self.assertEqual(ComplexDoc.objects[0].p[0].ll, ["q", "w"])
+        self.assertEqual(self.documents(ComplexDoc)[0].p[0].ll, ["q", "w"])
         response = self.do_patch(data='{"p": [{"ll": []}]}')
         self.assert_correct_etag(response)
         self.etag = response.get_json()[config.ETAG]
-        doc = ComplexDoc.objects[0]
+        doc = self.documents(ComplexDoc)[0]
         self.assertEqual(doc.p[0].ll, [])
 
     def test_patch_subresource(self):
         # create new resource and subresource
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        d = ComplexDoc(l=['a', 'b'], n=999, r=s).save()
+        s = self.save_doc(SimpleDoc(a="Answer to everything", b=42))
+        d = self.save_doc(ComplexDoc(l=['a', 'b'], n=999, r=s))
 
         response = self.client.get('/simpledoc/%s/complexdoc/%s' % (s.id, d.id))
         etag = response.get_json()[config.ETAG]
@@ -211,13 +212,13 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
         self.assertEqual(json_data['n'], 999)
 
         # cleanup
-        s.delete()
-        d.delete()
+        self.delete_doc(s)
+        self.delete_doc(d)
 
     def test_patch_field_with_different_dbfield(self):
         # tests patching field whith has mongoengine's db_field specified
         # and different from python field name
-        s = FieldsDoc(n="Hello").save()
+        s = self.save_doc(FieldsDoc(n="Hello"))
         response = self.client.get('/fieldsdoc/%s' % s.id)
         etag = response.get_json()[config.ETAG]
         headers = [('If-Match', etag)]
@@ -231,15 +232,97 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
         resp_json = response.get_json()
         self.assertEqual(resp_json[config.STATUS], "OK")
 
+    @post_simple_item
+    def test_patch_increment(self):
+        response = self.do_patch(data='{"b": {"$inc": 2}}')
+        self.assert_correct_etag(response)
+        # post-increment value is returned
+        self.assertEqual(response.get_json()['b'], 25)
+        self.assertEqual(self.document(SimpleDoc).b, 25)
+        self.assertEqual(self.document(SimpleDoc).a, "jimmy")
+
+    @post_simple_item
+    def test_patch_increment_with_set(self):
+        response = self.do_patch(data='{"a": "greg", "b": {"$inc": -3}}')
+        self.assert_correct_etag(response)
+        self.assertEqual(response.get_json()['b'], 20)
+        doc = self.document(SimpleDoc)
+        self.assertEqual(doc.a, "greg")
+        self.assertEqual(doc.b, 20)
+
+    @post_simple_item
+    def test_patch_increment_wrong_type(self):
+        response = self.do_patch(data='{"b": {"$inc": 2.5}}')
+        self.assertEqual(response.status_code, 422)
+        response = self.do_patch(data='{"a": {"$inc": 2}}')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.document(SimpleDoc).b, 23)
+
+    @post_complex_item
+    def test_patch_increment_dict_field(self):
+        response = self.do_patch(data='{"d": {"$inc": 2}}')
+        self.assertEqual(response.status_code, 422)
+        # document is unchanged
+        self.assertEqual(self.client.get(self.url).get_json()[config.ETAG],
+                         self.etag)
+
+    @post_simple_item
+    def test_patch_increment_requires_etag(self):
+        response = self.do_patch(data='{"b": {"$inc": 1}}', headers=[])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.document(SimpleDoc).b, 23)
+
+    @post_simple_item
+    def test_patch_unconditional_increment(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['allow_unconditional_increments'] = True
+        try:
+            response = self.do_patch(data='{"b": {"$inc": 1}}', headers=[])
+            self.assert_correct_etag(response)
+            response = self.do_patch(data='{"b": {"$inc": 1}}',
+                                     headers=[('If-Match', '*')])
+            self.assert_correct_etag(response)
+            self.assertEqual(response.get_json()['b'], 25)
+            # stale etag is still checked, when sent by client
+            response = self.do_patch(data='{"b": {"$inc": 1}}')
+            self.assertEqual(response.status_code, 412)
+            # regular updates still need etag
+            response = self.do_patch(data='{"a": "greg"}', headers=[])
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(self.document(SimpleDoc).b, 25)
+        finally:
+            del settings['allow_unconditional_increments']
+
+    @post_simple_item
+    def test_put_after_unconditional_increment(self):
+        settings = self.app.config['DOMAIN']['simpledoc']
+        settings['allow_unconditional_increments'] = True
+        try:
+            response = self.do_patch(data='{"b": {"$inc": 1}}', headers=[])
+            self.assertEqual(response.status_code, 200)
+            etag = response.get_json()[config.ETAG]
+            # etag precondition applies again to following requests
+            response = self.client.put(self.url, data='{"a": "greg"}',
+                                       content_type='application/json',
+                                       headers=[('If-Match', '*')])
+            self.assertEqual(response.status_code, 412)
+            response = self.client.put(self.url, data='{"a": "greg"}',
+                                       content_type='application/json',
+                                       headers=[('If-Match', etag)])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.document(SimpleDoc).a, 'greg')
+        finally:
+            del settings['allow_unconditional_increments']
+
     @post_simple_item
     def test_update_date_consistency(self):
         # tests if _updated is really updated when PATCHing resource
         updated = self.client.get(self.url).get_json()[config.LAST_UPDATED]
         time.sleep(1)
-        s = SimpleDoc.objects.get()
+        s = self.document(SimpleDoc)
         updated_before_patch = s.updated
         s.a = "bob"
-        s.save()
+        self.save_doc(s)
         updated_after_patch = s.updated
         self.assertNotEqual(updated_before_patch, updated_after_patch)
         delta = updated_after_patch - updated_before_patch
@@ -249,10 +332,10 @@ class TestHttpPatch(BaseTest, unittest.TestCase):
 class TestHttpPatchUsingSaveMethod(TestHttpPatch):
     @classmethod
     def setUpClass(cls):
-        BaseTest.setUpClass()
+        super(TestHttpPatchUsingSaveMethod, cls).setUpClass()
         cls.app.data.mongoengine_options['use_atomic_update_for_patch'] = False
 
     @classmethod
     def tearDownClass(cls):
-        BaseTest.tearDownClass()
+        super(TestHttpPatchUsingSaveMethod, cls).tearDownClass()
         cls.app.data.mongoengine_options['use_atomic_update_for_patch'] = True
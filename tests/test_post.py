@@ -21,6 +21,7 @@ except AttributeError:
 
 
 class TestHttpPost(BaseTest, unittest.TestCase):
+    memory = True
 
     def test_post_simple(self):
         now = datetime.now()
@@ -138,16 +139,19 @@ class TestHttpPost(BaseTest, unittest.TestCase):
         self.assertEqual(data[1][config.STATUS], "ERR")
 
     def test_post_subresource(self):
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        data = {'l': ['x', 'y', 'z'], 'r': str(s.id)}
-        post_url = '/simpledoc/%s/complexdoc' % s.id
+        response = self.client.post('/simpledoc/',
+                                    data='{"a": "Answer to everything", "b": 42}',
+                                    content_type='application/json')
+        s_id = response.get_json()[config.ID_FIELD]
+        data = {'l': ['x', 'y', 'z'], 'r': s_id}
+        post_url = '/simpledoc/%s/complexdoc' % s_id
         response = self.client.post(post_url, data=json.dumps(data), content_type='application/json')
         self.assertEqual(response.status_code, 201)
         resp_json = response.get_json()
         self.assertEqual(resp_json[config.STATUS], "OK")
 
         # verify saved data
-        response = self.client.get('/simpledoc/%s/complexdoc' % s.id)
+        response = self.client.get('/simpledoc/%s/complexdoc' % s_id)
         self.assertEqual(response.status_code, 200)
         resp_json = response.get_json()
         self.assertEqual(len(resp_json[config.ITEMS]), 1)
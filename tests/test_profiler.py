@@ -0,0 +1,95 @@
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.profiler import SamplingProfiler
+
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def slow_hook(*args):
+    busy(0.1)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def test_collapsed(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start('person', 'GET_resource')
+        busy(0.1)
+        profile = profiler.stop()
+        self.assertGreater(profile.samples, 10)
+        lines = profiler.collapsed('person', 'GET_resource').splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any(line.rsplit(' ', 1)[0].endswith(
+            'tests.test_profiler:test_collapsed;tests.test_profiler:busy')
+            for line in lines))
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines),
+                         profile.samples)
+        # sampler thread ends with the last profile
+        time.sleep(0.05)
+        self.assertIsNone(profiler._thread)
+
+    def test_not_profiled(self):
+        profiler = SamplingProfiler()
+        self.assertIsNone(profiler.stop())
+        self.assertFalse(profiler.wanted({}, False))
+        self.assertTrue(profiler.wanted({}, True))
+        self.assertFalse(profiler.wanted({}, 0.0))
+        self.assertRaises(TypeError, SamplingProfiler, unknown=1)
+
+    def test_token(self):
+        profiler = SamplingProfiler(token='s3cret')
+        header = profiler.header
+        self.assertTrue(profiler.wanted({header: 's3cret'}, False))
+        self.assertFalse(profiler.wanted({header: 'guess'}, False))
+        self.assertFalse(profiler.wanted({}, False))
+
+
+class TestRequestProfiling(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        SimpleDoc(a='jimmy', b=23).save()
+        self.settings = self.app.config['DOMAIN']['simpledoc']
+        self.output_dir = tempfile.mkdtemp()
+        self.app.data.profiler = SamplingProfiler(
+            interval=0.001, token='s3cret', output_dir=self.output_dir)
+        self.app.on_fetched_resource_simpledoc += slow_hook
+
+    def tearDown(self):
+        self.app.on_fetched_resource_simpledoc -= slow_hook
+        self.app.data.profiler = SamplingProfiler()
+        self.settings.pop('profile', None)
+        shutil.rmtree(self.output_dir)
+        SimpleDoc.objects.delete()
+
+    def test_option(self):
+        self.client.get('/simpledoc/')
+        self.assertEqual(os.listdir(self.output_dir), [])
+        self.settings['profile'] = True
+        self.assertEqual(self.client.get('/simpledoc/').status_code, 200)
+        path = os.path.join(self.output_dir,
+                            'simpledoc.GET_resource.collapsed')
+        with open(path) as f:
+            collapsed = f.read()
+        self.assertIn('tests.test_profiler:slow_hook', collapsed)
+        self.assertEqual(collapsed, self.app.data.profiler.collapsed(
+            'simpledoc', 'GET_resource'))
+
+    def test_header(self):
+        profiler = self.app.data.profiler
+        self.client.get('/simpledoc/',
+                        headers=[(profiler.header, 'guess')])
+        self.assertEqual(profiler.profiles, {})
+        self.client.get('/simpledoc/',
+                        headers=[(profiler.header, 's3cret')])
+        self.assertEqual(list(profiler.profiles),
+                         [('simpledoc', 'GET_resource')])
@@ -5,6 +5,7 @@ from eve.utils import config
 from tests import BaseTest, SimpleDoc, ComplexDoc
 
 class TestHttpPut(BaseTest, unittest.TestCase):
+    memory = True
     def setUp(self):
         response = self.client.post('/simpledoc/',
                                     data='{"a": "jimmy", "b": 23}',
@@ -17,7 +18,7 @@ class TestHttpPut(BaseTest, unittest.TestCase):
         self.updated = response[config.LAST_UPDATED]
 
     def tearDown(self):
-        SimpleDoc.objects().delete()
+        self.delete_all(SimpleDoc)
 
     def do_put(self, url=None, data=None, headers=None):
         if url is None:
@@ -58,8 +59,8 @@ class TestHttpPut(BaseTest, unittest.TestCase):
 
     def test_put_subresource(self):
         # create new resource and subresource
-        s = SimpleDoc(a="Answer to everything", b=42).save()
-        d = ComplexDoc(l=['a', 'b'], n=999, r=s).save()
+        s = self.save_doc(SimpleDoc(a="Answer to everything", b=42))
+        d = self.save_doc(ComplexDoc(l=['a', 'b'], n=999, r=s))
 
         response = self.client.get('/simpledoc/%s/complexdoc/%s' % (s.id, d.id))
         etag = response.get_json()[config.ETAG]
@@ -80,5 +81,5 @@ class TestHttpPut(BaseTest, unittest.TestCase):
         self.assertListEqual(json_data['l'], ['x', 'y', 'z'])
         self.assertNotIn('n', json_data)
 
-        s.delete()
-        d.delete()
+        self.delete_doc(s)
+        self.delete_doc(d)
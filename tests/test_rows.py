@@ -0,0 +1,82 @@
+
+import unittest
+from decimal import Decimal
+from uuid import uuid4
+
+from bson import ObjectId
+from mongoengine import DynamicDocument, StringField
+from eve.utils import config
+
+from tests import (BaseTest, SimpleDoc, ComplexDoc, LimitedDoc, FieldsDoc,
+                   Inherited, Inner, ListInner)
+from eve_mongoengine.rows import row_class, iterate_rows
+
+
+class DynamicDoc(DynamicDocument):
+    a = StringField()
+
+
+class TestRows(BaseTest, unittest.TestCase):
+
+    def tearDown(self):
+        for model in (SimpleDoc, ComplexDoc, LimitedDoc, FieldsDoc):
+            model.objects.delete()
+
+    def assertSameAsDocuments(self, qs):
+        documents = [doc.to_mongo() for doc in qs.clone()]
+        rows = [row.to_mongo() for row in iterate_rows(qs.clone())]
+        self.assertTrue(documents)
+        self.assertEqual(rows, documents)
+        # the same order of keys
+        self.assertEqual([list(row) for row in rows],
+                         [list(doc) for doc in documents])
+
+    def test_conversions(self):
+        ref = SimpleDoc(a='ref', b=1).save()
+        ComplexDoc(i=Inner(a='a', b=1), d={'x': {'y': 1}}, l=['a', 'b'],
+                   n={'dyn': [1]}, r=ref, o=[Inner(a='o')],
+                   p=[ListInner(ll=['x'])]).save()
+        ComplexDoc().save()
+        self.assertSameAsDocuments(ComplexDoc.objects)
+        self.assertSameAsDocuments(ComplexDoc.objects.only('l', 'i'))
+        self.assertSameAsDocuments(ComplexDoc.objects.exclude('l'))
+        FieldsDoc(a='http://example.com', b='a@example.com', c=2 ** 40,
+                  d=Decimal('1.5'), e=[3, 1, 2], f={'k': 'v'}, g=uuid4(),
+                  h=ObjectId(), n='renamed', o='fancy').save()
+        self.assertSameAsDocuments(FieldsDoc.objects)
+        LimitedDoc(a='required', b='unique', g='val1').save()
+        self.assertSameAsDocuments(LimitedDoc.objects)
+
+    def test_inheritance(self):
+        SimpleDoc(a='parent').save()
+        Inherited(a='child', c='renamed', d={'x': 1}).save()
+        self.assertSameAsDocuments(SimpleDoc.objects)
+        rows = list(iterate_rows(SimpleDoc.objects.order_by('a')))
+        self.assertEqual([type(row).__name__ for row in rows],
+                         ['InheritedRow', 'SimpleDocRow'])
+        self.assertEqual(rows[0].c, 'renamed')
+
+    def test_read_only(self):
+        SimpleDoc(a='jimmy', b=23).save()
+        row = next(iterate_rows(SimpleDoc.objects))
+        self.assertEqual((row.a, row.b), ('jimmy', 23))
+        self.assertRaises(AttributeError, setattr, row, 'a', 'x')
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(list(row), list(SimpleDoc._fields_ordered))
+
+    def test_unsupported(self):
+        self.assertIsNotNone(row_class(SimpleDoc))
+        self.assertIsNone(row_class(DynamicDoc))
+
+    def test_find(self):
+        for n in range(5):
+            ComplexDoc(l=['item %d' % n], i=Inner(a='x', b=n)).save()
+        settings = self.app.config['DOMAIN']['complexdoc']
+        url = '/complexdoc/?sort=[("i.b", -1)]'
+        expected = self.client.get(url).get_json()[config.ITEMS]
+        settings['lightweight_rows'] = True
+        try:
+            items = self.client.get(url).get_json()[config.ITEMS]
+        finally:
+            del settings['lightweight_rows']
+        self.assertEqual(items, expected)
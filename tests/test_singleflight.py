@@ -0,0 +1,175 @@
+
+import time
+import threading
+import unittest
+
+from eve.utils import config
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.singleflight import SingleFlight
+
+
+def run_concurrently(count, target):
+    start = threading.Event()
+
+    def run():
+        start.wait()
+        target()
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_coalesced(self):
+        flights = SingleFlight()
+        calls, results = [], []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        run_concurrently(20, lambda: results.append(flights.do('k', slow)))
+        self.assertEqual(results, [42] * 20)
+        self.assertEqual(len(calls), 1)
+        stats = flights.stats()
+        self.assertEqual(stats['coalesced'], 19)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_error_shared(self):
+        flights = SingleFlight()
+        errors = []
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError('boom')
+
+        def call():
+            try:
+                flights.do('k', failing)
+            except ValueError as e:
+                errors.append(e)
+
+        run_concurrently(5, call)
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(flights.stats()['executed'], 1)
+        # failed call does not stay in flight
+        self.assertEqual(flights.do('k', lambda: 1), 1)
+
+    def test_timeout(self):
+        flights = SingleFlight(timeout=0.05)
+        results = []
+
+        def slow():
+            time.sleep(0.3)
+            return 'slow'
+
+        thread = threading.Thread(
+            target=lambda: results.append(flights.do('k', slow)))
+        thread.start()
+        time.sleep(0.1)
+        self.assertEqual(flights.do('k', lambda: 'own'), 'own')
+        thread.join()
+        self.assertEqual(results, ['slow'])
+        self.assertEqual(flights.stats()['timeouts'], 1)
+        self.assertRaises(TypeError, SingleFlight, unknown=1)
+
+
+class TestCoalescedReads(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        self.doc = SimpleDoc(a='jimmy', b=23)
+        self.doc.save()
+        self.settings = self.app.config['DOMAIN']['simpledoc']
+        self.queries = []
+        datalayer = self.app.data
+        find_cursor, fetch_one = datalayer._find_cursor, datalayer._fetch_one
+
+        # counts queries sent to the database, widens the flight window
+        def counting_find_cursor(*args):
+            self.queries.append('find')
+            time.sleep(0.2)
+            return find_cursor(*args)
+
+        def counting_fetch_one(resource, qry):
+            get = qry.get
+
+            def slow_get(*args, **kwargs):
+                self.queries.append('find_one')
+                time.sleep(0.2)
+                return get(*args, **kwargs)
+            qry.get = slow_get
+            return fetch_one(resource, qry)
+
+        datalayer._find_cursor = counting_find_cursor
+        datalayer._fetch_one = counting_fetch_one
+
+    def tearDown(self):
+        del self.app.data._find_cursor
+        del self.app.data._fetch_one
+        self.settings.pop('coalesce_reads', None)
+        SimpleDoc.objects.delete()
+
+    def concurrent_gets(self, url, count=30):
+        responses = []
+
+        def get():
+            responses.append(self.app.test_client().get(url))
+
+        run_concurrently(count, get)
+        self.assertEqual([r.status_code for r in responses], [200] * count)
+        return [r.get_json() for r in responses]
+
+    def test_find_stress(self):
+        self.concurrent_gets('/simpledoc/')
+        self.assertEqual(len(self.queries), 30)
+        del self.queries[:]
+        self.settings['coalesce_reads'] = True
+        data = self.concurrent_gets('/simpledoc/')
+        self.assertLess(len(self.queries), 5)
+        for response in data:
+            self.assertEqual(response[config.ITEMS][0]['a'], 'jimmy')
+            self.assertEqual(response['_meta']['total'], 1)
+
+    def test_find_one_stress(self):
+        self.settings['coalesce_reads'] = True
+        url = '/simpledoc/%s' % self.doc.id
+        data = self.concurrent_gets(url)
+        self.assertLess(len(self.queries), 5)
+        self.assertEqual(set(response['b'] for response in data), set([23]))
+
+    def test_different_queries(self):
+        self.settings['coalesce_reads'] = True
+        SimpleDoc(a='greg', b=24).save()
+        results = []
+        urls = ['/simpledoc/?where={"a": "jimmy"}',
+                '/simpledoc/?where={"a": "greg"}']
+
+        def get():
+            for url in urls:
+                results.append(self.app.test_client().get(url).get_json())
+
+        run_concurrently(10, get)
+        names = set(r[config.ITEMS][0]['a'] for r in results)
+        self.assertEqual(names, set(['jimmy', 'greg']))
+        self.assertLessEqual(len(self.queries), 10)
+
+
+class TestThreadSafePatch(BaseTest, unittest.TestCase):
+    memory = True
+
+    def test_state_per_thread(self):
+        state = self.app.data.updater.state
+        state.etag_doc = {'a': 1}
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(state.etag_doc))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [None])
+        state.reset()
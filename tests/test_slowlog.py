@@ -0,0 +1,108 @@
+
+import unittest
+import threading
+
+from eve.utils import config
+
+from tests import BaseTest, SimpleDoc
+from eve_mongoengine.slowlog import SlowQueryLog
+
+
+class TestSlowQueryLog(BaseTest, unittest.TestCase):
+
+    def setUp(self):
+        self.entries = []
+        self.original_log = self.app.data.slow_query_log
+        self.app.data.slow_query_log = SlowQueryLog(self.entries.append,
+                                                    rate_limit=100)
+        self.app.config['DOMAIN']['simpledoc']['slow_query_threshold'] = 0
+
+    def tearDown(self):
+        del self.app.config['DOMAIN']['simpledoc']['slow_query_threshold']
+        self.app.data.slow_query_log = self.original_log
+        SimpleDoc.objects.delete()
+
+    def operations(self):
+        return [entry['operation'] for entry in self.entries]
+
+    def test_find(self):
+        SimpleDoc(a='x', b=1).save()
+        self.client.get('/simpledoc/?where={"b": {"$gt": 0}}'
+                        '&sort=[("a", -1)]&max_results=5&page=2')
+        self.assertEqual(self.operations(), ['find', 'count'])
+        entry = self.entries[0]
+        self.assertEqual(entry['resource'], 'simpledoc')
+        self.assertEqual(entry['filter'], [['b', '$gt']])
+        # values sent by clients are not logged by default
+        self.assertNotIn('spec', entry)
+        self.assertEqual(entry['sort'], [('a', -1)])
+        self.assertEqual(entry['skip'], 5)
+        self.assertEqual(entry['limit'], 5)
+        self.assertEqual(entry['suppressed'], 0)
+        self.assertGreaterEqual(entry['duration_ms'], 0)
+        self.assertNotIn('explain', entry)
+
+    def test_write_operations(self):
+        response = self.client.post('/simpledoc/', data='{"a": "jimmy"}',
+                                    content_type='application/json')
+        url = '/simpledoc/%s' % response.get_json()[config.ID_FIELD]
+        etag = self.client.get(url).get_json()[config.ETAG]
+        response = self.client.patch(url, data='{"b": 2}',
+                                     content_type='application/json',
+                                     headers=[('If-Match', etag)])
+        etag = response.get_json()[config.ETAG]
+        response = self.client.put(url, data='{"a": "greg"}',
+                                   content_type='application/json',
+                                   headers=[('If-Match', etag)])
+        etag = response.get_json()[config.ETAG]
+        self.client.delete(url, headers=[('If-Match', etag)])
+        operations = self.operations()
+        for operation in ('insert', 'find_one', 'update', 'replace',
+                          'remove'):
+            self.assertIn(operation, operations)
+        update = self.entries[operations.index('update')]
+        self.assertEqual(update['filter'], [['_id', '$eq']])
+
+    def test_threshold(self):
+        self.app.config['DOMAIN']['simpledoc']['slow_query_threshold'] = 60
+        self.client.get('/simpledoc/')
+        self.assertEqual(self.entries, [])
+
+    def test_explain(self):
+        log = self.app.data.slow_query_log
+        log.explain = True
+        log.background = False
+        self.client.get('/simpledoc/?where={"a": "x"}')
+        explain = self.entries[0]['explain']
+        self.assertTrue(explain['collscan'])
+        self.assertNotIn('queryPlanner', explain)
+
+    def test_explain_background(self):
+        log = self.app.data.slow_query_log
+        log.explain = True
+        emitted = threading.Event()
+        log.sink = lambda entry: (self.entries.append(entry), emitted.set())
+        self.client.get('/simpledoc/?where={"a": "x"}')
+        self.assertTrue(emitted.wait(10))
+        self.assertIn('explain', self.entries[0])
+
+    def test_log_values(self):
+        self.app.data.slow_query_log.log_values = True
+        self.client.get('/simpledoc/?where={"b": {"$gt": 0}}')
+        self.assertEqual(self.entries[0]['spec']['b'], {'$gt': 0})
+
+    def test_rate_limit(self):
+        log = SlowQueryLog(self.entries.append, rate_limit=1)
+        for _ in range(3):
+            log.log('simpledoc', 'insert', 1)
+        self.assertEqual(len(self.entries), 1)
+        # new window
+        log.rate_period = 0
+        log.log('simpledoc', 'insert', 1)
+        self.assertEqual(self.entries[-1]['suppressed'], 2)
+
+    def test_broken_sink(self):
+        def sink(entry):
+            raise ValueError()
+        log = SlowQueryLog(sink)
+        log.log('simpledoc', 'insert', 1)